@@ -1,12 +1,26 @@
-from quart import Blueprint, jsonify, request, current_app
+from quart import Blueprint, jsonify, request, current_app, make_response
+from werkzeug.exceptions import RequestEntityTooLarge
 from .models import (
     scan_emoji_folder,
     get_emoji_by_category,
+    count_emojis,
+    list_emoji_page,
     add_emoji_to_category,
     delete_emoji_from_category,
+    apply_batch,
+    run_io,
 )
 import os
-from ..config import MEMES_DIR
+import json
+import base64
+import asyncio
+import shutil
+from ..config import MEMES_DIR, TEMP_DIR
+from .archive_import import import_archive
+from .catalog import get_catalog, FILE_SORT_KEYS
+from .blob_store import BlobStore
+from .search import get_search_index, drop_search_index, parse_tags
+from .uploads import receive_multipart, UploadError, DEFAULT_UPLOAD_OPTIONS, UPLOAD_STAGING_DIR
 import logging
 
 
@@ -14,12 +28,71 @@ api = Blueprint("api", __name__)
 
 logger = logging.getLogger(__name__)
 
+# 分页列出文件时每页的默认和最大条数
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# 一次批量请求最多包含的操作数
+MAX_BATCH_OPERATIONS = 5000
+
+# 搜索结果每页的默认和最大条数，每个文件最多的标签数
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 200
+MAX_TAGS = 32
+
+# 同步进度事件流在没有新进度时发送保活注释的间隔（秒）
+SYNC_EVENTS_KEEPALIVE = 15
+
+
+def get_active_group() -> str:
+    """当前表情组，以运行中的类别管理器为准（机器人侧切换组时配置可能尚未落盘）"""
+    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
+    manager = plugin_config.get("category_manager")
+    if manager is not None:
+        return manager.active_group
+    return plugin_config.get("plugin_config", {}).get("active_emotion_group", "default")
+
+
+def _encode_cursor(sort: str, descending: bool, row) -> str:
+    """把上一页最后一项编码为不透明的游标"""
+    payload = json.dumps([sort, descending, row["sort_value"], row["filename"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, descending: bool):
+    """解析游标，排序方式与请求不一致或格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_desc, value, filename = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"无效的游标: {e}")
+    if cursor_sort != sort or cursor_desc != descending:
+        raise ValueError("游标与排序方式不一致")
+    return value, filename
+
+
+def _file_item(category: str, row) -> dict:
+    """文件记录转换为前端使用的字典，version 为内容哈希前 16 位，用于带版本的缩略图地址"""
+    return {
+        "category": category,
+        "filename": row["filename"],
+        "size": row["size"],
+        "mtime": row["mtime"],
+        "width": row["width"],
+        "height": row["height"],
+        "format": row["format"],
+        "frames": row["frames"],
+        "tier": row["tier"],
+        "version": row["hash"][:16] if row["hash"] else None,
+        "send_count": row["send_count"] if "send_count" in row.keys() else None,
+        "tags": row["tags"].split() if row["tags"] else [],
+    }
+
 
 @api.route("/emoji", methods=["GET"])
 async def get_all_emojis():
     """获取所有表情包（按类别分组）"""
-    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
-    active_group = plugin_config.get("plugin_config", {}).get("active_emotion_group", "default")
+    active_group = get_active_group()
     emoji_data = await scan_emoji_folder(group=active_group)
     for category in emoji_data:
         if not isinstance(emoji_data[category], list):
@@ -30,59 +103,252 @@ async def get_all_emojis():
 @api.route("/emoji/<category>", methods=["GET"])
 async def get_emojis_by_category(category):
     """获取指定类别的表情包"""
-    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
-    active_group = plugin_config.get("plugin_config", {}).get("active_emotion_group", "default")
-    emojis = get_emoji_by_category(category, group=active_group)
+    active_group = get_active_group()
+    emojis = await get_emoji_by_category(category, group=active_group)
     if emojis is None:
         return jsonify({"message": "Category not found"}), 404
     return jsonify(emojis if isinstance(emojis, list) else []), 200
 
 
+@api.route("/categories", methods=["GET"])
+async def get_category_counts():
+    """获取当前表情组的类别及文件数，version 用于之后按 /api/changes 增量刷新"""
+    active_group = get_active_group()
+    version = await run_io(get_catalog().last_change_id)
+    counts = await count_emojis(active_group)
+    return jsonify({
+        "group": active_group,
+        "version": version,
+        "categories": [{"name": name, "count": count} for name, count in counts.items()],
+    })
+
+
+@api.route("/category/<category>/files", methods=["GET"])
+async def get_category_files(category):
+    """
+    分页获取类别中的文件
+
+    参数: sort=name|mtime|size|usage，order=asc|desc，limit（最大 500），cursor（上一页返回的 next_cursor）
+    """
+    sort = request.args.get("sort", "name")
+    if sort not in FILE_SORT_KEYS:
+        return jsonify({"message": f"不支持的排序方式: {sort}"}), 400
+    descending = request.args.get("order", "asc") == "desc"
+    limit = max(1, min(request.args.get("limit", PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    after = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            after = _decode_cursor(cursor, sort, descending)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+    active_group = get_active_group()
+    # 多取一条判断是否还有下一页
+    rows = await list_emoji_page(category, active_group, sort, descending, limit + 1, after)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        "items": [_file_item(category, row) for row in rows],
+        "next_cursor": _encode_cursor(sort, descending, rows[-1]) if has_more else None,
+    })
+
+
+@api.route("/changes", methods=["GET"])
+async def get_changes():
+    """获取当前表情组自 since 版本之后的文件和类别变化，reset 为 true 时需要整体重新加载"""
+    since = request.args.get("since", 0, type=int)
+    result = await run_io(get_catalog().group_changes_since, get_active_group(), since)
+    result["files"] = [
+        _file_item(category, row) if row is not None else {"category": category, "filename": filename, "deleted": True}
+        for category, filename, row in result["files"]
+    ]
+    return jsonify(result)
+
+
+@api.route("/search", methods=["GET"])
+async def search():
+    """
+    搜索当前表情组的类别（类别名、描述）和文件（文件名、标签）
+
+    参数: q，kind=category|file（可选），limit（最大 200），offset
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"message": "缺少搜索内容 q"}), 400
+    kind = request.args.get("kind") or None
+    if kind not in (None, "category", "file"):
+        return jsonify({"message": f"不支持的搜索类型: {kind}"}), 400
+    limit = max(1, min(request.args.get("limit", SEARCH_PAGE_SIZE, type=int), MAX_SEARCH_PAGE_SIZE))
+    offset = max(0, request.args.get("offset", 0, type=int))
+
+    active_group = get_active_group()
+    catalog = get_catalog()
+
+    def run():
+        index = get_search_index(active_group, catalog)
+        result = index.search(query, limit, offset, kind)
+        descriptions = catalog.get_descriptions(
+            active_group, sorted({hit["category"] for hit in result["results"]})
+        )
+        for hit in result["results"]:
+            hit["description"] = descriptions.get(hit["category"])
+            if hit["kind"] == "file":
+                row = catalog.get_file(active_group, hit["category"], hit["filename"])
+                if row is not None:
+                    hit.update(_file_item(hit["category"], row))
+        return result
+
+    result = await run_io(run)
+    result["next_offset"] = offset + limit if offset + limit < result["total"] else None
+    return jsonify(result)
+
+
+@api.route("/emoji/tags", methods=["POST"])
+async def set_emoji_tags():
+    """设置表情包的标签（替换原有标签），tags 为列表或以空格、逗号分隔的字符串"""
+    data = await request.get_json(silent=True) or {}
+    category = data.get("category")
+    filename = data.get("filename")
+    if not category or not filename:
+        return jsonify({"message": "Category and filename are required"}), 400
+    try:
+        tags = parse_tags(data.get("tags", []))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if len(tags) > MAX_TAGS:
+        return jsonify({"message": f"每个表情包最多 {MAX_TAGS} 个标签"}), 400
+    if not await run_io(get_catalog().set_file_tags, get_active_group(), category, filename, tags):
+        return jsonify({"message": "Emoji not found"}), 404
+    return jsonify({"category": category, "filename": filename, "tags": tags})
+
+
 @api.route("/emoji/add", methods=["POST"])
 async def add_emoji():
-    """添加表情包到指定类别"""
+    """添加表情包到指定类别，一次请求可以包含多个 image_file 文件"""
+    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
+    active_group = get_active_group()
+    options = {**DEFAULT_UPLOAD_OPTIONS, **(plugin_config.get("plugin_config", {}).get("uploads") or {})}
+    uploads = []
     try:
-        files = await request.files
-        if not files or "image_file" not in files:
-            return jsonify({"message": "没有找到上传的图片文件"}), 400
-        
-        image_file = files["image_file"]
-        form = await request.form
+        form, uploads = await receive_multipart(
+            request,
+            os.path.join(MEMES_DIR, active_group, UPLOAD_STAGING_DIR),
+            max_file_size=int(float(options["max_file_size_mb"]) * 1024 * 1024),
+            max_files=int(options["max_files"]),
+        )
         category = form.get("category")
-        
         if not category:
             return jsonify({"message": "没有指定类别"}), 400
-        
-        if not image_file or not image_file.filename:
-            return jsonify({"message": "无效的图片文件"}), 400
+        if category.startswith(".") or "/" in category or "\\" in category:
+            return jsonify({"message": f"无效的类别名: {category}"}), 400
+        if not uploads:
+            return jsonify({"message": "没有找到上传的图片文件"}), 400
 
-        plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
-        active_group = plugin_config.get("plugin_config", {}).get("active_emotion_group", "default")
-            
-        logger.info(f"收到上传请求: 组={active_group}, 类别={category}, 文件名={image_file.filename}")
-        
-        try:
-            result_path = add_emoji_to_category(category, image_file, group=active_group)
-            
+        logger.info(f"收到上传请求: 组={active_group}, 类别={category}, 文件数={len(uploads)}")
+        ingest_pool = plugin_config.get("ingest_pool")
+        results = []
+        for upload in uploads:
+            try:
+                result_path = await add_emoji_to_category(category, upload, group=active_group)
+                if ingest_pool:
+                    # 返回的文件名需要保持有效，处理时不改名
+                    await ingest_pool.submit(result_path, rename=False)
+                results.append({"filename": os.path.basename(result_path), "path": result_path, "size": upload.size})
+            except Exception as e:
+                logger.error(f"处理上传文件 {upload.filename} 时出错: {e}", exc_info=True)
+                results.append({"filename": upload.filename, "error": str(e)})
+
+        saved = [r for r in results if "error" not in r]
+        if saved:
             category_manager = plugin_config.get("category_manager")
             if category_manager:
-                category_manager.sync_with_filesystem()
-                
-            logger.info(f"表情包添加成功: {result_path}")
-            return jsonify({
-                "message": "表情包添加成功",
-                "path": result_path,
-                "category": category,
-                "filename": image_file.filename
-            }), 201
-            
-        except Exception as inner_e:
-            logger.error(f"处理上传文件时出错: {inner_e}", exc_info=True)
-            return jsonify({"message": f"处理上传文件时出错: {str(inner_e)}"}), 500
-            
+                await run_io(category_manager.sync_with_filesystem)
+            logger.info(f"表情包添加成功: {len(saved)}/{len(results)} 个文件")
+        if not saved:
+            return jsonify({"message": f"处理上传文件时出错: {results[0]['error']}", "files": results}), 400
+        return jsonify({
+            "message": "表情包添加成功",
+            "path": saved[0]["path"],
+            "category": category,
+            "filename": saved[0]["filename"],
+            "files": results,
+        }), 201
+    except UploadError as e:
+        return jsonify({"message": str(e)}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({"message": "上传的数据超过服务器允许的总大小"}), 413
     except Exception as e:
         logger.error(f"处理上传请求时发生未知异常: {e}", exc_info=True)
         return jsonify({"message": f"处理上传请求时发生未知异常: {str(e)}"}), 500
+    finally:
+        # 未成功移入类别的暂存文件
+        for upload in uploads:
+            await run_io(upload.discard)
+
+
+@api.route("/emoji/import", methods=["POST"])
+async def import_emoji_archive():
+    """从 zip/tar 压缩包批量导入表情包（压缩包边接收边写入临时目录）"""
+    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
+    active_group = get_active_group()
+    options = {**DEFAULT_UPLOAD_OPTIONS, **(plugin_config.get("plugin_config", {}).get("uploads") or {})}
+    uploads = []
+    try:
+        form, uploads = await receive_multipart(
+            request,
+            TEMP_DIR,
+            max_file_size=int(float(options["max_archive_size_mb"]) * 1024 * 1024),
+            max_files=1,
+        )
+        archive = next((upload for upload in uploads if upload.field == "archive_file"), None)
+        if archive is None or not archive.filename:
+            return jsonify({"message": "没有找到上传的压缩包"}), 400
+        default_category = form.get("category") or None
+        group_dir = os.path.join(MEMES_DIR, active_group)
+
+        logger.info(f"收到压缩包导入请求: 组={active_group}, 文件名={archive.filename}")
+        summary = await run_io(
+            import_archive, archive.tmp_path, group_dir, default_category,
+            catalog=get_catalog(), group=active_group,
+        )
+
+        # 所有文件落盘后只同步一次配置
+        category_manager = plugin_config.get("category_manager")
+        if category_manager:
+            await run_io(category_manager.sync_with_filesystem)
+
+        ingest_pool = plugin_config.get("ingest_pool")
+        if ingest_pool and ingest_pool.enabled:
+            async def submit_all(paths):
+                for path in paths:
+                    await ingest_pool.submit(path)
+            asyncio.create_task(submit_all(summary["paths"]))
+
+        summary.pop("paths")
+        return jsonify({"message": "压缩包导入完成", **summary}), 200
+    except UploadError as e:
+        return jsonify({"message": str(e)}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({"message": "上传的压缩包超过服务器允许的大小"}), 413
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"导入压缩包失败: {e}", exc_info=True)
+        return jsonify({"message": f"导入压缩包失败: {str(e)}"}), 500
+    finally:
+        for upload in uploads:
+            await run_io(upload.discard)
+
+
+@api.route("/ingest/status", methods=["GET"])
+async def get_ingest_status():
+    """获取图片规范化处理进度"""
+    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
+    ingest_pool = plugin_config.get("ingest_pool")
+    if not ingest_pool:
+        return jsonify({"enabled": False})
+    return jsonify(ingest_pool.status())
 
 
 @api.route("/emoji/delete", methods=["POST"])
@@ -94,23 +360,41 @@ async def delete_emoji():
     if not category or not image_file:
         return jsonify({"message": "Category and image file are required"}), 400
 
-    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
-    active_group = plugin_config.get("plugin_config", {}).get("active_emotion_group", "default")
+    active_group = get_active_group()
 
-    if delete_emoji_from_category(category, image_file, group=active_group):
+    if await delete_emoji_from_category(category, image_file, group=active_group):
         return jsonify({"message": "Emoji deleted successfully", "category": category, "filename": image_file}), 200
     else:
         return jsonify({"message": "Emoji not found"}), 404
 
 
+@api.route("/batch", methods=["POST"])
+async def batch_operations():
+    """批量删除、移动、重命名表情包和修改类别描述，索引修改在一个事务中提交，返回每一项的结果"""
+    data = await request.get_json(silent=True) or {}
+    operations = data.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"message": "operations 必须是非空列表"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"message": f"一次最多 {MAX_BATCH_OPERATIONS} 项操作"}), 400
+
+    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
+    try:
+        results = await apply_batch(operations, get_active_group(), plugin_config.get("category_manager"))
+    except Exception as e:
+        logger.error(f"批量操作失败: {e}", exc_info=True)
+        return jsonify({"message": f"批量操作失败: {e}"}), 500
+    succeeded = sum(1 for r in results if r["ok"])
+    return jsonify({"succeeded": succeeded, "failed": len(results) - succeeded, "results": results})
+
+
 @api.route("/emotions", methods=["GET"])
 async def get_emotions():
     """获取表情包类别描述"""
     try:
         plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
         category_manager = plugin_config.get("category_manager")
-        descriptions = category_manager.get_descriptions()
-        return jsonify(descriptions)
+        return jsonify(dict(category_manager.get_descriptions()))
     except Exception as e:
         current_app.logger.error(f"获取标签描述失败: {e}")
         return jsonify({"error": "获取标签描述失败"}), 500
@@ -132,7 +416,7 @@ async def delete_category():
         if not category_manager:
             return jsonify({"message": "Category manager not found"}), 404
 
-        if category_manager.delete_category(category):
+        if await run_io(category_manager.delete_category, category):
             return jsonify({"message": "Category deleted successfully"}), 200
         else:
             return jsonify({"message": "Failed to delete category"}), 500
@@ -151,7 +435,7 @@ async def get_sync_status():
             raise ValueError("未找到类别管理器")
         
         logger.info("获取同步状态...")
-        missing_in_config, deleted_categories = category_manager.get_sync_status()
+        missing_in_config, deleted_categories = await run_io(category_manager.get_sync_status)
         
         return jsonify({
             "status": "ok",
@@ -176,7 +460,7 @@ async def sync_config():
             raise ValueError("未找到类别管理器")
         
         logger.info("开始同步配置...")
-        if category_manager.sync_with_filesystem():
+        if await run_io(category_manager.sync_with_filesystem):
             logger.info("配置同步成功")
             return jsonify({"message": "配置同步成功"}), 200
         else:
@@ -203,7 +487,7 @@ async def update_category_description():
         if not category_manager:
             return jsonify({"message": "Category manager not found"}), 404
 
-        if category_manager.update_description(category, description):
+        if await run_io(category_manager.update_description, category, description):
             # 返回更新后的类别和描述
             return jsonify({"category": category, "description": description}), 200
         else:
@@ -232,12 +516,12 @@ async def restore_category():
             return jsonify({"message": "Category manager not found"}), 404
 
         # 创建类别目录
-        active_group = plugin_config.get("plugin_config", {}).get("active_emotion_group", "default")
+        active_group = get_active_group()
         category_path = os.path.join(MEMES_DIR, active_group, category)
-        os.makedirs(category_path, exist_ok=True)
+        await run_io(os.makedirs, category_path, exist_ok=True)
 
         # 更新类别描述
-        if category_manager.update_description(category, description):
+        if await run_io(category_manager.update_description, category, description):
             return jsonify({"message": "Category created successfully", "description": description}), 200
         else:
             return jsonify({"message": "Failed to create category"}), 500
@@ -262,7 +546,7 @@ async def rename_category():
         if not category_manager:
             return jsonify({"message": "Category manager not found"}), 404
 
-        if category_manager.rename_category(old_name, new_name):
+        if await run_io(category_manager.rename_category, old_name, new_name):
             return jsonify({"message": "Category renamed successfully"}), 200
         else:
             return jsonify({"message": "Failed to rename category"}), 500
@@ -279,7 +563,7 @@ async def get_img_host_sync_status():
         if not img_sync:
             return jsonify({"error": "图床服务未配置"}), 400
             
-        status = img_sync.check_status()
+        status = await run_io(img_sync.check_status)
         return jsonify(status)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -315,21 +599,59 @@ async def sync_from_remote():
         return jsonify({"message": str(e)}), 500
 
 
+@api.route("/img_host/sync/events", methods=["GET"])
+async def sync_progress_events():
+    """以 Server-Sent Events 推送同步进度（已完成/总数、字节数、速度、当前文件、错误），同步结束后关闭"""
+    plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
+    img_sync = plugin_config.get("img_sync")
+    if not img_sync:
+        return jsonify({"message": "图床服务未配置"}), 400
+    try:
+        # 断线重连时浏览器带上最后收到的序号，不重复推送
+        seen = int(request.headers.get("Last-Event-ID", -1))
+    except ValueError:
+        seen = -1
+
+    async def stream():
+        nonlocal seen
+        yield "retry: 3000\n\n"
+        while True:
+            # 等待在默认线程池中进行，不占用文件操作线程
+            progress = await asyncio.to_thread(img_sync.wait_progress, seen, SYNC_EVENTS_KEEPALIVE)
+            if progress["seq"] == seen:
+                yield ": keepalive\n\n"
+                continue
+            seen = progress["seq"]
+            yield f"id: {seen}\nevent: progress\ndata: {json.dumps(progress, ensure_ascii=False)}\n\n"
+            if progress.get("completed"):
+                return
+
+    response = await make_response(stream(), 200, {
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    # 事件流可能持续整个同步过程，不受响应超时限制
+    response.timeout = None
+    return response
+
+
 @api.route("/img_host/sync/check_process", methods=["GET"])
 async def check_sync_process():
-    """检查同步进程状态"""
+    """检查同步进程状态（不支持事件流时的轮询接口），同时返回最新的进度快照"""
     try:
         plugin_config = current_app.config.get("PLUGIN_CONFIG", {})
         img_sync = plugin_config.get("img_sync")
         if not img_sync or not img_sync.sync_process:
             return jsonify({"completed": True, "success": True})
-            
+
+        progress = dict(img_sync.progress)
         if not img_sync.sync_process.is_alive():
             success = img_sync.sync_process.exitcode == 0
             img_sync.sync_process = None
-            return jsonify({"completed": True, "success": success})
-            
-        return jsonify({"completed": False})
+            return jsonify({"completed": True, "success": success, "progress": progress})
+
+        return jsonify({"completed": False, "progress": progress})
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
@@ -341,10 +663,9 @@ async def get_groups():
         plugin_config_all = current_app.config.get("PLUGIN_CONFIG", {})
         plugin_config = plugin_config_all.get("plugin_config", {})
         groups = plugin_config.get("emotion_groups", {"default": {}})
-        active_group = plugin_config.get("active_emotion_group", "default")
         return jsonify({
             "groups": list(groups.keys()),
-            "active_group": active_group
+            "active_group": get_active_group()
         })
     except Exception as e:
         logger.error(f"获取表情组失败: {e}")
@@ -378,13 +699,23 @@ async def create_group():
         default_data_path = os.path.join(MEMES_BASE_DIR, "memes_data_default.json")
         new_data_path = os.path.join(MEMES_BASE_DIR, f"memes_data_{group_name}.json")
         
-        default_descriptions = load_json(default_data_path, DEFAULT_CATEGORY_DESCRIPTIONS)
-        save_json(default_descriptions, new_data_path)
-        
         new_group_memes_dir = os.path.join(MEMES_DIR, group_name)
-        os.makedirs(new_group_memes_dir, exist_ok=True)
-        for category in default_descriptions.keys():
-            os.makedirs(os.path.join(new_group_memes_dir, category), exist_ok=True)
+
+        def copy_structure():
+            default_descriptions = load_json(default_data_path, DEFAULT_CATEGORY_DESCRIPTIONS)
+            save_json(default_descriptions, new_data_path)
+            os.makedirs(new_group_memes_dir, exist_ok=True)
+            for category in default_descriptions.keys():
+                os.makedirs(os.path.join(new_group_memes_dir, category), exist_ok=True)
+
+        await run_io(copy_structure)
+
+        if plugin_conf.get("enable_blob_store", False):
+            # 启用 blob 存储时连同图片一起复制，只创建硬链接和索引记录
+            stats = await asyncio.to_thread(BlobStore().clone_group, get_catalog(), "default", group_name)
+            return jsonify({
+                "message": f"表情组 '{group_name}' 已成功创建，并复制了 default 组的 {stats['files']} 个表情包。"
+            }), 201
 
         return jsonify({"message": f"表情组 '{group_name}' 已成功创建，并继承了 default 组的分类结构。"}), 201
     except Exception as e:
@@ -415,12 +746,18 @@ async def delete_group():
         plugin_conf["emotion_groups"] = groups
         plugin_conf.save_config()
         
-        import shutil
         group_dir = os.path.join(MEMES_DIR, group_name)
-        if os.path.exists(group_dir):
-            shutil.rmtree(group_dir)
-
-        return jsonify({"message": f"Group '{group_name}' deleted successfully. Please reload plugin."}), 200
+        # 删除整个目录耗时较长，放在默认线程池，不占用处理页面请求的文件操作线程
+        await asyncio.to_thread(shutil.rmtree, group_dir, ignore_errors=True)
+        group_registry = plugin_config_all.get("group_registry")
+        if group_registry:
+            group_registry.discard(group_name)
+        await run_io(get_catalog().delete_group, group_name)
+        drop_search_index(group_name)
+        if plugin_conf.get("enable_blob_store", False):
+            await asyncio.to_thread(BlobStore().gc)
+
+        return jsonify({"message": f"Group '{group_name}' deleted successfully."}), 200
     except Exception as e:
         logger.error(f"删除表情组失败: {e}")
         return jsonify({"message": f"删除表情组失败: {str(e)}"}), 500
@@ -440,17 +777,42 @@ async def switch_group():
         if group_name not in groups:
             return jsonify({"message": f"Group '{group_name}' not found"}), 404
 
+        # 先准备好新组的类别管理器（缓存命中时只做增量对账），再一次性替换
+        group_registry = plugin_config_all.get("group_registry")
+        if group_registry:
+            def prepare():
+                manager = group_registry.get(group_name)
+                manager.sync_with_filesystem()
+                return manager
+
+            manager = await asyncio.to_thread(prepare)
+            group_registry.pinned = {group_name}
+            plugin_config_all["category_manager"] = manager
+
         plugin_conf["active_emotion_group"] = group_name
         plugin_conf.save_config()
-        
-        # 更新 category_manager
-        category_manager = plugin_config_all.get("category_manager")
-        if category_manager:
-            category_manager.__init__(active_group=group_name)
+        # 机器人进程通过索引变更日志跟随切换
+        get_catalog().set_setting("active_group", group_name)
+
+        thumbnails = plugin_config_all.get("thumbnails")
+        if thumbnails:
+            thumbnails.start_prewarm([group_name])
 
-        return jsonify({"message": f"Switched to group '{group_name}'. Please reload plugin."}), 200
+        return jsonify({"message": f"Switched to group '{group_name}'."}), 200
     except Exception as e:
         logger.error(f"切换表情组失败: {e}")
         return jsonify({"message": f"切换表情组失败: {str(e)}"}), 500
 
 
+@api.route("/storage/gc", methods=["POST"])
+async def storage_gc():
+    """清理不再被任何表情组引用的 blob"""
+    try:
+        stats = await asyncio.to_thread(BlobStore().gc)
+        thumbnails = current_app.config.get("PLUGIN_CONFIG", {}).get("thumbnails")
+        if thumbnails:
+            stats["thumbnails"] = await asyncio.to_thread(thumbnails.gc)
+        return jsonify(stats), 200
+    except Exception as e:
+        logger.error(f"清理 blob 存储失败: {e}")
+        return jsonify({"message": f"清理 blob 存储失败: {str(e)}"}), 500
@@ -0,0 +1,224 @@
+import os
+import shutil
+import hashlib
+import logging
+import tarfile
+import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Tuple, IO, Optional, List
+from ..config import MEMES_BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+CHUNK_SIZE = 64 * 1024
+
+# 导入限制，防止压缩炸弹
+DEFAULT_IMPORT_LIMITS = {
+    "max_files": 10000,
+    "max_file_mb": 10,
+    "max_total_mb": 2048,
+    "workers": 4,
+}
+
+
+def _iter_archive(archive_path: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """流式遍历压缩包中的文件条目，返回 (条目路径, 文件流)"""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                with zf.open(info) as stream:
+                    yield info.filename, stream
+    elif tarfile.is_tarfile(archive_path):
+        # r|* 为流式模式，按顺序读取且不建立完整索引
+        with tarfile.open(archive_path, mode="r|*") as tf:
+            for member in tf:
+                if not member.isfile():
+                    continue
+                stream = tf.extractfile(member)
+                if stream is None:
+                    continue
+                yield member.name, stream
+    else:
+        raise ValueError("不支持的压缩包格式，仅支持 zip 和 tar(.gz/.bz2/.xz)")
+
+
+def _is_valid_category(name: str) -> bool:
+    return bool(name) and not name.startswith(".") and name not in ("..", "__MACOSX")
+
+
+def _split_entry(entry_name: str) -> Tuple[List[str], str]:
+    parts = [p for p in entry_name.replace("\\", "/").split("/") if p and p != "."]
+    if not parts:
+        return [], ""
+    return parts[:-1], parts[-1]
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _validate_image(path: str) -> bool:
+    """校验文件确实是可解码的图片"""
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
+def import_archive(
+    archive_path: str,
+    memes_dir: str,
+    default_category: Optional[str] = None,
+    limits: Optional[Dict[str, Any]] = None,
+    catalog=None,
+    group: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    从压缩包批量导入表情包
+
+    压缩包中的文件夹名即类别名（取文件所在的最内层文件夹），
+    根目录下的文件归入 default_category，未指定时跳过。
+    条目先流式解压到暂存目录并同时计算哈希，再并行校验、去重，
+    最后统一移动到类别目录中。
+    去重使用索引中记录的哈希，只有索引中没有哈希的已有文件才重新读取计算。
+
+    Args:
+        archive_path: 压缩包路径
+        memes_dir: 当前组的表情包目录
+        default_category: 根目录文件所属类别
+        limits: 导入限制，见 DEFAULT_IMPORT_LIMITS
+        catalog: 索引库（MemeCatalog），为 None 时计算目标类别中所有已有文件的哈希
+        group: memes_dir 对应的表情组名
+
+    Returns:
+        dict: 导入结果统计
+    """
+    limits = {**DEFAULT_IMPORT_LIMITS, **(limits or {})}
+    max_file_bytes = int(limits["max_file_mb"]) * 1024 * 1024
+    max_total_bytes = int(limits["max_total_mb"]) * 1024 * 1024
+
+    summary = {
+        "imported": 0,
+        "duplicates": 0,
+        "invalid": 0,
+        "skipped": 0,
+        "categories": [],
+        "paths": [],
+        "errors": [],
+    }
+
+    # 暂存目录与表情包目录位于同一文件系统，保证最终移动是原子的
+    os.makedirs(memes_dir, exist_ok=True)
+    staging_root = os.path.join(MEMES_BASE_DIR, ".import")
+    os.makedirs(staging_root, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=staging_root)
+    pool = ThreadPoolExecutor(max_workers=max(1, int(limits["workers"])))
+    try:
+        staged = []  # (category, filename, staged_path, sha256, 校验任务)
+        existing = {}  # 类别 -> (索引中的哈希, 索引中没有哈希的文件的计算任务)
+        total_bytes = 0
+        for entry_name, stream in _iter_archive(archive_path):
+            folders, filename = _split_entry(entry_name)
+            if not filename.lower().endswith(SUPPORTED_EXTS) or filename.startswith("."):
+                summary["skipped"] += 1
+                continue
+            category = folders[-1] if folders else default_category
+            if not category or not _is_valid_category(category) or "__MACOSX" in folders:
+                summary["skipped"] += 1
+                continue
+            if len(staged) >= int(limits["max_files"]):
+                summary["errors"].append(f"超过单次导入文件数上限 {limits['max_files']}，其余文件已忽略")
+                break
+
+            staged_path = os.path.join(staging_dir, f"{len(staged)}{os.path.splitext(filename)[1].lower()}")
+            digest = hashlib.sha256()
+            size = 0
+            with open(staged_path, "wb") as out:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    size += len(chunk)
+                    if size > max_file_bytes:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            if size > max_file_bytes:
+                os.remove(staged_path)
+                summary["invalid"] += 1
+                summary["errors"].append(f"{entry_name}: 文件超过 {limits['max_file_mb']}MB")
+                continue
+            total_bytes += size
+            if total_bytes > max_total_bytes:
+                os.remove(staged_path)
+                summary["errors"].append(f"解压总大小超过 {limits['max_total_mb']}MB，其余文件已忽略")
+                break
+
+            # 解压的同时在线程池中并行校验图片、补算索引中缺少哈希的已有文件
+            if category not in existing:
+                known = {}
+                if catalog is not None and group:
+                    known = {
+                        row["filename"]: row["hash"]
+                        for row in catalog.iter_group_files(group, category)
+                        if row["hash"]
+                    }
+                futures = []
+                category_path = os.path.join(memes_dir, category)
+                if os.path.isdir(category_path):
+                    with os.scandir(category_path) as it:
+                        futures = [
+                            pool.submit(_hash_file, entry.path) for entry in it
+                            if entry.is_file() and entry.name.lower().endswith(SUPPORTED_EXTS)
+                            and entry.name not in known
+                        ]
+                existing[category] = (set(known.values()), futures)
+            staged.append((
+                category,
+                os.path.basename(filename),
+                staged_path,
+                digest.hexdigest(),
+                pool.submit(_validate_image, staged_path),
+            ))
+
+        seen = set()
+        for category, (known, futures) in existing.items():
+            seen.update((category, sha) for sha in known)
+            seen.update((category, future.result()) for future in futures)
+        for category, filename, staged_path, sha, valid in staged:
+            if not valid.result():
+                summary["invalid"] += 1
+                continue
+            if (category, sha) in seen:
+                summary["duplicates"] += 1
+                continue
+            seen.add((category, sha))
+
+            category_path = os.path.join(memes_dir, category)
+            os.makedirs(category_path, exist_ok=True)
+            target = os.path.join(category_path, filename)
+            if os.path.exists(target):
+                root, ext = os.path.splitext(filename)
+                target = os.path.join(category_path, f"{root}_{sha[:8]}{ext}")
+            os.replace(staged_path, target)
+            summary["imported"] += 1
+            summary["paths"].append(target)
+            if category not in summary["categories"]:
+                summary["categories"].append(category)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    logger.info(
+        f"压缩包导入完成: 导入 {summary['imported']}，重复 {summary['duplicates']}，"
+        f"无效 {summary['invalid']}，跳过 {summary['skipped']}"
+    )
+    return summary
@@ -0,0 +1,179 @@
+import os
+import errno
+import shutil
+import logging
+from typing import Dict, Any, Optional
+from ..config import MEMES_BASE_DIR, MEMES_DIR
+from .catalog import MemeCatalog, probe_file
+from .job_lock import JobLock
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = os.path.join(MEMES_BASE_DIR, "blobs")
+
+# 复制表情组时每批写入索引的文件数：按批提交，不在整个复制过程中占用索引的写事务
+CLONE_BATCH_SIZE = 200
+
+# 无法硬链接时的错误（跨文件系统、文件系统不支持、权限不足）
+_LINK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+class BlobStore:
+    """按内容寻址的表情包存储
+
+    每张图片以 sha256 命名保存一次（blobs/ab/abcdef....png），
+    类别目录中的文件是指向 blob 的硬链接，因此复制表情组只需要创建链接和索引记录。
+    blob 的链接数降为 1 时说明已没有类别目录引用它，由 gc 删除。
+
+    类别目录中的文件必须整体替换（写临时文件再 os.replace），不能原地改写，
+    否则会同时改动所有共享该 blob 的表情组。
+
+    复制、纳入和清理持有同一把跨进程锁，避免清理删除另一个进程正要链接的 blob。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = str(root or BLOBS_DIR)
+        self.lock = JobLock("blobs")
+
+    def blob_path(self, sha: str, ext: str) -> str:
+        return os.path.join(self.root, sha[:2], f"{sha}{ext.lower()}")
+
+    def _link(self, source: str, target: str) -> bool:
+        """把 source 硬链接到 target（原子替换），不支持硬链接时返回 False"""
+        tmp = f"{target}.link-{os.getpid()}.tmp"
+        try:
+            os.link(source, tmp)
+        except OSError as e:
+            if e.errno in _LINK_ERRNOS:
+                return False
+            raise
+        os.replace(tmp, target)
+        return True
+
+    def ingest(self, path: str, sha: Optional[str] = None) -> Optional[str]:
+        """
+        把类别目录中的文件纳入 blob 存储
+
+        blob 已存在时用硬链接替换该文件（重复内容只占一份空间），
+        否则为该文件创建 blob 链接。
+
+        Returns:
+            str | None: blob 路径，无法硬链接时返回 None（文件保持原样）
+        """
+        sha = sha or probe_file(path)["hash"]
+        blob = self.blob_path(sha, os.path.splitext(path)[1])
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            if os.path.samefile(blob, path):
+                return blob
+            return blob if self._link(blob, path) else None
+        return blob if self._link(path, blob) else None
+
+    def link_into(self, blob: str, target: str) -> None:
+        """在类别目录中创建指向 blob 的文件，不支持硬链接时退化为复制"""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not self._link(blob, target):
+            tmp = f"{target}.copy-{os.getpid()}.tmp"
+            shutil.copy2(blob, tmp)
+            os.replace(tmp, target)
+
+    def adopt_group(self, catalog: MemeCatalog, group: str, memes_dir: str) -> Dict[str, int]:
+        """把已有表情组的文件纳入 blob 存储，重复文件合并为同一份"""
+        stats = {"linked": 0, "unsupported": 0, "failed": 0}
+        with self.lock:
+            self._adopt(catalog, group, memes_dir, stats)
+        return stats
+
+    def _adopt(self, catalog: MemeCatalog, group: str, memes_dir: str, stats: Dict[str, int]) -> None:
+        for row in catalog.iter_group_files(group):
+            path = os.path.join(memes_dir, row["category"], row["filename"])
+            try:
+                if self.ingest(path, row["hash"]):
+                    stats["linked"] += 1
+                else:
+                    stats["unsupported"] += 1
+            except OSError as e:
+                stats["failed"] += 1
+                logger.warning(f"纳入 blob 存储失败 {path}: {e}")
+
+    def clone_group(
+        self,
+        catalog: MemeCatalog,
+        source_group: str,
+        target_group: str,
+        source_dir: Optional[str] = None,
+        target_dir: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        复制表情组：类别目录中的文件以硬链接指向同一个 blob，并直接复制索引记录
+
+        链接与原文件共享 inode，大小和修改时间一致，之后的对账不会重新计算哈希。
+        文件操作在事务之外进行，索引记录每 CLONE_BATCH_SIZE 个提交一次，
+        复制大表情组时其他线程（机器人的随机选图、使用统计）只需等待一个批次。
+        """
+        source_dir = source_dir or os.path.join(MEMES_DIR, source_group)
+        target_dir = target_dir or os.path.join(MEMES_DIR, target_group)
+        stats = {"files": 0, "copied": 0, "categories": 0}
+
+        catalog.ensure_group_indexed(source_group, source_dir)
+        for category in catalog.get_directory_categories(source_group):
+            os.makedirs(os.path.join(target_dir, category), exist_ok=True)
+            stats["categories"] += 1
+
+        rows = catalog.iter_group_files(source_group)
+        with self.lock:
+            for start in range(0, len(rows), CLONE_BATCH_SIZE):
+                batch = []
+                for row in rows[start:start + CLONE_BATCH_SIZE]:
+                    source = os.path.join(source_dir, row["category"], row["filename"])
+                    target = os.path.join(target_dir, row["category"], row["filename"])
+                    try:
+                        blob = self.ingest(source, row["hash"])
+                    except OSError as e:
+                        logger.warning(f"复制表情失败 {source}: {e}")
+                        continue
+                    if blob:
+                        self.link_into(blob, target)
+                    else:
+                        shutil.copy2(source, target)
+                        stats["copied"] += 1
+                    st = os.stat(target)
+                    meta = {key: row[key] for key in ("hash", "width", "height", "format", "frames")}
+                    meta.update(size=st.st_size, mtime=st.st_mtime)
+                    batch.append((row["category"], row["filename"], meta))
+                with catalog.transaction():
+                    for category, filename, meta in batch:
+                        catalog.upsert_file(target_group, category, filename, meta)
+                stats["files"] += len(batch)
+
+        logger.info(
+            f"表情组 {source_group} 已复制到 {target_group}: {stats['files']} 个文件，"
+            f"其中 {stats['copied']} 个因不支持硬链接而复制"
+        )
+        return stats
+
+    def gc(self) -> Dict[str, int]:
+        """删除没有任何类别目录引用的 blob（链接数为 1）"""
+        stats = {"scanned": 0, "removed": 0, "freed_bytes": 0}
+        if not os.path.isdir(self.root):
+            return stats
+        with self.lock, os.scandir(self.root) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as it:
+                    for entry in it:
+                        if not entry.is_file() or entry.name.endswith(".tmp"):
+                            continue
+                        stats["scanned"] += 1
+                        st = entry.stat()
+                        if st.st_nlink <= 1:
+                            try:
+                                os.remove(entry.path)
+                            except FileNotFoundError:
+                                continue
+                            stats["removed"] += 1
+                            stats["freed_bytes"] += st.st_size
+        if stats["removed"]:
+            logger.info(f"blob 清理完成: 删除 {stats['removed']} 个，释放 {stats['freed_bytes'] / 1024 / 1024:.1f}MB")
+        return stats
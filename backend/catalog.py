@@ -0,0 +1,976 @@
+import os
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+from ..config import CATALOG_DB_PATH, MEMES_BASE_DIR
+from ..utils import load_json
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+# 按版本顺序排列的建表/迁移语句，PRAGMA user_version 记录已执行到的版本
+SCHEMA_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS groups (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        migrated_at REAL
+    );
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        description TEXT,
+        dir_exists INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (group_id, name)
+    );
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+        filename TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        hash TEXT,
+        width INTEGER,
+        height INTEGER,
+        format TEXT,
+        frames INTEGER,
+        UNIQUE (category_id, filename)
+    );
+    CREATE INDEX IF NOT EXISTS idx_files_hash ON files(hash);
+    CREATE TABLE IF NOT EXISTS usage (
+        file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+        send_count INTEGER NOT NULL DEFAULT 0,
+        last_sent REAL
+    );
+    """,
+    # 记录类别目录上次扫描时的 mtime（纳秒），未变化的目录对账时跳过
+    """
+    ALTER TABLE categories ADD COLUMN dir_mtime INTEGER;
+    """,
+    # 进程间共享的运行时设置（如 WebUI 切换的当前表情组）
+    """
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    # 按会话（unified_msg_origin）指定的表情组
+    """
+    CREATE TABLE IF NOT EXISTS chat_groups (
+        origin TEXT PRIMARY KEY,
+        group_name TEXT NOT NULL
+    );
+    """,
+    # 存储层级：local 为本地文件，cloud 为已移出本地、只保留在图床上的文件
+    """
+    ALTER TABLE files ADD COLUMN tier TEXT NOT NULL DEFAULT 'local';
+    ALTER TABLE files ADD COLUMN remote_url TEXT;
+    CREATE INDEX IF NOT EXISTS idx_usage_last_sent ON usage(last_sent);
+    """,
+    # 变更日志：其他进程（如 WebUI）按 id 增量读取类别描述和设置的修改
+    """
+    CREATE TABLE IF NOT EXISTS changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_name TEXT,
+        kind TEXT NOT NULL,
+        name TEXT,
+        pid INTEGER NOT NULL,
+        created REAL NOT NULL
+    );
+    """,
+    # 文件级变更（WebUI 增量刷新）和分页排序用的索引
+    """
+    ALTER TABLE changes ADD COLUMN category TEXT;
+    CREATE INDEX IF NOT EXISTS idx_files_category_mtime ON files(category_id, mtime, filename);
+    CREATE INDEX IF NOT EXISTS idx_files_category_size ON files(category_id, size, filename);
+    """,
+    # 文件标签（空格分隔），用于搜索
+    """
+    ALTER TABLE files ADD COLUMN tags TEXT;
+    """,
+]
+
+# 变更日志的记录类型：类别描述、表情组删除、运行时设置（name 为设置项）、
+# 单个文件（name 为文件名，category 为类别）、类别目录出现或消失
+CHANGE_DESCRIPTION = "description"
+CHANGE_GROUP_DELETED = "group_deleted"
+CHANGE_SETTING = "setting"
+CHANGE_FILE = "file"
+CHANGE_CATEGORY = "category"
+# 不写入变更日志：读取方落后太多、中间的记录已被清理时由 ChangeFeed 生成，表示需要整体重新加载
+CHANGE_RESET = "reset"
+
+# 变更日志保留的条数，读取方落后超过该条数时应整体重新加载
+CHANGES_KEEP = 10000
+
+# 分页列出文件时支持的排序方式 -> 排序表达式
+FILE_SORT_KEYS = {
+    "name": "f.filename",
+    "mtime": "f.mtime",
+    "size": "f.size",
+    "usage": "COALESCE(u.send_count, 0)",
+}
+
+# 使用统计在内存中累积，达到条数或间隔后批量写入
+USAGE_FLUSH_SIZE = 32
+USAGE_FLUSH_INTERVAL = 10.0
+
+# mtime 距今小于该值的目录不记录 mtime：同一时间片内的后续修改可能不会改变 mtime，
+# 下次对账时需要重新扫描（与 git 处理 racy 索引的方式相同）
+RACY_MTIME_NS = 2 * 1_000_000_000
+
+
+def probe_file(path: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """读取文件的大小、修改时间、哈希、尺寸、格式和帧数，已知内容哈希（如上传时边写边算）时不再重新读取计算"""
+    st = os.stat(path)
+    if sha256 is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+    meta = {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "hash": sha256,
+        "width": None,
+        "height": None,
+        "format": os.path.splitext(path)[1].lower().lstrip(".") or None,
+        "frames": None,
+    }
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            meta["width"], meta["height"] = img.size
+            meta["format"] = (img.format or meta["format"] or "").lower()
+            meta["frames"] = getattr(img, "n_frames", 1)
+    except Exception:
+        pass
+    return meta
+
+
+class MemeCatalog:
+    """表情包目录索引（SQLite, WAL 模式）
+
+    记录每个表情组的类别描述和文件元数据，读取方通过索引查询，
+    不再每次遍历目录。每个进程使用独立连接，同一进程内的线程共享连接并加锁。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = str(db_path or CATALOG_DB_PATH)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._depth = 0
+        self._usage: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+        self._usage_flushed_at = time.monotonic()
+
+    def __getstate__(self):
+        # 连接不能跨进程使用，传递到子进程后重新连接
+        return {"db_path": self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_path"])
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = self._connect()
+            self._pid = os.getpid()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate_schema(conn)
+        return conn
+
+    def _migrate_schema(self, conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version, len(SCHEMA_MIGRATIONS)):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 其他进程可能已经完成了迁移
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if current <= target:
+                    for statement in SCHEMA_MIGRATIONS[target].split(";"):
+                        if statement.strip():
+                            conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {target + 1}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务，可嵌套，最外层提交"""
+        with self._lock:
+            conn = self.conn
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._depth -= 1
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._depth = 0
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        self.flush_usage()
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    # ---- 表情组 ----
+
+    def _group_id(self, conn: sqlite3.Connection, group: str, create: bool = True) -> Optional[int]:
+        row = conn.execute("SELECT id FROM groups WHERE name = ?", (group,)).fetchone()
+        if row:
+            return row["id"]
+        if not create:
+            return None
+        return conn.execute("INSERT INTO groups (name) VALUES (?)", (group,)).lastrowid
+
+    def _category_id(self, conn: sqlite3.Connection, group: str, category: str, create: bool = True) -> Optional[int]:
+        """类别的 id，create 为 False 时只查询，表情组或类别不存在时返回 None 且不写入任何记录"""
+        group_id = self._group_id(conn, group, create)
+        if group_id is None:
+            return None
+        row = conn.execute(
+            "SELECT id FROM categories WHERE group_id = ? AND name = ?", (group_id, category)
+        ).fetchone()
+        if row:
+            return row["id"]
+        if not create:
+            return None
+        return conn.execute(
+            "INSERT INTO categories (group_id, name) VALUES (?, ?)", (group_id, category)
+        ).lastrowid
+
+    def is_migrated(self, group: str) -> bool:
+        rows = self._query("SELECT migrated_at FROM groups WHERE name = ?", (group,))
+        return bool(rows) and rows[0]["migrated_at"] is not None
+
+    def list_groups(self) -> List[str]:
+        return [row["name"] for row in self._query("SELECT name FROM groups ORDER BY id")]
+
+    def migrate_group(self, group: str, memes_dir: str, descriptions: Dict[str, str]) -> None:
+        """从旧的 memes_data_<group>.json 和目录结构导入一个表情组"""
+        started = time.time()
+        # 先写入描述以保留原 JSON 中的类别顺序，扫描完成后才标记为已导入
+        with self.transaction() as conn:
+            for category, description in descriptions.items():
+                category_id = self._category_id(conn, group, category)
+                conn.execute("UPDATE categories SET description = ? WHERE id = ?", (description, category_id))
+        self.scan_group(group, memes_dir)
+        with self.transaction() as conn:
+            conn.execute("UPDATE groups SET migrated_at = ? WHERE name = ?", (time.time(), group))
+        logger.info(f"表情组 {group} 已导入索引，用时 {time.time() - started:.2f}s")
+
+    def ensure_group_indexed(self, group: str, memes_dir: Optional[str] = None) -> None:
+        """确保表情组已导入索引（未导入时从 JSON 和目录迁移）"""
+        if self.is_migrated(group):
+            return
+        memes_dir = memes_dir or os.path.join(MEMES_BASE_DIR, "memes", group)
+        data_path = os.path.join(MEMES_BASE_DIR, f"memes_data_{group}.json")
+        descriptions = load_json(data_path, {}) if os.path.exists(data_path) else {}
+        self.migrate_group(group, memes_dir, descriptions)
+
+    def delete_group(self, group: str) -> None:
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM groups WHERE name = ?", (group,))
+            conn.execute("DELETE FROM chat_groups WHERE group_name = ?", (group,))
+            self._log_change(conn, group, CHANGE_GROUP_DELETED)
+
+    # ---- 会话表情组 ----
+
+    def get_chat_groups(self) -> Dict[str, str]:
+        """返回 {unified_msg_origin: 表情组}"""
+        return {row["origin"]: row["group_name"] for row in self._query("SELECT origin, group_name FROM chat_groups")}
+
+    def set_chat_group(self, origin: str, group: Optional[str]) -> None:
+        """指定会话使用的表情组，group 为 None 时恢复默认"""
+        with self.transaction() as conn:
+            if group is None:
+                conn.execute("DELETE FROM chat_groups WHERE origin = ?", (origin,))
+            else:
+                conn.execute(
+                    """
+                    INSERT INTO chat_groups (origin, group_name) VALUES (?, ?)
+                    ON CONFLICT (origin) DO UPDATE SET group_name = excluded.group_name
+                    """,
+                    (origin, group),
+                )
+
+    # ---- 设置 ----
+
+    def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        rows = self._query("SELECT value FROM settings WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else default
+
+    def set_setting(self, key: str, value: Optional[str]) -> None:
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+            self._log_change(conn, None, CHANGE_SETTING, key)
+
+    # ---- 变更日志 ----
+
+    def _log_change(
+        self,
+        conn: sqlite3.Connection,
+        group: Optional[str],
+        kind: str,
+        name: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> None:
+        """在当前写事务中追加一条变更记录，并清理过旧的记录"""
+        cursor = conn.execute(
+            "INSERT INTO changes (group_name, kind, name, category, pid, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (group, kind, name, category, os.getpid(), time.time()),
+        )
+        conn.execute("DELETE FROM changes WHERE id <= ?", (cursor.lastrowid - CHANGES_KEEP,))
+
+    def data_version(self) -> int:
+        """
+        本进程连接的 PRAGMA data_version
+
+        其他连接提交写事务后该值会变化，本连接自己的提交不会改变它，
+        可以用极低的开销判断是否需要读取变更日志。
+        """
+        with self._lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change_id(self) -> int:
+        rows = self._query("SELECT COALESCE(MAX(id), 0) AS id FROM changes")
+        return rows[0]["id"]
+
+    def oldest_change_id(self) -> Optional[int]:
+        """变更日志中最早的记录 id，日志为空时为 None"""
+        return self._query("SELECT MIN(id) AS id FROM changes")[0]["id"]
+
+    def changes_since(self, change_id: int) -> List[sqlite3.Row]:
+        """读取 id 大于 change_id 的变更记录（按顺序）"""
+        return self._query(
+            "SELECT id, group_name, kind, name, category, pid FROM changes WHERE id > ? ORDER BY id",
+            (change_id,),
+        )
+
+    def group_changes_since(self, group: str, change_id: int) -> Dict[str, Any]:
+        """
+        表情组在 change_id 之后的文件和类别变化（WebUI 图库增量刷新）
+
+        Returns:
+            dict: version 为当前最新的变更 id；reset 为 True 表示变更日志已被清理或表情组被删除，
+            需要整体重新加载；files 为变化文件的 (类别, 文件名, 当前记录)，已删除或已移到图床的记录为 None；
+            categories 为描述或目录发生变化的类别；counts 为涉及类别当前的本地文件数
+        """
+        version = self.last_change_id()
+        oldest = self.oldest_change_id()
+        result = {"version": version, "reset": False, "files": [], "categories": [], "counts": {}}
+        if oldest is not None and change_id + 1 < oldest:
+            result["reset"] = True
+            return result
+
+        files, categories = {}, set()
+        for row in self._query(
+            "SELECT kind, name, category FROM changes WHERE id > ? AND id <= ? AND group_name = ? ORDER BY id",
+            (change_id, version, group),
+        ):
+            if row["kind"] == CHANGE_GROUP_DELETED:
+                result["reset"] = True
+                return result
+            if row["kind"] == CHANGE_FILE:
+                files[(row["category"], row["name"])] = None
+            elif row["kind"] in (CHANGE_DESCRIPTION, CHANGE_CATEGORY):
+                categories.add(row["name"])
+
+        for category, filename in files:
+            row = self.get_file(group, category, filename)
+            result["files"].append((category, filename, row if row is not None and row["tier"] == "local" else None))
+        result["categories"] = sorted(categories)
+        for category in {category for category, _ in files} | categories:
+            result["counts"][category] = self.count_files(group, category, local_only=True)
+        return result
+
+    # ---- 类别与描述 ----
+
+    def get_descriptions(self, group: str, categories: Optional[List[str]] = None) -> Dict[str, str]:
+        """获取表情组的类别描述，指定 categories 时只读取这些类别"""
+        sql = """
+            SELECT c.name, c.description FROM categories c JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.description IS NOT NULL
+        """
+        params: Tuple = (group,)
+        if categories is not None:
+            categories = list(categories)
+            if not categories:
+                return {}
+            sql += f" AND c.name IN ({','.join('?' * len(categories))})"
+            params += tuple(categories)
+        rows = self._query(sql + " ORDER BY c.id", params)
+        return {row["name"]: row["description"] for row in rows}
+
+    def set_description(self, group: str, category: str, description: str) -> None:
+        with self.transaction() as conn:
+            category_id = self._category_id(conn, group, category)
+            conn.execute("UPDATE categories SET description = ? WHERE id = ?", (description, category_id))
+            self._log_change(conn, group, CHANGE_DESCRIPTION, category)
+
+    def rename_category(self, group: str, old_name: str, new_name: str) -> None:
+        with self.transaction() as conn:
+            group_id = self._group_id(conn, group)
+            # 目标类别已存在（例如仅有目录）时先合并掉，避免唯一约束冲突
+            conn.execute(
+                "DELETE FROM categories WHERE group_id = ? AND name = ? AND description IS NULL",
+                (group_id, new_name),
+            )
+            conn.execute(
+                "UPDATE categories SET name = ? WHERE group_id = ? AND name = ?",
+                (new_name, group_id, old_name),
+            )
+            self._log_change(conn, group, CHANGE_DESCRIPTION, old_name)
+            self._log_change(conn, group, CHANGE_DESCRIPTION, new_name)
+
+    def delete_category(self, group: str, category: str) -> None:
+        with self.transaction() as conn:
+            group_id = self._group_id(conn, group)
+            conn.execute("DELETE FROM categories WHERE group_id = ? AND name = ?", (group_id, category))
+            self._log_change(conn, group, CHANGE_DESCRIPTION, category)
+
+    def category_counts(self, group: str) -> Dict[str, int]:
+        """返回 {类别: 本地文件数}，包含没有文件的类别目录（与 list_group_files 的类别一致）"""
+        rows = self._query(
+            """
+            SELECT c.name, COUNT(f.id) AS n FROM categories c JOIN groups g ON g.id = c.group_id
+            LEFT JOIN files f ON f.category_id = c.id AND f.tier = 'local'
+            WHERE g.name = ? GROUP BY c.id HAVING c.dir_exists = 1 OR n > 0 ORDER BY c.name
+            """,
+            (group,),
+        )
+        return {row["name"]: row["n"] for row in rows}
+
+    def get_directory_categories(self, group: str) -> List[str]:
+        rows = self._query(
+            """
+            SELECT c.name FROM categories c JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.dir_exists = 1 ORDER BY c.name
+            """,
+            (group,),
+        )
+        return [row["name"] for row in rows]
+
+    # ---- 文件 ----
+
+    # 列出文件的方法（管理后台、图库、搜索）只返回本地文件；已移到图床（cloud 层级）的文件
+    # 磁盘上不存在，只在机器人随机选图时按需取回（random_file 包含两种层级）
+
+    def list_files(self, group: str, category: str) -> List[str]:
+        """类别中的本地文件名"""
+        rows = self._query(
+            """
+            SELECT f.filename FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.name = ? AND f.tier = 'local' ORDER BY f.filename
+            """,
+            (group, category),
+        )
+        return [row["filename"] for row in rows]
+
+    def list_files_page(
+        self,
+        group: str,
+        category: str,
+        sort: str = "name",
+        descending: bool = False,
+        limit: int = 100,
+        after: Optional[Tuple[Any, str]] = None,
+    ) -> List[sqlite3.Row]:
+        """
+        按游标分页列出类别中的文件
+
+        使用键集分页（从上一页最后一项之后继续），翻到后面的页不需要跳过前面的行，
+        分页期间有文件增删也不会重复或漏掉未变化的文件。
+
+        Args:
+            sort: 排序方式，FILE_SORT_KEYS 中的键；同值按文件名排序
+            after: 上一页最后一项的 (sort_value, filename)，None 为第一页
+        """
+        key = FILE_SORT_KEYS[sort]
+        direction, op = ("DESC", "<") if descending else ("ASC", ">")
+        sql = f"""
+            SELECT f.*, COALESCE(u.send_count, 0) AS send_count, u.last_sent, {key} AS sort_value
+            FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            LEFT JOIN usage u ON u.file_id = f.id
+            WHERE g.name = ? AND c.name = ? AND f.tier = 'local'
+        """
+        params: Tuple = (group, category)
+        if after is not None:
+            sql += f" AND ({key}, f.filename) {op} (?, ?)"
+            params += tuple(after)
+        sql += f" ORDER BY {key} {direction}, f.filename {direction} LIMIT ?"
+        return self._query(sql, params + (limit,))
+
+    def list_group_files(self, group: str) -> Dict[str, List[str]]:
+        """返回 {类别: [本地文件名]}，包含没有文件的类别目录"""
+        result = {name: [] for name in self.get_directory_categories(group)}
+        rows = self._query(
+            """
+            SELECT c.name AS category, f.filename FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND f.tier = 'local' ORDER BY c.name, f.filename
+            """,
+            (group,),
+        )
+        for row in rows:
+            result.setdefault(row["category"], []).append(row["filename"])
+        return result
+
+    def iter_group_files(
+        self, group: str, category: Optional[str] = None, local_only: bool = False
+    ) -> List[sqlite3.Row]:
+        """返回表情组内所有文件的元数据（包括已移到图床的），指定 category 时只返回该类别"""
+        sql = """
+            SELECT c.name AS category, f.* FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ?
+        """
+        if local_only:
+            sql += " AND f.tier = 'local'"
+        params: Tuple = (group,)
+        if category is not None:
+            sql += " AND c.name = ?"
+            params += (category,)
+        return self._query(sql + " ORDER BY c.name, f.filename", params)
+
+    def known_hashes(self) -> set:
+        """所有表情组中出现过的内容哈希"""
+        return {row["hash"] for row in self._query("SELECT DISTINCT hash FROM files WHERE hash IS NOT NULL")}
+
+    def count_files(self, group: str, category: str, local_only: bool = False) -> int:
+        """类别中的文件数，local_only 时不计已移到图床的文件"""
+        sql = """
+            SELECT COUNT(*) AS n FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.name = ?
+        """
+        if local_only:
+            sql += " AND f.tier = 'local'"
+        return self._query(sql, (group, category))[0]["n"]
+
+    def random_file(self, group: str, category: str) -> Optional[str]:
+        """随机选取类别中的一个文件，返回文件名"""
+        count = self.count_files(group, category)
+        if not count:
+            return None
+        rows = self._query(
+            """
+            SELECT f.filename FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.name = ? ORDER BY f.id LIMIT 1 OFFSET ?
+            """,
+            (group, category, random.randrange(count)),
+        )
+        return rows[0]["filename"] if rows else None
+
+    def get_file(self, group: str, category: str, filename: str) -> Optional[sqlite3.Row]:
+        rows = self._query(
+            """
+            SELECT c.name AS category, f.* FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.name = ? AND f.filename = ?
+            """,
+            (group, category, filename),
+        )
+        return rows[0] if rows else None
+
+    def set_file_tags(self, group: str, category: str, filename: str, tags: List[str]) -> bool:
+        """设置文件的标签（替换原有标签），文件不在索引中时返回 False"""
+        with self.transaction() as conn:
+            category_id = self._category_id(conn, group, category, create=False)
+            if category_id is None:
+                return False
+            cursor = conn.execute(
+                "UPDATE files SET tags = ? WHERE category_id = ? AND filename = ?",
+                (" ".join(tags) or None, category_id, filename),
+            )
+            if not cursor.rowcount:
+                return False
+            self._log_change(conn, group, CHANGE_FILE, filename, category)
+            return True
+
+    def upsert_file(self, group: str, category: str, filename: str, meta: Dict[str, Any]) -> None:
+        with self.transaction() as conn:
+            category_id = self._category_id(conn, group, category)
+            conn.execute("UPDATE categories SET dir_exists = 1 WHERE id = ?", (category_id,))
+            conn.execute(
+                """
+                INSERT INTO files (category_id, filename, size, mtime, hash, width, height, format, frames)
+                VALUES (:category_id, :filename, :size, :mtime, :hash, :width, :height, :format, :frames)
+                ON CONFLICT (category_id, filename) DO UPDATE SET
+                    size = excluded.size, mtime = excluded.mtime, hash = excluded.hash,
+                    width = excluded.width, height = excluded.height,
+                    format = excluded.format, frames = excluded.frames, tier = 'local'
+                """,
+                {**meta, "category_id": category_id, "filename": filename},
+            )
+            self._log_change(conn, group, CHANGE_FILE, filename, category)
+
+    def remove_file(self, group: str, category: str, filename: str) -> None:
+        with self.transaction() as conn:
+            category_id = self._category_id(conn, group, category, create=False)
+            if category_id is not None:
+                cursor = conn.execute(
+                    "DELETE FROM files WHERE category_id = ? AND filename = ?", (category_id, filename)
+                )
+                if cursor.rowcount:
+                    self._log_change(conn, group, CHANGE_FILE, filename, category)
+
+    def apply_file_changes(
+        self,
+        group: str,
+        removed: List[Tuple[str, str]] = (),
+        moved: List[Tuple[str, str, str, str]] = (),
+    ) -> None:
+        """
+        在同一个事务中登记文件的删除和移动（批量操作）
+
+        移动只修改记录所属的类别和文件名，哈希、尺寸和使用统计随文件保留，不重新读取文件。
+
+        Args:
+            removed: [(类别, 文件名)]
+            moved: [(原类别, 原文件名, 新类别, 新文件名)]
+        """
+        with self.transaction() as conn:
+            for category, filename in removed:
+                category_id = self._category_id(conn, group, category, create=False)
+                if category_id is None:
+                    continue
+                cursor = conn.execute(
+                    "DELETE FROM files WHERE category_id = ? AND filename = ?", (category_id, filename)
+                )
+                if cursor.rowcount:
+                    self._log_change(conn, group, CHANGE_FILE, filename, category)
+            for category, filename, new_category, new_filename in moved:
+                source_id = self._category_id(conn, group, category, create=False)
+                target_id = self._category_id(conn, group, new_category)
+                conn.execute("UPDATE categories SET dir_exists = 1 WHERE id = ?", (target_id,))
+                # 目标位置原有的记录（被覆盖的文件）先删除
+                conn.execute(
+                    "DELETE FROM files WHERE category_id = ? AND filename = ?", (target_id, new_filename)
+                )
+                if source_id is not None:
+                    conn.execute(
+                        "UPDATE files SET category_id = ?, filename = ? WHERE category_id = ? AND filename = ?",
+                        (target_id, new_filename, source_id, filename),
+                    )
+                self._log_change(conn, group, CHANGE_FILE, filename, category)
+                self._log_change(conn, group, CHANGE_FILE, new_filename, new_category)
+
+    def refresh_file(self, group: str, category: str, filename: str, path: str) -> None:
+        """按磁盘现状更新单个文件的索引"""
+        if os.path.isfile(path):
+            self.upsert_file(group, category, filename, probe_file(path))
+        else:
+            self.remove_file(group, category, filename)
+
+    def fresh_file(self, group: str, category: str, filename: str, path: str) -> Optional[sqlite3.Row]:
+        """
+        获取与磁盘一致的文件记录
+
+        大小或修改时间与磁盘不符（文件被替换）或尚未入索引时先更新索引，
+        文件不存在时返回 None。
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        row = self.get_file(group, category, filename)
+        if row is None or not row["hash"] or row["size"] != st.st_size or row["mtime"] != st.st_mtime:
+            self.refresh_file(group, category, filename, path)
+            row = self.get_file(group, category, filename)
+        return row if row is not None and row["hash"] else None
+
+    # ---- 目录扫描 ----
+
+    def get_dir_mtimes(self, group: str) -> Dict[str, Optional[int]]:
+        """返回索引中存在目录的类别及其上次扫描时的目录 mtime"""
+        rows = self._query(
+            """
+            SELECT c.name, c.dir_mtime FROM categories c JOIN groups g ON g.id = c.group_id
+            WHERE g.name = ? AND c.dir_exists = 1
+            """,
+            (group,),
+        )
+        return {row["name"]: row["dir_mtime"] for row in rows}
+
+    def _diff_category(
+        self, group: str, category: str, category_dir: str, dir_mtime: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """对比目录与索引，只对新增或大小/修改时间变化的文件计算元数据（不持有写锁）"""
+        cloud = set()  # 只在图床上的文件，本地不存在是正常的
+        with self._lock:
+            category_id = self._category_id(self.conn, group, category, create=False)
+            indexed = {}
+            if category_id is not None:
+                for row in self.conn.execute(
+                    "SELECT filename, size, mtime, tier FROM files WHERE category_id = ?", (category_id,)
+                ):
+                    indexed[row["filename"]] = (row["size"], row["mtime"])
+                    if row["tier"] != "local":
+                        cloud.add(row["filename"])
+
+        on_disk = {}
+        dir_exists = True
+        try:
+            with os.scandir(category_dir) as it:
+                for entry in it:
+                    if entry.name.lower().endswith(SUPPORTED_EXTS) and entry.is_file():
+                        st = entry.stat()
+                        on_disk[entry.name] = (st.st_size, st.st_mtime, entry.path)
+        except (FileNotFoundError, NotADirectoryError):
+            dir_exists = False
+
+        probed = {}
+        for filename, (size, mtime, path) in on_disk.items():
+            if indexed.get(filename) != (size, mtime):
+                try:
+                    probed[filename] = probe_file(path)
+                except OSError as e:
+                    logger.warning(f"读取文件失败 {path}: {e}")
+        if dir_mtime is not None and time.time_ns() - dir_mtime < RACY_MTIME_NS:
+            dir_mtime = None
+        return {
+            "group": group,
+            "category": category,
+            "dir_exists": dir_exists,
+            "dir_mtime": dir_mtime if dir_exists else None,
+            "probed": probed,
+            "added": [name for name in probed if name not in indexed],
+            "changed": [name for name in probed if name in indexed],
+            "removed": [name for name in indexed if name not in on_disk and name not in cloud],
+        }
+
+    def _apply_diff(self, diff: Dict[str, Any]) -> None:
+        with self.transaction() as conn:
+            group, category = diff["group"], diff["category"]
+            category_id = self._category_id(conn, group, category)
+            was_dir = conn.execute("SELECT dir_exists FROM categories WHERE id = ?", (category_id,)).fetchone()[0]
+            conn.execute(
+                "UPDATE categories SET dir_exists = ?, dir_mtime = ? WHERE id = ?",
+                (1 if diff["dir_exists"] else 0, diff.get("dir_mtime"), category_id),
+            )
+            if bool(was_dir) != diff["dir_exists"]:
+                self._log_change(conn, group, CHANGE_CATEGORY, category)
+            for filename in diff["removed"]:
+                conn.execute("DELETE FROM files WHERE category_id = ? AND filename = ?", (category_id, filename))
+                self._log_change(conn, group, CHANGE_FILE, filename, category)
+            for filename, meta in diff["probed"].items():
+                self.upsert_file(group, category, filename, meta)
+            # 目录已删除且没有描述的类别不再保留
+            conn.execute(
+                "DELETE FROM categories WHERE id = ? AND dir_exists = 0 AND description IS NULL",
+                (category_id,),
+            )
+
+    def scan_category(self, group: str, category: str, category_dir: str) -> bool:
+        """扫描单个类别目录并更新索引"""
+        dir_mtime = None
+        try:
+            dir_mtime = os.stat(category_dir).st_mtime_ns
+        except OSError:
+            pass
+        diff = self._diff_category(group, category, category_dir, dir_mtime)
+        self._apply_diff(diff)
+        return bool(diff["probed"] or diff["removed"])
+
+    def reconcile_group(self, group: str, memes_dir: str, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        增量对账表情组目录
+
+        只读取一次组目录（os.scandir 的目录项自带类型信息），
+        目录 mtime 与上次记录一致的类别直接跳过；force 为 True 时扫描全部类别。
+        所有变化在同一个事务中提交。
+
+        Returns:
+            list: 有变化的类别差异，另含 "was_indexed" 表示类别目录此前是否已在索引中
+        """
+        local = {}
+        try:
+            with os.scandir(memes_dir) as it:
+                for entry in it:
+                    if not entry.name.startswith(".") and entry.is_dir():
+                        local[entry.name] = entry.stat().st_mtime_ns
+        except FileNotFoundError:
+            pass
+
+        known = self.get_dir_mtimes(group)
+        diffs = []
+        for category in sorted(set(local) | set(known)):
+            dir_mtime = local.get(category)
+            if not force and category in known and dir_mtime is not None and known[category] == dir_mtime:
+                continue
+            diff = self._diff_category(group, category, os.path.join(memes_dir, category), dir_mtime)
+            diff["was_indexed"] = category in known
+            diffs.append(diff)
+
+        if diffs:
+            with self.transaction():
+                for diff in diffs:
+                    self._apply_diff(diff)
+        return [
+            diff for diff in diffs
+            if diff["probed"] or diff["removed"] or diff["dir_exists"] != diff["was_indexed"]
+        ]
+
+    def reconcile_category(self, group: str, category: str, memes_dir: str) -> Dict[str, Any]:
+        """
+        对账单个类别目录（已知发生变化的目录），不比较目录 mtime
+
+        Returns:
+            dict: 类别差异，另含 "was_indexed" 表示类别目录此前是否已在索引中
+        """
+        category_dir = os.path.join(memes_dir, category)
+        try:
+            dir_mtime = os.stat(category_dir).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        was_indexed = category in self.get_dir_mtimes(group)
+        diff = self._diff_category(group, category, category_dir, dir_mtime)
+        self._apply_diff(diff)
+        diff["was_indexed"] = was_indexed
+        return diff
+
+    def scan_group(self, group: str, memes_dir: str) -> bool:
+        """完整扫描整个表情组目录"""
+        return bool(self.reconcile_group(group, memes_dir, force=True))
+
+    # ---- 使用统计 ----
+
+    def record_usage(self, group: str, category: str, filename: str) -> None:
+        """记录一次发送（先累积在内存中，批量写入，不在发送路径上等待写事务）"""
+        key = (group, category, filename)
+        with self._lock:
+            count, _ = self._usage.get(key, (0, 0.0))
+            self._usage[key] = (count + 1, time.time())
+            due = (
+                len(self._usage) >= USAGE_FLUSH_SIZE
+                or time.monotonic() - self._usage_flushed_at >= USAGE_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush_usage()
+
+    def flush_usage(self) -> None:
+        """写入累积的使用统计"""
+        with self._lock:
+            pending, self._usage = self._usage, {}
+            self._usage_flushed_at = time.monotonic()
+            if not pending:
+                return
+            with self.transaction() as conn:
+                for (group, category, filename), (count, last_sent) in pending.items():
+                    row = conn.execute(
+                        """
+                        SELECT f.id FROM files f
+                        JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+                        WHERE g.name = ? AND c.name = ? AND f.filename = ?
+                        """,
+                        (group, category, filename),
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    conn.execute(
+                        """
+                        INSERT INTO usage (file_id, send_count, last_sent) VALUES (?, ?, ?)
+                        ON CONFLICT (file_id) DO UPDATE SET
+                            send_count = send_count + excluded.send_count, last_sent = excluded.last_sent
+                        """,
+                        (row["id"], count, last_sent),
+                    )
+
+    # ---- 存储层级 ----
+
+    def disk_usage(self, group: Optional[str] = None) -> int:
+        """
+        本地文件占用的字节数，group 为 None 时统计所有表情组
+
+        内容相同的文件只计一次：复制的表情组和 blob 存储中的文件是同一份数据的硬链接，
+        按记录累加会把共享的数据重复计算。还没有哈希的文件逐个计入。
+        """
+        where = "f.tier = 'local'" + ("" if group is None else " AND g.name = ?")
+        sql = f"""
+            SELECT COALESCE(SUM(size), 0) AS n FROM (
+                SELECT MAX(f.size) AS size FROM files f
+                JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+                WHERE {where}
+                GROUP BY COALESCE(f.hash, 'id:' || f.id)
+            )
+        """
+        return self._query(sql, () if group is None else (group,))[0]["n"]
+
+    def eviction_candidates(self, group: str, limit: int = 200, offset: int = 0) -> List[sqlite3.Row]:
+        """最久未发送的本地文件（从未发送过的按修改时间排在最前），offset 跳过前面无法移出的文件"""
+        return self._query(
+            """
+            SELECT c.name AS category, f.filename, f.size, f.hash FROM files f
+            JOIN categories c ON c.id = f.category_id JOIN groups g ON g.id = c.group_id
+            LEFT JOIN usage u ON u.file_id = f.id
+            WHERE g.name = ? AND f.tier = 'local'
+            ORDER BY COALESCE(u.last_sent, 0), f.mtime, f.id LIMIT ? OFFSET ?
+            """,
+            (group, limit, offset),
+        )
+
+    def set_tier(self, group: str, category: str, filename: str, tier: str, remote_url: Optional[str] = None) -> None:
+        with self.transaction() as conn:
+            category_id = self._category_id(conn, group, category, create=False)
+            if category_id is not None:
+                conn.execute(
+                    "UPDATE files SET tier = ?, remote_url = COALESCE(?, remote_url) WHERE category_id = ? AND filename = ?",
+                    (tier, remote_url, category_id, filename),
+                )
+                self._log_change(conn, group, CHANGE_FILE, filename, category)
+
+
+_catalogs: Dict[str, MemeCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db_path: Optional[str] = None) -> MemeCatalog:
+    """获取进程内共享的目录索引实例"""
+    key = str(db_path or CATALOG_DB_PATH)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = MemeCatalog(key)
+        return _catalogs[key]
@@ -1,21 +1,125 @@
 import os
+import shutil
 import logging
-from typing import Dict, Set, List, Tuple
+import threading
+from typing import Dict, Mapping, Set, List, Tuple, Optional
 from ..config import MEMES_BASE_DIR, MEMES_DATA_PATH_DEFAULT, DEFAULT_CATEGORY_DESCRIPTIONS
-from ..utils import ensure_dir_exists, save_json, load_json
+from ..utils import ensure_dir_exists, save_json, load_json, DebouncedJsonWriter
+from .catalog import MemeCatalog, get_catalog
+from .reconciler import FilesystemReconciler
+from .snapshot import CatalogSnapshot
+from .job_lock import JobLock
 
 logger = logging.getLogger(__name__)
 
 class CategoryManager:
-    def __init__(self, active_group: str = "default"):
+    """表情组的类别管理
+
+    类别描述和文件列表以 SQLite 目录索引为准，
+    memes_data_<group>.json 作为导出副本继续保留（延迟合并写入）。
+
+    类别描述以不可变快照（CatalogSnapshot）对外提供，每次修改生成新快照并整体替换，
+    读取方持有 snapshot 引用即可，不需要复制。
+    """
+
+    def __init__(self, active_group: str = "default", catalog: Optional[MemeCatalog] = None):
         """初始化类别管理器"""
+        # 重新初始化（切换组）前先写入旧组尚未落盘的修改
+        if getattr(self, "_writer", None) is not None:
+            self._writer.flush()
+
         self.active_group = active_group
         self.memes_dir = os.path.join(MEMES_BASE_DIR, "memes", self.active_group)
         self.memes_data_path = os.path.join(MEMES_BASE_DIR, f"memes_data_{self.active_group}.json")
         
         ensure_dir_exists(self.memes_dir)
         self._ensure_data_file()
-        self.descriptions = self._load_descriptions()
+        self.catalog = catalog or getattr(self, "catalog", None) or get_catalog()
+        self.reconciler = FilesystemReconciler(self.catalog, self.active_group, self.memes_dir)
+        if self.catalog.is_migrated(self.active_group):
+            # 启动时补上插件未运行期间的文件变化，只扫描 mtime 变化过的类别目录
+            self.reconciler.reconcile()
+        else:
+            self.catalog.migrate_group(self.active_group, self.memes_dir, self._load_descriptions())
+        # 修改类别描述时持有，读取快照不需要
+        self._lock = threading.Lock()
+        self._snapshot = CatalogSnapshot(self.active_group, self.catalog.get_descriptions(self.active_group))
+        self._writer = self._create_writer()
+
+    def __getstate__(self):
+        # 写入器持有锁和定时线程，跨进程传递时先落盘再丢弃
+        self.flush()
+        state = self.__dict__.copy()
+        state.pop("_writer", None)
+        state.pop("_lock", None)
+        # 订阅者通常是所在进程的对象，不随管理器传递
+        state.pop("reconciler", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._writer = self._create_writer()
+        self.reconciler = FilesystemReconciler(self.catalog, self.active_group, self.memes_dir)
+
+    def _create_writer(self) -> DebouncedJsonWriter:
+        """JSON 副本写入器：多个进程共用数据目录时，在跨进程锁内按索引中的最新描述写入"""
+        return DebouncedJsonWriter(
+            self.memes_data_path,
+            source=lambda: self.catalog.get_descriptions(self.active_group),
+            lock=JobLock(f"memes_data_{self.active_group}"),
+        )
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """当前的类别描述快照"""
+        return self._snapshot
+
+    @property
+    def descriptions(self) -> Mapping[str, str]:
+        """当前快照中的类别描述（只读）"""
+        return self._snapshot.descriptions
+
+    @property
+    def version(self) -> int:
+        """类别描述每修改一次加一，供缓存的提示词判断是否过期"""
+        return self._snapshot.version
+
+    def _publish(self, updates: Optional[Dict[str, str]] = None, removed=(), persist: bool = True) -> None:
+        """
+        生成新快照并替换，再登记一次 JSON 副本的延迟写入（调用方需持有 _lock）
+
+        索引是权威数据，调用前已写入成功；JSON 副本的写入失败由写入器记录日志，不影响修改结果。
+        """
+        self._snapshot = self._snapshot.with_changes(self._snapshot.version + 1, updates, removed)
+        if persist:
+            self._writer.schedule(self._snapshot.descriptions)
+
+    def reload_descriptions(self, categories: Optional[List[str]] = None, persist: bool = False) -> bool:
+        """
+        从索引重新读取类别描述（其他进程修改后，或直接写入索引的批量操作提交后调用）
+
+        Args:
+            categories: 只重新读取这些类别，None 表示全部
+            persist: 是否登记 JSON 副本的写入（其他进程修改时由修改方写入，不需要）
+
+        Returns:
+            bool: 类别描述是否发生变化
+        """
+        with self._lock:
+            current = self.catalog.get_descriptions(self.active_group, categories)
+            names = self.descriptions.keys() if categories is None else categories
+            updates = {name: desc for name, desc in current.items() if self.descriptions.get(name) != desc}
+            removed = [name for name in names if name in self.descriptions and name not in current]
+            if not (updates or removed):
+                return False
+            self._publish(updates, removed, persist=persist)
+            return True
+
+    def flush(self) -> bool:
+        """立即写入尚未落盘的类别描述和使用统计"""
+        self.catalog.flush_usage()
+        return self._writer.flush()
 
     def _ensure_data_file(self) -> None:
         """确保 memes_data.json 文件存在，不存在则创建并写入默认数据"""
@@ -28,15 +132,15 @@ class CategoryManager:
             logger.info(f"创建类别描述文件: {self.memes_data_path}")
 
     def _load_descriptions(self) -> Dict[str, str]:
-        """加载类别描述配置"""
+        """从 JSON 加载类别描述配置（仅用于首次导入索引）"""
         default_data = DEFAULT_CATEGORY_DESCRIPTIONS if self.active_group == "default" else {}
         return load_json(self.memes_data_path, default_data)
 
     def get_local_categories(self) -> Set[str]:
         """获取本地文件夹中的类别"""
         try:
-            return {d for d in os.listdir(self.memes_dir)
-                   if os.path.isdir(os.path.join(self.memes_dir, d))}
+            with os.scandir(self.memes_dir) as it:
+                return {entry.name for entry in it if not entry.name.startswith(".") and entry.is_dir()}
         except Exception as e:
             logger.error(f"获取本地类别失败: {e}")
             return set()
@@ -54,8 +158,10 @@ class CategoryManager:
     def update_description(self, category: str, description: str) -> bool:
         """更新类别描述"""
         try:
-            self.descriptions[category] = description
-            return save_json(self.descriptions, self.memes_data_path)
+            with self._lock:
+                self.catalog.set_description(self.active_group, category, description)
+                self._publish({category: description})
+                return True
         except Exception as e:
             logger.error(f"更新类别描述失败: {e}")
             return False
@@ -63,18 +169,20 @@ class CategoryManager:
     def rename_category(self, old_name: str, new_name: str) -> bool:
         """重命名类别"""
         try:
-            if old_name not in self.descriptions:
-                return False
-            
-            description = self.descriptions.pop(old_name)
-            self.descriptions[new_name] = description
-            
-            old_path = os.path.join(self.memes_dir, old_name)
-            new_path = os.path.join(self.memes_dir, new_name)
-            if os.path.exists(old_path):
-                os.rename(old_path, new_path)
-            
-            return save_json(self.descriptions, self.memes_data_path)
+            with self._lock:
+                if old_name not in self.descriptions:
+                    return False
+
+                description = self.descriptions[old_name]
+
+                old_path = os.path.join(self.memes_dir, old_name)
+                new_path = os.path.join(self.memes_dir, new_name)
+                if os.path.exists(old_path):
+                    os.rename(old_path, new_path)
+                self.catalog.rename_category(self.active_group, old_name, new_name)
+
+                self._publish({new_name: description}, removed=(old_name,))
+                return True
         except Exception as e:
             logger.error(f"重命名类别失败: {e}")
             return False
@@ -82,37 +190,82 @@ class CategoryManager:
     def delete_category(self, category: str) -> bool:
         """删除类别"""
         try:
-            if category in self.descriptions:
-                del self.descriptions[category]
-                save_json(self.descriptions, self.memes_data_path)
+            with self._lock:
+                if category in self.descriptions:
+                    self._publish(removed=(category,))
             
             category_path = os.path.join(self.memes_dir, category)
             if os.path.exists(category_path):
-                import shutil
                 shutil.rmtree(category_path)
+            self.catalog.delete_category(self.active_group, category)
             
             return True
         except Exception as e:
             logger.error(f"删除类别失败: {e}")
             return False
 
-    def get_descriptions(self) -> Dict[str, str]:
-        """获取所有类别描述"""
-        return self.descriptions.copy()
+    def get_descriptions(self) -> Mapping[str, str]:
+        """获取所有类别描述（只读视图，不复制；需要可修改的副本时自行 dict()）"""
+        return self._snapshot.descriptions
+
+    def get_files(self, category: str) -> List[str]:
+        """从索引获取类别下的文件名列表"""
+        return self.catalog.list_files(self.active_group, category)
+
+    def pick_random_file(self, category: str) -> Optional[str]:
+        """从索引中随机选取类别下的一个文件，返回完整路径"""
+        filename = self.catalog.random_file(self.active_group, category)
+        if not filename:
+            return None
+        return os.path.join(self.memes_dir, category, filename)
 
-    def sync_with_filesystem(self) -> bool:
-        """同步文件系统和配置"""
+    def record_usage(self, path: str) -> None:
+        """记录一次表情发送"""
+        category, filename = os.path.split(os.path.relpath(path, self.memes_dir))
+        self.catalog.record_usage(self.active_group, category, filename)
+
+    def refresh_file(self, path: str) -> None:
+        """按磁盘现状更新单个文件的索引，path 不在当前组目录下时忽略"""
+        rel_path = os.path.relpath(path, self.memes_dir)
+        category, filename = os.path.split(rel_path)
+        if not category or rel_path.startswith("..") or os.sep in category:
+            return
+        self.catalog.refresh_file(self.active_group, category, filename, path)
+
+    def apply_events(self, events: List[Dict]) -> bool:
+        """
+        应用对账事件到类别描述（索引已由对账器更新）
+
+        新出现的类别目录补上默认描述。
+
+        Returns:
+            bool: 类别描述是否发生变化
+        """
+        with self._lock:
+            added = {}
+            for event in events:
+                if event["filename"] is None and event["type"] == "added" and event["category"] not in self.descriptions:
+                    self.catalog.set_description(self.active_group, event["category"], "请添加描述")
+                    added[event["category"]] = "请添加描述"
+            if added:
+                self._publish(added)
+        return bool(added)
+
+    def sync_with_filesystem(self, force: bool = False) -> bool:
+        """同步文件系统和配置，默认只重新扫描发生变化的类别目录"""
         try:
-            local_categories = self.get_local_categories()
-            changed = False
-            
-            for category in local_categories:
-                if category not in self.descriptions:
-                    self.descriptions[category] = "请添加描述"
-                    changed = True
-            
-            if changed:
-                return save_json(self.descriptions, self.memes_data_path)
+            self.reconciler.reconcile(force=force)
+            local_categories = set(self.catalog.get_directory_categories(self.active_group))
+
+            with self._lock:
+                added = {}
+                for category in local_categories:
+                    if category not in self.descriptions:
+                        self.catalog.set_description(self.active_group, category, "请添加描述")
+                        added[category] = "请添加描述"
+
+                if added:
+                    self._publish(added)
             return True
         except Exception as e:
             logger.error(f"同步文件系统失败: {e}")
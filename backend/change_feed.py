@@ -0,0 +1,89 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .catalog import CHANGE_RESET, MemeCatalog
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """其他进程写入的索引变更通知
+
+    WebUI 运行在独立进程，修改类别描述或切换表情组时会在索引库的变更日志中追加记录。
+    本进程定时检查连接的 PRAGMA data_version（只有其他连接提交过写事务才会变化），
+    变化时再按 id 增量读取变更日志，把其他进程产生的记录批量交给 on_changes 回调。
+    空闲时每次检查只执行一条 PRAGMA，不读取任何表。
+
+    WebUI 以进程内模式运行时与本进程共用 pid，此时设置 include_own，本进程写入的记录也一并交给回调。
+
+    一次批量操作（例如整理表情组）可能产生超过 CHANGES_KEEP 条文件记录，
+    两次检查之间未读取的类别描述、设置记录会被清理；此时在交给回调的记录最前面
+    加一条 kind 为 CHANGE_RESET 的记录，回调应整体重新加载。
+    """
+
+    def __init__(
+        self,
+        catalog: MemeCatalog,
+        on_changes: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        interval: float = 0.5,
+    ):
+        self.catalog = catalog
+        self.on_changes = on_changes
+        self.interval = max(0.1, float(interval or 0.5))
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+        self._data_version: Optional[int] = None
+        self.include_own = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """在当前事件循环上开始检查，只处理启动之后的变更"""
+        if self._task is not None:
+            return
+        self._last_id = self.catalog.last_change_id()
+        self._data_version = self.catalog.data_version()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _poll(self) -> List[Dict[str, Any]]:
+        """读取其他进程新产生的变更（在线程中执行）"""
+        version = self.catalog.data_version()
+        if version == self._data_version:
+            return []
+        self._data_version = version
+        rows = self.catalog.changes_since(self._last_id)
+        if not rows:
+            return []
+        # 读取记录之后再取最早的 id：两次查询之间发生的清理最多导致一次多余的重新加载，不会漏判
+        oldest = self.catalog.oldest_change_id()
+        reset = oldest is not None and oldest > self._last_id + 1
+        self._last_id = rows[-1]["id"]
+        pid = os.getpid()
+        changes = [dict(row) for row in rows if self.include_own or row["pid"] != pid]
+        if reset:
+            logger.info("索引变更日志中有未读取的记录已被清理，整体重新加载")
+            changes.insert(0, {"id": oldest - 1, "group_name": None, "kind": CHANGE_RESET,
+                               "name": None, "category": None, "pid": None})
+        return changes
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                changes = await asyncio.to_thread(self._poll)
+                if changes:
+                    logger.debug(f"收到 {len(changes)} 条其他进程的索引变更")
+                    await self.on_changes(changes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理索引变更失败: {e}")
@@ -0,0 +1,190 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+from .catalog import MemeCatalog
+from .blob_store import BlobStore
+from .job_lock import single_writer
+
+logger = logging.getLogger(__name__)
+
+# 磁盘配额默认参数，可被插件配置中的 disk_quota 项覆盖
+DEFAULT_QUOTA_OPTIONS = {
+    "enable": False,
+    "group_limit_mb": 0,
+    "total_limit_mb": 0,
+    "low_watermark": 0.9,
+    "check_interval": 600,
+}
+
+# 每次读取的移出候选数，候选全部无法移出时继续读取后面的
+EVICTION_BATCH_SIZE = 200
+
+
+class ColdTierManager:
+    """磁盘配额与冷存储
+
+    表情组或全部表情组的本地文件超出配额时，把最久未发送的表情移出本地，
+    只保留在图床上（索引中标记为 cloud 层级）；之后第一次被选中发送时再下载回来。
+    只有确认图床上存在的文件才会被移出。
+    多个进程共用数据目录时，同一时间只有一个进程执行配额检查。
+
+    图床中的文件按 “类别/文件名” 标识，与当前同步的表情组目录对应，
+    因此只从该表情组中移出文件。
+    """
+
+    def __init__(self, catalog: MemeCatalog, provider, options: Optional[Dict[str, Any]] = None):
+        self.catalog = catalog
+        self.provider = provider
+        self.options = {**DEFAULT_QUOTA_OPTIONS, **(options or {})}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._fetching = set()
+        self.blobs = BlobStore()
+        self.last_run: Dict[str, Any] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.options.get("enable")) and self.provider is not None and self._limits() != (0, 0)
+
+    def _limits(self):
+        mb = 1024 * 1024
+        return (
+            int(float(self.options.get("group_limit_mb") or 0) * mb),
+            int(float(self.options.get("total_limit_mb") or 0) * mb),
+        )
+
+    def bytes_to_free(self, group: str) -> int:
+        """计算需要释放的字节数（超出配额时释放到 low_watermark 以下，避免频繁触发）"""
+        group_limit, total_limit = self._limits()
+        watermark = float(self.options.get("low_watermark") or 1.0)
+        need = 0
+        if group_limit:
+            used = self.catalog.disk_usage(group)
+            if used > group_limit:
+                need = max(need, used - int(group_limit * watermark))
+        if total_limit:
+            used = self.catalog.disk_usage()
+            if used > total_limit:
+                need = max(need, used - int(total_limit * watermark))
+        return need
+
+    def enforce(self, group: str, memes_dir: str) -> Dict[str, Any]:
+        """
+        检查配额并移出最久未发送的表情（在线程中执行，会访问图床）
+
+        只移出删除后确实能释放空间的文件，与其他表情组共用数据的硬链接保留在本地。
+
+        Returns:
+            dict: {"evicted", "freed_bytes", "skipped"}
+        """
+        stats = {"evicted": 0, "freed_bytes": 0, "skipped": 0, "time": time.time()}
+        with self._lock, single_writer("disk_quota") as acquired:
+            if not acquired:
+                # 其他进程正在检查配额
+                return stats
+            self.catalog.flush_usage()
+            need = self.bytes_to_free(group)
+            if need <= 0:
+                self.last_run = stats
+                return stats
+
+            remote = {img["id"].replace("\\", "/"): img for img in self.provider.get_image_list()}
+            # 移出的文件不再是候选，留下的（图床上没有或删除失败）用 offset 跳过
+            offset = 0
+            orphaned_blobs = False
+            while stats["freed_bytes"] < need:
+                rows = self.catalog.eviction_candidates(group, limit=EVICTION_BATCH_SIZE, offset=offset)
+                if not rows:
+                    break
+                for row in rows:
+                    if stats["freed_bytes"] >= need:
+                        break
+                    file_id = f"{row['category']}/{row['filename']}"
+                    info = remote.get(file_id)
+                    if info is None:
+                        # 图床上没有，不能移出
+                        stats["skipped"] += 1
+                        offset += 1
+                        continue
+                    path = os.path.join(memes_dir, row["category"], row["filename"])
+                    try:
+                        freed, via_blob = self._freed_by_removing(path, row["hash"])
+                        if not freed and row["size"]:
+                            # 其他表情组还链接着同一份数据，移出只会让之后发送时重新下载
+                            stats["skipped"] += 1
+                            offset += 1
+                            continue
+                        os.remove(path)
+                    except FileNotFoundError:
+                        freed, via_blob = 0, False
+                    except OSError as e:
+                        logger.warning(f"移出本地文件失败 {path}: {e}")
+                        offset += 1
+                        continue
+                    self.catalog.set_tier(group, row["category"], row["filename"], "cloud", info.get("url"))
+                    stats["evicted"] += 1
+                    stats["freed_bytes"] += freed
+                    orphaned_blobs = orphaned_blobs or via_blob
+            if orphaned_blobs:
+                # 只剩 blob 一个链接的文件由 blob 清理真正释放空间
+                self.blobs.gc()
+
+        if stats["evicted"]:
+            logger.info(
+                f"表情组 {group} 超出磁盘配额，已移出 {stats['evicted']} 个表情到图床，"
+                f"释放 {stats['freed_bytes'] / 1024 / 1024:.1f}MB"
+            )
+        self.last_run = stats
+        return stats
+
+    def _freed_by_removing(self, path: str, sha: Optional[str]):
+        """
+        删除文件后实际释放的字节数
+
+        文件还有其他硬链接（复制的表情组、默认表情包）时删除不会释放空间；
+        blob 存储中的链接不计入，它在没有其他引用后由 blob 清理删除。
+
+        Returns:
+            tuple: (释放的字节数, 是否需要 blob 清理才能释放)
+        """
+        st = os.stat(path)
+        links = st.st_nlink
+        via_blob = False
+        if links > 1 and sha:
+            try:
+                blob_st = os.stat(self.blobs.blob_path(sha, os.path.splitext(path)[1]))
+            except OSError:
+                blob_st = None
+            if blob_st is not None and os.path.samestat(st, blob_st):
+                links -= 1
+                via_blob = True
+        return (st.st_size if links <= 1 else 0), via_blob
+
+    def fetch(self, group: str, category: str, filename: str, path: str) -> bool:
+        """把只在图床上的表情下载回本地（在线程中执行），同一个表情同时只下载一次"""
+        if os.path.exists(path):
+            return True
+        if self.provider is None:
+            return False
+        key = (group, category, filename)
+        with self._fetch_lock:
+            if key in self._fetching:
+                return False
+            self._fetching.add(key)
+        try:
+            info = {"category": category, "filename": filename, "id": f"{category}/{filename}"}
+            if not self.provider.download_image(info, Path(path)):
+                return False
+            # 下载后的文件修改时间已变化，重新计算元数据时层级会恢复为 local
+            self.catalog.refresh_file(group, category, filename, path)
+            logger.info(f"已从图床取回表情 {category}/{filename}")
+            return True
+        except Exception as e:
+            logger.error(f"从图床取回表情失败 {category}/{filename}: {e}")
+            return False
+        finally:
+            with self._fetch_lock:
+                self._fetching.discard(key)
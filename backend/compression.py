@@ -0,0 +1,133 @@
+import os
+import gzip
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 响应压缩默认参数，可被插件配置中的 compression 项覆盖
+DEFAULT_COMPRESSION_OPTIONS = {
+    "enable": True,
+    "min_size": 1024,
+    "gzip_level": 6,
+    "brotli_quality": 5,
+}
+
+# 动态压缩的内容类型（图片等已压缩的格式压缩后几乎不会变小）
+COMPRESSIBLE_TYPES = (
+    "application/json", "text/html", "text/plain", "text/css", "text/javascript", "application/javascript",
+)
+
+# 预压缩的静态资源扩展名
+PRECOMPRESS_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json")
+
+# 预压缩文件的扩展名，按优先顺序
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def available_encodings() -> tuple:
+    """本机支持的压缩编码，按优先顺序"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str], offered: Iterable[str]) -> Optional[str]:
+    """
+    按 Accept-Encoding 选择压缩编码
+
+    只接受 q 值大于 0 的编码，多个可用时按 offered 的顺序（br 优先）选择。
+
+    Returns:
+        str | None: 选中的编码，客户端不接受任何可用编码时返回 None
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for encoding in offered:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, options: Optional[Dict[str, Any]] = None) -> bytes:
+    """用指定编码压缩数据"""
+    options = {**DEFAULT_COMPRESSION_OPTIONS, **(options or {})}
+    if encoding == "br":
+        return brotli.compress(data, quality=int(options["brotli_quality"]))
+    if encoding == "gzip":
+        # mtime 固定为 0，相同内容的压缩结果相同
+        return gzip.compress(data, compresslevel=int(options["gzip_level"]), mtime=0)
+    raise ValueError(f"不支持的压缩编码: {encoding}")
+
+
+def precompress_static(root: str) -> int:
+    """
+    为静态资源生成 .br/.gz 预压缩文件
+
+    只处理源文件比预压缩文件新的资源（启动 WebUI 时调用，修改源文件后自动重新生成），
+    压缩后没有变小的不生成。静态资源使用最高压缩级别，只在生成时花一次时间。
+
+    Returns:
+        int: 新生成的文件数
+    """
+    created = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            source = os.path.join(dirpath, name)
+            source_mtime = os.path.getmtime(source)
+            data = None
+            for encoding in available_encodings():
+                target = source + ENCODING_SUFFIXES[encoding]
+                if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    continue
+                if data is None:
+                    with open(source, "rb") as f:
+                        data = f.read()
+                compressed = compress(data, encoding, {"gzip_level": 9, "brotli_quality": 11})
+                if len(compressed) >= len(data):
+                    continue
+                tmp_path = f"{target}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, target)
+                created += 1
+    if created:
+        logger.info(f"已生成 {created} 个预压缩静态资源")
+    return created
+
+
+def precompressed_variant(path: str, accept_encoding: Optional[str]) -> Optional[tuple]:
+    """
+    查找与源文件同步的预压缩文件
+
+    Returns:
+        tuple | None: (预压缩文件路径, 编码)，客户端不接受或文件不存在、已过期时返回 None
+    """
+    try:
+        source_mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    offered = [
+        encoding for encoding in ENCODING_SUFFIXES
+        if os.path.exists(path + ENCODING_SUFFIXES[encoding])
+        and os.path.getmtime(path + ENCODING_SUFFIXES[encoding]) >= source_mtime
+    ]
+    encoding = negotiate(accept_encoding, offered)
+    return (path + ENCODING_SUFFIXES[encoding], encoding) if encoding else None
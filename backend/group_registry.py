@@ -0,0 +1,129 @@
+import sys
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from .catalog import MemeCatalog, get_catalog
+from .category_manager import CategoryManager
+
+logger = logging.getLogger(__name__)
+
+# 每个已加载表情组的固定开销估计（管理器、对账器、写入器等对象）
+GROUP_OVERHEAD_BYTES = 8 * 1024
+
+
+class GroupRegistry:
+    """最近使用的表情组的类别管理器缓存（LRU）
+
+    表情组在第一次使用时才加载索引和渲染提示词。切换回缓存中的表情组时不需要重新导入索引，
+    只做一次增量对账。超出数量上限或内存预算时淘汰最久未使用的组
+    （淘汰前写入未落盘的描述），pinned 中的组不会被淘汰。
+    """
+
+    def __init__(
+        self,
+        catalog: Optional[MemeCatalog] = None,
+        capacity: int = 4,
+        memory_budget_kb: int = 0,
+        render_prompt: Optional[Callable[[Dict[str, str]], str]] = None,
+    ):
+        self.catalog = catalog or get_catalog()
+        self.capacity = max(1, int(capacity or 1))
+        self.memory_budget = max(0, int(memory_budget_kb or 0)) * 1024
+        self.render_prompt = render_prompt
+        self.pinned = set()
+        self._managers: "OrderedDict[str, CategoryManager]" = OrderedDict()
+        self._prompts: Dict[str, Tuple[int, str]] = {}  # 组 -> (描述版本, 提示词)
+        self._lock = threading.RLock()
+
+    def __contains__(self, group: str) -> bool:
+        return group in self._managers
+
+    def groups(self) -> List[str]:
+        """缓存中的表情组，按最近使用排序"""
+        with self._lock:
+            return list(reversed(self._managers))
+
+    def put(self, manager: CategoryManager) -> None:
+        """放入已创建的类别管理器"""
+        with self._lock:
+            self._managers[manager.active_group] = manager
+            self._managers.move_to_end(manager.active_group)
+            self._evict()
+
+    def peek(self, group: str) -> Optional[CategoryManager]:
+        """获取缓存中的类别管理器，不改变使用顺序，也不会创建"""
+        return self._managers.get(group)
+
+    def get(self, group: str) -> CategoryManager:
+        """获取表情组的类别管理器，不在缓存中时创建（首次使用会导入索引）"""
+        with self._lock:
+            manager = self._managers.get(group)
+            if manager is None:
+                manager = CategoryManager(group, catalog=self.catalog)
+                self._managers[group] = manager
+                logger.info(f"已加载表情组 {group}")
+            self._managers.move_to_end(group)
+            self._evict()
+            return manager
+
+    def prompt_for(self, group: str) -> str:
+        """获取表情组的提示词后缀，描述变化后重新渲染"""
+        with self._lock:
+            snapshot = self.get(group).snapshot
+            cached = self._prompts.get(group)
+            if cached is None or cached[0] != snapshot.version:
+                cached = (snapshot.version, self.render_prompt(snapshot.descriptions) if self.render_prompt else "")
+                self._prompts[group] = cached
+                self._evict()
+            return cached[1]
+
+    def rendered_prompts(self) -> List[str]:
+        """缓存中所有表情组当前的提示词后缀（从请求中去除其他组的提示词时使用）"""
+        with self._lock:
+            return [prompt for _, prompt in self._prompts.values() if prompt]
+
+    def discard(self, group: str) -> None:
+        """移除表情组（表情组被删除时调用）"""
+        with self._lock:
+            manager = self._managers.pop(group, None)
+            self._prompts.pop(group, None)
+            self.pinned.discard(group)
+        if manager is not None:
+            manager.flush()
+
+    def flush_all(self) -> None:
+        """写入所有组尚未落盘的描述"""
+        with self._lock:
+            managers = list(self._managers.values())
+        for manager in managers:
+            manager.flush()
+
+    def memory_usage(self) -> int:
+        """估算已加载表情组占用的内存（字节）"""
+        with self._lock:
+            return sum(self._estimate(group) for group in self._managers)
+
+    def _estimate(self, group: str) -> int:
+        manager = self._managers[group]
+        size = GROUP_OVERHEAD_BYTES + sys.getsizeof(manager.descriptions)
+        for name, description in manager.descriptions.items():
+            size += sys.getsizeof(name) + sys.getsizeof(description)
+        if group in self._prompts:
+            size += sys.getsizeof(self._prompts[group][1])
+        return size
+
+    def _over_budget(self) -> bool:
+        if len(self._managers) > self.capacity:
+            return True
+        return bool(self.memory_budget) and self.memory_usage() > self.memory_budget
+
+    def _evict(self) -> None:
+        while self._over_budget():
+            newest = next(reversed(self._managers))
+            victim = next((g for g in self._managers if g not in self.pinned and g != newest), None)
+            if victim is None:
+                break
+            self._prompts.pop(victim, None)
+            self._managers.pop(victim).flush()
+            logger.debug(f"表情组 {victim} 已移出缓存")
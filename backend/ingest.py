@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+from ..config import MEMES_DIR, MEMES_BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 入库处理默认参数，可被插件配置中的 ingest 项覆盖
+DEFAULT_INGEST_OPTIONS = {
+    "enable": False,
+    "workers": 2,
+    "queue_size": 64,
+    "use_process_pool": False,
+    "strip_metadata": True,
+    "lossless_recompress": True,
+    "png_to_webp_threshold_kb": 512,
+    "max_dimension": 1024,
+    "keep_originals": False,
+}
+
+ORIGINALS_DIR = os.path.join(MEMES_BASE_DIR, "originals")
+
+
+def _keep_original(path: str, options: Dict[str, Any]) -> None:
+    """把原图移动到 originals 目录，保持与 memes 目录一致的相对路径"""
+    try:
+        rel_path = os.path.relpath(path, options.get("memes_dir", str(MEMES_DIR)))
+    except ValueError:
+        rel_path = os.path.basename(path)
+    if rel_path.startswith(".."):
+        rel_path = os.path.basename(path)
+    target = os.path.join(options.get("originals_dir", ORIGINALS_DIR), rel_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+
+
+def normalize_image(path: str, options: Dict[str, Any], rename: bool = True) -> Dict[str, Any]:
+    """
+    规范化单张图片（在工作线程/进程中执行）
+
+    去除元数据、可选的无损重压缩、超大 PNG 转 WebP、限制最大边长。
+    只有结果更小或尺寸被压缩时才替换原文件。
+    转为 WebP 的 PNG 改用 .webp 扩展名（重名时加序号），扩展名与内容始终一致；
+    文件名已经返回给用户（上传接口、聊天回复）时传入 rename=False，此时不转换格式。
+
+    Returns:
+        dict: {"path", "status", "before", "after", "format"}，改名时另含 "original_path"
+    """
+    from PIL import Image, ImageOps, ExifTags
+
+    result = {"path": path, "status": "skipped", "before": 0, "after": 0, "format": None}
+    before = os.path.getsize(path)
+    result["before"] = result["after"] = before
+
+    with Image.open(path) as img:
+        fmt = (img.format or "").upper()
+        result["format"] = fmt.lower()
+        # 动图重新编码容易丢帧或变大，保持原样
+        if getattr(img, "n_frames", 1) > 1:
+            return result
+
+        has_metadata = bool(img.info.get("exif") or img.getexif()) or any(
+            key in img.info for key in ("comment", "XML:com.adobe.xmp", "Description")
+        )
+        max_dim = int(options.get("max_dimension") or 0)
+        needs_resize = bool(max_dim) and max(img.size) > max_dim
+        threshold = int(options.get("png_to_webp_threshold_kb") or 0) * 1024
+        to_webp = rename and fmt == "PNG" and bool(threshold) and before > threshold
+
+        if not (needs_resize or to_webp
+                or (options.get("strip_metadata") and has_metadata)
+                or (options.get("lossless_recompress") and fmt == "PNG")):
+            return result
+
+        strip = bool(options.get("strip_metadata")) and has_metadata
+        # 只有需要按 EXIF 方向旋转时才生成新图像，否则直接保存原图像（JPEG 才能沿用原量化表）
+        orientation = img.getexif().get(ExifTags.Base.Orientation, 1) if strip else 1
+        work = ImageOps.exif_transpose(img) if orientation not in (0, 1) else img
+        work.load()
+        if needs_resize:
+            work = work.copy()
+            work.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+        save_kwargs = {}
+        icc_profile = img.info.get("icc_profile")
+        if icc_profile:
+            save_kwargs["icc_profile"] = icc_profile
+        if not options.get("strip_metadata") and img.info.get("exif"):
+            save_kwargs["exif"] = img.info["exif"]
+
+        if to_webp:
+            out_format = "WEBP"
+            save_kwargs.update(lossless=True, method=6)
+        elif fmt == "JPEG":
+            out_format = "JPEG"
+            if work is img:
+                # 原图像未经修改时沿用原量化表，避免二次有损压缩；
+                # 注释和 XMP 默认会从原图像带过来，去除元数据时需显式清空
+                save_kwargs.update(optimize=True, quality="keep")
+                if strip:
+                    save_kwargs.update(exif=b"", comment=b"", xmp=b"")
+            else:
+                save_kwargs.update(optimize=True, quality=90)
+                if work.mode not in ("RGB", "L", "CMYK"):
+                    work = work.convert("RGB")
+        elif fmt == "PNG":
+            out_format = "PNG"
+            save_kwargs.update(optimize=bool(options.get("lossless_recompress")))
+        elif fmt == "WEBP":
+            out_format = "WEBP"
+            save_kwargs.update(lossless=bool(img.info.get("lossless")), quality=90)
+        else:
+            return result
+        out_path = _webp_path(path) if to_webp else path
+
+        tmp_path = f"{out_path}.ingest-{os.getpid()}.tmp"
+        try:
+            work.save(tmp_path, format=out_format, **save_kwargs)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    after = os.path.getsize(tmp_path)
+    if after >= before and not needs_resize:
+        os.remove(tmp_path)
+        return result
+
+    if options.get("keep_originals"):
+        _keep_original(path, options)
+    os.replace(tmp_path, out_path)
+    if out_path != path:
+        os.remove(path)
+        result["original_path"] = path
+
+    result.update(path=out_path, status="normalized", after=after, format=out_format.lower())
+    return result
+
+
+def _webp_path(path: str) -> str:
+    """转为 WebP 后的文件路径：换成 .webp 扩展名，与已有文件重名时加序号"""
+    root = os.path.splitext(path)[0]
+    candidate, index = f"{root}.webp", 1
+    while os.path.exists(candidate):
+        candidate, index = f"{root}_{index}.webp", index + 1
+    return candidate
+
+
+class IngestPool:
+    """后台入库处理池
+
+    新图片通过 submit 进入有界队列（队列满时等待，形成背压），
+    由若干消费协程交给线程池/进程池执行 normalize_image。
+    """
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        self.options = {**DEFAULT_INGEST_OPTIONS, **(options or {})}
+        self.options.setdefault("memes_dir", str(MEMES_DIR))
+        self.options.setdefault("originals_dir", ORIGINALS_DIR)
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = None
+        self._consumers: List[asyncio.Task] = []
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._stats = {
+            "queued": 0,
+            "processing": 0,
+            "done": 0,
+            "normalized": 0,
+            "failed": 0,
+            "saved_bytes": 0,
+            "started_at": None,
+        }
+        self._recent = deque(maxlen=20)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.options.get("enable"))
+
+    @property
+    def running(self) -> bool:
+        return bool(self._consumers)
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """注册处理完成回调，参数为 normalize_image 的结果；回调在线程中执行，可以读写索引"""
+        self._listeners.append(callback)
+
+    async def start(self) -> None:
+        """在当前事件循环上启动消费协程"""
+        if self.running:
+            return
+        workers = max(1, int(self.options.get("workers") or 1))
+        if self.options.get("use_process_pool"):
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="meme-ingest")
+        self._queue = asyncio.Queue(maxsize=max(1, int(self.options.get("queue_size") or 1)))
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(workers)]
+        self._stats["started_at"] = time.time()
+        logger.info(f"入库处理池已启动: {workers} 个工作者")
+
+    async def submit(self, path: str, rename: bool = True) -> None:
+        """提交一张图片，队列已满时等待；文件名已返回给用户时传入 rename=False"""
+        if not self.enabled:
+            return
+        if not self.running:
+            await self.start()
+        self._stats["queued"] += 1
+        await self._queue.put((str(path), rename))
+
+    def try_submit(self, path: str, rename: bool = True) -> bool:
+        """非阻塞提交，队列已满或未启动时返回 False"""
+        if not self.enabled or not self.running:
+            return False
+        try:
+            self._queue.put_nowait((str(path), rename))
+        except asyncio.QueueFull:
+            return False
+        self._stats["queued"] += 1
+        return True
+
+    async def join(self) -> None:
+        """等待队列中所有图片处理完毕"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            path, rename = await self._queue.get()
+            self._stats["queued"] -= 1
+            self._stats["processing"] += 1
+            try:
+                result = await loop.run_in_executor(self._executor, normalize_image, path, self.options, rename)
+                self._stats["done"] += 1
+                if result["status"] == "normalized":
+                    self._stats["normalized"] += 1
+                    self._stats["saved_bytes"] += result["before"] - result["after"]
+                self._recent.append(result)
+                for callback in self._listeners:
+                    try:
+                        # 回调会更新索引（计算哈希、读取图片、写入 SQLite），不在事件循环上执行
+                        await asyncio.to_thread(callback, result)
+                    except Exception as e:
+                        logger.error(f"入库回调执行失败: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                self._recent.append({"path": path, "status": "failed", "error": str(e)})
+                logger.error(f"图片规范化失败 {path}: {e}")
+            finally:
+                self._stats["processing"] -= 1
+                self._queue.task_done()
+
+    def status(self) -> Dict[str, Any]:
+        """返回处理进度"""
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queue_capacity": self._queue.maxsize if self._queue else 0,
+            **self._stats,
+            "recent": list(self._recent),
+        }
+
+    async def stop(self) -> None:
+        """停止消费协程并关闭执行器"""
+        for task in self._consumers:
+            task.cancel()
+        if self._consumers:
+            await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
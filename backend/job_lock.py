@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from ..config import MEMES_BASE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCKS_DIR = os.path.join(MEMES_BASE_DIR, "locks")
+
+# 同一进程内按锁文件路径共享的线程锁：flock 以打开的文件为单位，
+# 同一进程重复打开同一个锁文件不会互斥，需要先在进程内串行
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+def _local_lock(path: str) -> threading.Lock:
+    with _local_locks_guard:
+        return _local_locks.setdefault(path, threading.Lock())
+
+
+class JobLock:
+    """跨进程的任务锁（单写者协调）
+
+    多个机器人实例共用同一个 memes_data 时，图床同步、磁盘配额检查、blob 清理
+    和 JSON 副本写入等任务同一时间只应由一个进程执行。锁基于操作系统的文件锁
+    （fcntl.flock / msvcrt.locking），持有锁的进程退出或崩溃后由系统自动释放，
+    不会留下需要手动清理的陈旧锁。锁文件中记录持有者的 pid 和主机名，仅用于排查。
+    """
+
+    def __init__(self, name: str, root: Optional[str] = None):
+        self.name = name
+        self.root = str(root or LOCKS_DIR)
+        self.path = os.path.join(self.root, f"{name}.lock")
+        self._fd: Optional[int] = None
+        self._owner: Optional[int] = None
+        self._thread_lock = _local_lock(self.path)
+
+    @property
+    def locked(self) -> bool:
+        """本实例是否持有锁"""
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        获取锁
+
+        Args:
+            blocking: 为 False 时锁被占用立即返回 False
+            timeout: 阻塞等待的最长秒数，None 为一直等待
+
+        Returns:
+            bool: 是否获得锁
+        """
+        # 同一线程重复获取会在线程锁上永远等待；_owner 只有持有者线程会写入自己的 id，不需要加锁读取
+        if self._owner == threading.get_ident():
+            raise RuntimeError(f"任务锁 {self.name} 不可重入")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(blocking, -1 if timeout is None or not blocking else timeout):
+            return False
+        try:
+            # 其他线程持有同一个实例时在线程锁上等待，取得线程锁后再检查
+            if self._fd is not None:
+                raise RuntimeError(f"任务锁 {self.name} 不可重入")
+            os.makedirs(self.root, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            while True:
+                if self._try_lock(fd):
+                    break
+                if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                    os.close(fd)
+                    self._thread_lock.release()
+                    return False
+                time.sleep(0.05)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._fd = fd
+        self._owner = threading.get_ident()
+        self._write_holder()
+        return True
+
+    def release(self) -> None:
+        """释放锁"""
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        self._owner = None
+        try:
+            self._unlock(fd)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def holder(self) -> Optional[Dict[str, Any]]:
+        """读取最近一次持有者的信息（不保证当前仍持有）"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+            return json.loads(content) if content else None
+        except (OSError, ValueError):
+            return None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except (BlockingIOError, PermissionError):
+            return False
+        except OSError:
+            # msvcrt 锁被占用时抛出 EDEADLOCK
+            if fcntl is None:
+                return False
+            raise
+
+    def _unlock(self, fd: int) -> None:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _write_holder(self) -> None:
+        info = json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "since": time.time()})
+        try:
+            os.ftruncate(self._fd, 0)
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            os.write(self._fd, info.encode("utf-8"))
+        except OSError:
+            pass
+
+    def __enter__(self) -> "JobLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+@contextmanager
+def single_writer(name: str, root: Optional[str] = None) -> Iterator[bool]:
+    """
+    尝试以单写者身份执行任务，不等待
+
+    用法:
+        with single_writer("quota") as acquired:
+            if not acquired:
+                return  # 其他进程正在执行
+    """
+    lock = JobLock(name, root)
+    acquired = lock.acquire(blocking=False)
+    if not acquired:
+        holder = lock.holder() or {}
+        logger.debug(f"任务 {name} 正由进程 {holder.get('pid', '?')} 执行，跳过")
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
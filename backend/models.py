@@ -1,137 +1,134 @@
 import os
-import aiofiles  # 使用 aiofiles 进行异步文件操作
+import asyncio
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 from ..config import MEMES_DIR
+from .catalog import get_catalog, probe_file
 
 logger = logging.getLogger(__name__)
 
+# WebUI 中所有文件系统和索引操作使用的有界线程池。
+# 慢磁盘最多占满这几个线程，事件循环仍能处理其他请求，也不会挤占默认线程池中的其他任务
+DEFAULT_IO_WORKERS = 4
+_io_executor = None
+_io_workers = DEFAULT_IO_WORKERS
+
+
+def configure_io(workers: int = DEFAULT_IO_WORKERS) -> None:
+    """设置文件操作线程池的大小（在首次使用前调用）"""
+    global _io_workers
+    _io_workers = max(1, int(workers or DEFAULT_IO_WORKERS))
+
+
+def _get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=_io_workers, thread_name_prefix="meme-io")
+    return _io_executor
+
+
+async def run_io(func, *args, **kwargs):
+    """在文件操作线程池中执行阻塞调用"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_io() -> None:
+    global _io_executor
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=False)
+        _io_executor = None
+
+
+def _group_catalog(group):
+    """获取已导入指定组的目录索引"""
+    catalog = get_catalog()
+    catalog.ensure_group_indexed(group, os.path.join(MEMES_DIR, group))
+    return catalog
+
 
 async def scan_emoji_folder(group="default"):
-    """扫描指定组的表情包文件夹，返回所有类别及其表情包"""
-    emoji_data = {}
-    group_dir = os.path.join(MEMES_DIR, group)
-    if not os.path.exists(group_dir):
-        os.makedirs(group_dir)
-    for category in os.listdir(group_dir):
-        category_path = os.path.join(group_dir, category)
-        if os.path.isdir(category_path):
-            emoji_files = [
-                f
-                for f in os.listdir(category_path)
-                if f.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".webp"))
-            ]
-            emoji_data[category] = emoji_files
-        else:
-            emoji_data[category] = []
-    return emoji_data
-
-
-def get_emoji_by_category(category, group="default"):
+    """从索引获取指定组的所有类别及其表情包"""
+    return await run_io(lambda: _group_catalog(group).list_group_files(group))
+
+
+async def get_emoji_by_category(category, group="default"):
     """获取指定类别下的所有表情包"""
-    category_path = os.path.join(MEMES_DIR, group, category)
-    if not os.path.isdir(category_path):
-        return []
-    emoji_files = [
-        f
-        for f in os.listdir(category_path)
-        if f.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".webp"))
-    ]
-    return emoji_files
+    return await run_io(lambda: _group_catalog(group).list_files(group, category))
+
+
+async def count_emojis(group="default"):
+    """获取指定组各类别的表情包数量"""
+    return await run_io(lambda: _group_catalog(group).category_counts(group))
+
+
+async def list_emoji_page(category, group="default", sort="name", descending=False, limit=100, after=None):
+    """按游标分页获取类别下的表情包记录"""
+    return await run_io(
+        lambda: _group_catalog(group).list_files_page(group, category, sort, descending, limit, after)
+    )
+
+
+async def add_emoji_to_category(category, upload, group="default"):
+    """把上传的文件添加到指定类别（在文件操作线程池中执行），返回保存后的文件路径"""
+    return await run_io(_add_emoji_to_category, category, upload, group)
+
+
+async def delete_emoji_from_category(category, image_file, group="default"):
+    """删除指定类别下的表情包"""
+    return await run_io(_delete_emoji_from_category, category, image_file, group)
+
+
+async def update_emoji_in_category(category, old_image_file, new_image_file, group="default"):
+    """更新（替换）表情包文件"""
+    return await run_io(_update_emoji_in_category, category, old_image_file, new_image_file, group)
+
 
+async def apply_batch(operations, group="default", category_manager=None):
+    """批量执行删除、移动、重命名和修改描述，返回每一项的结果"""
+    return await run_io(_apply_batch, operations, group, category_manager)
 
-def add_emoji_to_category(category, image_file, group="default"):
+
+def _add_emoji_to_category(category, upload, group="default"):
     """
-    添加表情包到指定类别
-    
+    把已流式写入暂存目录的上传文件移入指定类别
+
     Args:
         category: 类别名
-        image_file: 上传的文件对象
+        upload: StreamedUpload，暂存文件及写入时计算的内容哈希
         group: 表情组名
-    
+
     Returns:
         str: 保存后的文件路径
     """
-    if not image_file:
-        logger.error("没有接收到文件")
-        raise ValueError("没有接收到文件")
-        
-    if not image_file.filename:
+    if not upload.filename:
         logger.error("文件名为空")
         raise ValueError("文件名为空")
-    
-    # 使用 pathlib.Path 处理路径，避免路径问题
-    from pathlib import Path
-    
-    # 确保类别目录存在
-    category_path = Path(MEMES_DIR) / group / category
-    category_path.mkdir(parents=True, exist_ok=True)
-    
-    # 保存文件
-    filename = image_file.filename
+    if upload.size == 0:
+        logger.error(f"上传的文件 {upload.filename} 大小为0")
+        raise ValueError("上传的文件为空")
+
     # 生成安全的文件名
-    safe_filename = secure_filename(filename)
-    
-    # 如果文件名被修改了，记录日志
-    if safe_filename != filename:
-        logger.info(f"文件名已从 {filename} 修改为安全的文件名 {safe_filename}")
-        filename = safe_filename
-    
-    # 完整的文件保存路径
-    file_path = category_path / filename
-    
-    # 记录日志，包括绝对路径
-    logger.info(f"准备保存文件到: {file_path.absolute()}")
-    
-    try:
-        # 检查目录是否可写
-        if not os.access(category_path, os.W_OK):
-            logger.error(f"没有权限写入目录: {category_path}")
-            raise IOError(f"没有权限写入目录: {category_path}")
-            
-        # 检查磁盘空间是否足够
-        import shutil
-        _, _, free = shutil.disk_usage(category_path)
-        # 假设文件不会超过10MB，保险起见检查是否至少有10MB
-        if free < 10 * 1024 * 1024:
-            logger.error(f"磁盘空间不足: 只有 {free / 1024 / 1024:.2f}MB")
-            raise IOError("磁盘空间不足")
-            
-        # 直接以二进制方式读取和写入文件，避免FileStorage.save可能存在的问题
-        image_file.stream.seek(0)  # 确保从头开始读取
-        content = image_file.stream.read()
-        
-        # 以二进制写入模式保存文件
-        with open(file_path, 'wb') as f:
-            f.write(content)
-        
-        # 验证文件是否成功保存
-        if not file_path.exists():
-            logger.error(f"文件保存失败，{file_path} 不存在")
-            raise IOError(f"文件保存失败，{file_path} 不存在")
-            
-        file_size = file_path.stat().st_size
-        if file_size == 0:
-            logger.error(f"文件保存失败，{file_path} 大小为0")
-            raise IOError(f"文件保存失败，{file_path} 大小为0")
-            
-        logger.info(f"文件成功保存到 {file_path}, 大小: {file_size} 字节")
-        return str(file_path)
-        
-    except Exception as e:
-        logger.error(f"保存文件时出错: {str(e)}", exc_info=True)
-        # 如果文件已部分创建，尝试删除
-        if file_path.exists():
-            try:
-                file_path.unlink()  # 删除文件
-                logger.info(f"已删除部分上传的文件: {file_path}")
-            except Exception as del_e:
-                logger.error(f"无法删除部分上传的文件: {del_e}")
-        raise IOError(f"保存文件时出错: {str(e)}")
-
-
-def delete_emoji_from_category(category, image_file, group="default"):
-    """删除指定类别下的表情包"""
+    filename = secure_filename(upload.filename)
+    if not filename:
+        raise ValueError(f"无效的文件名: {upload.filename}")
+    if filename != upload.filename:
+        logger.info(f"文件名已从 {upload.filename} 修改为安全的文件名 {filename}")
+
+    category_path = os.path.join(MEMES_DIR, group, category)
+    os.makedirs(category_path, exist_ok=True)
+    file_path = os.path.join(category_path, filename)
+
+    # 原子替换：同名文件可能是 blob 存储的硬链接，不能原地改写；读取方看到的要么是旧文件要么是完整的新文件
+    os.replace(upload.tmp_path, file_path)
+    logger.info(f"文件成功保存到 {file_path}, 大小: {upload.size} 字节")
+    _group_catalog(group).upsert_file(group, category, filename, probe_file(file_path, sha256=upload.sha256))
+    return file_path
+
+
+def _delete_emoji_from_category(category, image_file, group="default"):
     category_path = os.path.join(MEMES_DIR, group, category)
 
     if not os.path.isdir(category_path):
@@ -139,12 +136,12 @@ def delete_emoji_from_category(category, image_file, group="default"):
     image_path = os.path.join(category_path, image_file)
     if os.path.exists(image_path):
         os.remove(image_path)
+        _group_catalog(group).remove_file(group, category, image_file)
         return True
     return False
 
 
-def update_emoji_in_category(category, old_image_file, new_image_file, group="default"):
-    """更新（替换）表情包文件"""
+def _update_emoji_in_category(category, old_image_file, new_image_file, group="default"):
     category_path = os.path.join(MEMES_DIR, group, category)
 
     if not os.path.isdir(category_path):
@@ -154,6 +151,99 @@ def update_emoji_in_category(category, old_image_file, new_image_file, group="de
         os.remove(old_image_path)
         filename = secure_filename(new_image_file.filename)
         target_path = os.path.join(category_path, filename)
-        new_image_file.save(target_path)
+        tmp_path = os.path.join(category_path, f".{filename}.upload-{os.getpid()}.tmp")
+        new_image_file.save(tmp_path)
+        os.replace(tmp_path, target_path)
+        catalog = _group_catalog(group)
+        catalog.remove_file(group, category, old_image_file)
+        catalog.upsert_file(group, category, filename, probe_file(target_path))
         return True
     return False
+
+
+# 批量操作支持的操作类型
+BATCH_OPS = ("delete", "move", "rename", "update_description")
+
+
+def _check_name(name, what):
+    """类别名和文件名不能为空、不能包含路径分隔符，也不能以 . 开头（暂存目录和临时文件）"""
+    if not isinstance(name, str) or not name or name.startswith(".") or "/" in name or "\\" in name:
+        raise ValueError(f"无效的{what}: {name!r}")
+    return name
+
+
+def _apply_batch(operations, group="default", category_manager=None):
+    """
+    批量执行表情包操作
+
+    文件操作逐项执行，失败的项记录错误后继续；所有成功项对索引的修改（删除、移动、描述）
+    最后在同一个事务中提交，类别描述的 JSON 副本也只写入一次。
+
+    Args:
+        operations: 操作列表，每项为 {"op": 操作类型, "category": ..., ...}
+            delete: category, filename
+            move: category, filename, to_category，可选 new_name
+            rename: category, filename, new_name
+            update_description: category, description
+        group: 表情组名
+        category_manager: 当前组的 CategoryManager，提交后刷新其中的类别描述
+
+    Returns:
+        list: 与 operations 一一对应的结果 {"index", "op", "ok", "error"?}
+    """
+    group_dir = os.path.join(MEMES_DIR, group)
+    catalog = _group_catalog(group)
+    results = []
+    removed, moved, descriptions = [], [], {}
+    for index, operation in enumerate(operations):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        result = {"index": index, "op": op, "ok": False}
+        try:
+            if op not in BATCH_OPS:
+                raise ValueError(f"不支持的操作: {op!r}")
+            category = _check_name(operation.get("category"), "类别名")
+            if op == "update_description":
+                description = operation.get("description")
+                if not isinstance(description, str):
+                    raise ValueError("缺少描述")
+                descriptions[category] = description
+            else:
+                filename = _check_name(operation.get("filename"), "文件名")
+                source = os.path.join(group_dir, category, filename)
+                if not os.path.isfile(source):
+                    raise FileNotFoundError(f"文件不存在: {category}/{filename}")
+                if op == "delete":
+                    os.remove(source)
+                    removed.append((category, filename))
+                else:
+                    to_category = _check_name(operation.get("to_category") or category, "类别名")
+                    new_name = secure_filename(operation.get("new_name") or filename)
+                    if not new_name:
+                        raise ValueError(f"无效的文件名: {operation.get('new_name')!r}")
+                    if (to_category, new_name) == (category, filename):
+                        raise ValueError("目标与原文件相同")
+                    target = os.path.join(group_dir, to_category, new_name)
+                    if os.path.exists(target):
+                        raise FileExistsError(f"目标文件已存在: {to_category}/{new_name}")
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.rename(source, target)
+                    moved.append((category, filename, to_category, new_name))
+                    result.update(category=to_category, filename=new_name)
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = str(e)
+        results.append(result)
+
+    with catalog.transaction():
+        catalog.apply_file_changes(group, removed, moved)
+        for category, description in descriptions.items():
+            catalog.set_description(group, category, description)
+    if category_manager is not None:
+        if descriptions:
+            category_manager.reload_descriptions(list(descriptions), persist=True)
+        if removed or moved:
+            category_manager.sync_with_filesystem()
+
+    done = sum(1 for r in results if r["ok"])
+    logger.info(f"批量操作完成: 组={group}, 成功 {done}/{len(results)} 项")
+    return results
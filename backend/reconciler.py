@@ -0,0 +1,101 @@
+import os
+import logging
+import threading
+from typing import Dict, Any, Callable, List, Optional
+from .catalog import MemeCatalog
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+EVENT_ADDED = "added"
+EVENT_REMOVED = "removed"
+EVENT_CHANGED = "changed"
+
+
+class FilesystemReconciler:
+    """表情组目录与索引的增量对账器
+
+    在索引中记录每个类别目录上次扫描时的 mtime，对账时只重新扫描 mtime 变化的目录。
+    对账结果以事件形式分发给订阅者，事件为 dict：
+        {"type": "added" | "removed" | "changed", "group", "category", "filename", "path"}
+    filename 为 None 时表示类别目录本身被创建或删除。
+
+    目录 mtime 只反映目录项的增删和重命名，原地覆盖写入的文件需要 force=True 才能发现。
+    """
+
+    def __init__(self, catalog: MemeCatalog, group: str, memes_dir: str):
+        self.catalog = catalog
+        self.group = group
+        self.memes_dir = memes_dir
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # 同一进程内同时只允许一次对账，避免重复计算哈希
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """订阅对账事件"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """取消订阅"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def reconcile(self, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        执行一次对账并分发事件
+
+        Args:
+            force: 忽略记录的目录 mtime，扫描全部类别
+
+        Returns:
+            list: 本次产生的事件
+        """
+        with self._lock:
+            diffs = self.catalog.reconcile_group(self.group, self.memes_dir, force=force)
+        events = []
+        for diff in diffs:
+            events.extend(self._events_from_diff(diff))
+        if events:
+            logger.debug(f"表情组 {self.group} 对账完成，{len(events)} 个变化")
+            self._emit(events)
+        return events
+
+    def reconcile_category(self, category: str) -> List[Dict[str, Any]]:
+        """只对账单个类别目录（已知发生变化的目录）"""
+        with self._lock:
+            diff = self.catalog.reconcile_category(self.group, category, self.memes_dir)
+        events = self._events_from_diff(diff)
+        if events:
+            self._emit(events)
+        return events
+
+    def _event(self, event_type: str, category: str, filename: Optional[str] = None) -> Dict[str, Any]:
+        path = os.path.join(self.memes_dir, category, filename) if filename else os.path.join(self.memes_dir, category)
+        return {
+            "type": event_type,
+            "group": self.group,
+            "category": category,
+            "filename": filename,
+            "path": path,
+        }
+
+    def _events_from_diff(self, diff: Dict[str, Any]) -> List[Dict[str, Any]]:
+        category = diff["category"]
+        events = []
+        if diff["dir_exists"] and not diff["was_indexed"]:
+            events.append(self._event(EVENT_ADDED, category))
+        events.extend(self._event(EVENT_ADDED, category, name) for name in diff["added"])
+        events.extend(self._event(EVENT_CHANGED, category, name) for name in diff["changed"])
+        events.extend(self._event(EVENT_REMOVED, category, name) for name in diff["removed"])
+        if not diff["dir_exists"] and diff["was_indexed"]:
+            events.append(self._event(EVENT_REMOVED, category))
+        return events
+
+    def _emit(self, events: List[Dict[str, Any]]) -> None:
+        for callback in list(self._listeners):
+            for event in events:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"对账事件回调执行失败: {e}")
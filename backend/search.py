@@ -0,0 +1,417 @@
+import re
+import math
+import heapq
+import itertools
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .catalog import MemeCatalog, get_catalog
+
+logger = logging.getLogger(__name__)
+
+# 各字段命中时的权重：类别名最能代表表情的含义，文件名多为随意命名；
+# 文件文档中也索引所在类别的名称和描述（降低权重），"开心 ca" 这样跨字段的查询才能命中文件
+FIELD_WEIGHTS = {
+    "category": 3.0,
+    "tags": 2.0,
+    "description": 1.5,
+    "filename": 1.0,
+    "file_category": 0.8,
+    "file_description": 0.5,
+}
+
+# 前缀匹配（只用于查询中最后一个拉丁词，边输入边搜索）的权重折扣和最多展开的词数
+PREFIX_FACTOR = 0.7
+MAX_PREFIX_TERMS = 64
+
+# 缓存排好序结果的多词查询数（翻页和重复查询直接取用，索引变化时清空）
+QUERY_CACHE_SIZE = 64
+
+# 中日韩文字没有空格分词，按单字和相邻两字（二元组）建索引
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[0-9a-z\u00c0-\u024f]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+# 新类别的占位描述，不参与搜索
+PLACEHOLDER_DESCRIPTION = "请添加描述"
+
+# 文件名中不参与搜索的扩展名
+_EXTENSION_RE = re.compile(r"\.[0-9a-z]{2,5}$")
+
+# 文档键：("category", 类别) 或 ("file", 类别, 文件名)
+DocKey = Tuple[str, ...]
+
+
+def normalize(text: str) -> str:
+    """全角转半角、统一大小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    建索引用的分词：拉丁字母和数字按词切分，中日韩文字切成单字和二元组
+
+    例如 "开心的cat_01" → ["开", "心", "的", "开心", "心的", "cat", "01"]
+    """
+    terms = []
+    for run in _TOKEN_RE.findall(normalize(text)):
+        if _CJK_RE.match(run):
+            terms.extend(run)
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def query_terms(text: str) -> List[Tuple[str, bool]]:
+    """
+    查询用的分词，返回 [(词, 是否为拉丁词)]
+
+    中文查询用二元组匹配（单字查询用单字），所有词都必须命中。
+    """
+    terms = []
+    for run in _TOKEN_RE.findall(normalize(text)):
+        if _CJK_RE.match(run):
+            grams = [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+            terms.extend((gram, False) for gram in grams)
+        else:
+            terms.append((run, True))
+    # 去重并保持顺序
+    return list(dict.fromkeys(terms))
+
+
+class SearchIndex:
+    """表情组的内存倒排索引
+
+    索引类别（类别名、描述）和文件（文件名、标签，以及较低权重的所在类别名和描述）两种文档。
+    倒排表为 词 → {文档: 权重}，
+    权重取该词命中的字段中最高的字段权重，得分为 权重 × IDF 之和。只有一个词的查询直接从
+    按权重排好序的倒排表中取一页；多个词时对倒排表求交集后只为交集中的文档打分，
+    排好序的结果缓存起来，翻页和重复查询不再计算。
+
+    索引按索引库的变更日志增量更新：变化的文件重新读取一条记录；描述或目录变化的类别
+    重建类别文档，描述有变化或文件列表有变化（改名、删除）时再重建其下的文件；
+    变更日志被清理时整体重建。
+    """
+
+    def __init__(self, group: str, catalog: Optional[MemeCatalog] = None):
+        self.group = group
+        self.catalog = catalog or get_catalog()
+        self.version = -1
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_terms: Dict[int, Set[str]] = {}
+        self._docs: Dict[int, DocKey] = {}
+        self._ids: Dict[DocKey, int] = {}
+        self._category_files: Dict[str, Set[DocKey]] = {}
+        # 类别 → 已索引的描述（占位描述为空），以及文件文档共用的类别名和描述的词权重
+        self._descriptions: Dict[str, str] = {}
+        self._context_terms: Dict[str, Dict[str, float]] = {}
+        self._next_id = 0
+        # 拉丁词的有序列表，用于前缀匹配
+        self._latin_terms: Optional[List[str]] = []
+        # 词 → 按权重排好序的 (类别文档, 文件文档)，单词查询时使用
+        self._ranked_cache: Dict[str, Tuple[List[int], List[int]]] = {}
+        # (查询词, kind) → 按得分排好序的 [(文档, 得分)]
+        self._query_cache: "OrderedDict[tuple, List[Tuple[int, float]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---- 建立与更新 ----
+
+    def rebuild(self) -> None:
+        """从索引库整体重建"""
+        with self._lock:
+            version = self.catalog.last_change_id()
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._docs.clear()
+            self._ids.clear()
+            self._category_files.clear()
+            self._descriptions.clear()
+            self._context_terms.clear()
+            self._ranked_cache.clear()
+            self._query_cache.clear()
+            # 整体重建时最后一次性排序，不逐个插入
+            self._latin_terms = None
+            descriptions = self.catalog.get_descriptions(self.group)
+            for category in set(descriptions) | set(self.catalog.category_counts(self.group)):
+                self._add_category(category, descriptions.get(category))
+            for row in self.catalog.iter_group_files(self.group, local_only=True):
+                self._add_file(row["category"], row["filename"], row["tags"])
+            self._latin_terms = sorted(term for term in self._postings if not _CJK_RE.match(term))
+            self.version = version
+            logger.debug(f"已建立表情组 {self.group} 的搜索索引: {len(self._docs)} 条")
+
+    def refresh(self) -> bool:
+        """
+        按变更日志增量更新
+
+        Returns:
+            bool: 索引是否有变化
+        """
+        with self._lock:
+            if self.version < 0:
+                self.rebuild()
+                return True
+            if self.catalog.last_change_id() == self.version:
+                return False
+            changes = self.catalog.group_changes_since(self.group, self.version)
+            if changes["reset"]:
+                self.rebuild()
+                return True
+            categories = set(changes["categories"])
+            # 重建了文件的类别，这些类别的文件变化不再单独处理
+            rebuilt = set()
+            if categories:
+                descriptions = self.catalog.get_descriptions(self.group, sorted(categories))
+                counts = self.catalog.category_counts(self.group)
+                for category in categories:
+                    previous = self._descriptions.get(category, "")
+                    self._remove(("category", category))
+                    if category in descriptions or category in counts:
+                        self._add_category(category, descriptions.get(category))
+                    # 文件文档包含类别描述，描述变化时与改名、删除或目录变化一样重建该类别下的文件
+                    indexed = {key[2] for key in self._category_files.get(category, ())}
+                    if (previous != self._descriptions.get(category, "")
+                            or indexed != set(self.catalog.list_files(self.group, category))):
+                        self._remove_category_files(category)
+                        rebuilt.add(category)
+                        for row in self.catalog.iter_group_files(self.group, category, local_only=True):
+                            self._add_file(row["category"], row["filename"], row["tags"])
+            for category, filename, row in changes["files"]:
+                if category in rebuilt:
+                    continue
+                self._remove(("file", category, filename))
+                if row is not None:
+                    self._add_file(category, filename, row["tags"])
+            self.version = changes["version"]
+            return True
+
+    def _add_category(self, category: str, description: Optional[str]) -> None:
+        if description == PLACEHOLDER_DESCRIPTION:
+            description = None
+        self._add(("category", category), (("category", category), ("description", description or "")))
+        self._descriptions[category] = description or ""
+        self._context_terms.pop(category, None)
+
+    def _add_file(self, category: str, filename: str, tags: Optional[str]) -> None:
+        stem = _EXTENSION_RE.sub("", normalize(filename))
+        context = self._context_terms.get(category)
+        if context is None:
+            # 同一类别的文件共用，只分词一次
+            context = self._context_terms[category] = self._field_weights((
+                ("file_category", category),
+                ("file_description", self._descriptions.get(category, "")),
+            ))
+        self._add(("file", category, filename), (("filename", stem), ("tags", tags or "")), context)
+
+    def _remove_category_files(self, category: str) -> None:
+        for key in list(self._category_files.get(category, ())):
+            self._remove(key)
+
+    @staticmethod
+    def _field_weights(
+        fields: Iterable[Tuple[str, str]], base: Optional[Dict[str, float]] = None
+    ) -> Dict[str, float]:
+        """各字段分词后的 词 → 权重，同一个词取命中字段中最高的权重"""
+        weights = dict(base or ())
+        for field, text in fields:
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                if weights.get(term, 0.0) < weight:
+                    weights[term] = weight
+        return weights
+
+    def _add(self, key: DocKey, fields: Iterable[Tuple[str, str]], base: Optional[Dict[str, float]] = None) -> None:
+        self._remove(key)
+        self._query_cache.clear()
+        doc_id = self._next_id
+        self._next_id += 1
+        weights = self._field_weights(fields, base)
+        self._docs[doc_id] = key
+        self._ids[key] = doc_id
+        if key[0] == "file":
+            self._category_files.setdefault(key[1], set()).add(key)
+        self._doc_terms[doc_id] = set(weights)
+        for term, weight in weights.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                if self._latin_terms is not None and not _CJK_RE.match(term):
+                    bisect.insort(self._latin_terms, term)
+            posting[doc_id] = weight
+            self._ranked_cache.pop(term, None)
+
+    def _remove(self, key: DocKey) -> None:
+        doc_id = self._ids.pop(key, None)
+        if doc_id is None:
+            return
+        self._query_cache.clear()
+        del self._docs[doc_id]
+        if key[0] == "category":
+            self._descriptions.pop(key[1], None)
+            self._context_terms.pop(key[1], None)
+        if key[0] == "file":
+            files = self._category_files[key[1]]
+            files.discard(key)
+            if not files:
+                del self._category_files[key[1]]
+        for term in self._doc_terms.pop(doc_id):
+            posting = self._postings[term]
+            del posting[doc_id]
+            self._ranked_cache.pop(term, None)
+            if not posting:
+                del self._postings[term]
+                if not _CJK_RE.match(term):
+                    index = bisect.bisect_left(self._latin_terms, term)
+                    del self._latin_terms[index]
+
+    # ---- 查询 ----
+
+    def _sources(self, term: str, prefix: bool) -> List[Tuple[str, float]]:
+        """一个查询词命中的索引词及其得分系数（IDF，前缀匹配再乘以折扣），prefix 时包括以该词开头的所有词"""
+        total = len(self._docs) or 1
+        matched = [(term, 1.0)] if term in self._postings else []
+        if prefix:
+            start = bisect.bisect_left(self._latin_terms, term)
+            for candidate in self._latin_terms[start:start + MAX_PREFIX_TERMS + 1]:
+                if not candidate.startswith(term):
+                    break
+                if candidate != term:
+                    matched.append((candidate, PREFIX_FACTOR))
+        return [(t, math.log(1 + total / len(self._postings[t])) * factor) for t, factor in matched]
+
+    def _ranked(self, term: str) -> Tuple[List[int], List[int]]:
+        """词的倒排表按权重从高到低排好的类别和文件文档（首次查询时排序，倒排表变化后失效）"""
+        ranked = self._ranked_cache.get(term)
+        if ranked is None:
+            posting = self._postings[term]
+            ordered = sorted(posting, key=posting.__getitem__, reverse=True)
+            ranked = self._ranked_cache[term] = (
+                [doc_id for doc_id in ordered if self._docs[doc_id][0] == "category"],
+                [doc_id for doc_id in ordered if self._docs[doc_id][0] == "file"],
+            )
+        return ranked
+
+    def _search_single(self, term: str, factor: float, limit: int, offset: int, kind: Optional[str]):
+        """只有一个索引词时直接从排好序的倒排表中取一页，与命中数无关"""
+        posting = self._postings[term]
+        categories, files = self._ranked(term)
+        if kind == "category":
+            ordered, total = iter(categories), len(categories)
+        elif kind == "file":
+            ordered, total = iter(files), len(files)
+        else:
+            # 权重相同时类别排在文件前面
+            ordered = heapq.merge(categories, files, key=lambda doc_id: -posting[doc_id])
+            total = len(posting)
+        page = [(doc_id, posting[doc_id] * factor) for doc_id in itertools.islice(ordered, offset, offset + limit)]
+        return total, page
+
+    def _search_multi(self, clauses, limit: int, offset: int, kind: Optional[str]):
+        """多个查询词：先按候选从少到多求交集，只为同时命中所有词的文档计算得分，排好序的结果缓存供翻页使用"""
+        cache_key = (tuple(tuple(sources) for sources in clauses), kind)
+        ranked = self._query_cache.get(cache_key)
+        if ranked is not None:
+            self._query_cache.move_to_end(cache_key)
+            return len(ranked), ranked[offset:offset + limit]
+        clauses = [[(self._postings[t], factor) for t, factor in sources] for sources in clauses]
+        clauses.sort(key=lambda sources: sum(len(posting) for posting, _ in sources))
+        # 字典键视图之间求交集时在 C 中遍历较小的一方，不需要先复制成集合
+        keys = [
+            sources[0][0].keys() if len(sources) == 1 else set().union(*(posting for posting, _ in sources))
+            for sources in clauses
+        ]
+        candidates = keys[0]
+        for other in keys[1:]:
+            if not candidates:
+                break
+            candidates = candidates & other
+        if kind is not None:
+            candidates = {doc_id for doc_id in candidates if self._docs[doc_id][0] == kind}
+        scores = dict.fromkeys(candidates, 0.0)
+        for sources in clauses:
+            if len(sources) == 1:
+                posting, factor = sources[0]
+                for doc_id in scores:
+                    scores[doc_id] += posting[doc_id] * factor
+            else:
+                for doc_id in scores:
+                    scores[doc_id] += max(posting.get(doc_id, 0.0) * factor for posting, factor in sources)
+        # 得分相同时类别排在文件前面
+        ranked = sorted(scores.items(), key=lambda item: (item[1], self._docs[item[0]][0] == "category"), reverse=True)
+        self._query_cache[cache_key] = ranked
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return len(ranked), ranked[offset:offset + limit]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, kind: Optional[str] = None) -> Dict[str, Any]:
+        """
+        搜索
+
+        Args:
+            query: 查询文本，所有词都必须命中；最后一个拉丁词按前缀匹配
+            limit: 返回条数
+            offset: 跳过的条数（分页）
+            kind: 只返回 "category" 或 "file"
+
+        Returns:
+            dict: {"total": 命中总数, "results": [{"kind", "category", "filename", "score"}]}
+        """
+        terms = query_terms(query)
+        if not terms:
+            return {"total": 0, "results": []}
+        last_latin = max((i for i, (_, latin) in enumerate(terms) if latin), default=-1)
+        with self._lock:
+            clauses = [self._sources(term, i == last_latin) for i, (term, _) in enumerate(terms)]
+            if not all(clauses):
+                return {"total": 0, "results": []}
+            if len(clauses) == 1 and len(clauses[0]) == 1:
+                total, page = self._search_single(*clauses[0][0], limit, offset, kind)
+            else:
+                total, page = self._search_multi(clauses, limit, offset, kind)
+            results = []
+            for doc_id, score in page:
+                key = self._docs[doc_id]
+                results.append({
+                    "kind": key[0],
+                    "category": key[1],
+                    "filename": key[2] if key[0] == "file" else None,
+                    "score": round(score, 3),
+                })
+        return {"total": total, "results": results}
+
+
+_indexes: Dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(group: str, catalog: Optional[MemeCatalog] = None) -> SearchIndex:
+    """获取表情组的搜索索引（进程内共享），返回前按变更日志更新（阻塞，在线程中调用）"""
+    with _indexes_lock:
+        index = _indexes.get(group)
+        if index is None:
+            index = _indexes[group] = SearchIndex(group, catalog)
+    index.refresh()
+    return index
+
+
+def drop_search_index(group: str) -> None:
+    """释放表情组的搜索索引（表情组删除后调用）"""
+    with _indexes_lock:
+        _indexes.pop(group, None)
+
+
+def parse_tags(value: Any) -> List[str]:
+    """把列表或以空格、逗号分隔的字符串整理为去重的标签列表"""
+    if isinstance(value, str):
+        value = re.split(r"[\s,，、]+", value)
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("标签必须是列表或字符串")
+    tags = [normalize(str(tag)).strip() for tag in value]
+    return list(dict.fromkeys(tag for tag in tags if tag))
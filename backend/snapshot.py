@@ -0,0 +1,62 @@
+import re
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Pattern, Tuple
+
+
+class CatalogSnapshot:
+    """表情组类别描述的不可变快照
+
+    类别描述变化时由 CategoryManager 生成新的快照并整体替换引用，
+    读取方只需持有一次引用，不需要复制也不需要加锁，读到的始终是某一版本的完整数据。
+    由描述派生的结构（合法标签集合、预编译的匹配正则）随快照一起创建，
+    因此天然以版本号为键，描述不变时不会重复计算。
+    """
+
+    __slots__ = ("version", "group", "descriptions", "tags", "loose_patterns", "_repeat_patterns")
+
+    def __init__(self, group: str, descriptions: Mapping[str, str], version: int = 0):
+        self.version = version
+        self.group = group
+        self.descriptions: Mapping[str, str] = MappingProxyType(dict(descriptions))
+        self.tags = frozenset(self.descriptions)
+        # 松散模式：按单词边界匹配标签
+        self.loose_patterns: Tuple[Tuple[str, Pattern], ...] = tuple(
+            (tag, re.compile(r"\b(" + re.escape(tag) + r")\b")) for tag in self.descriptions
+        )
+        # 重复模式（如 angryangry）：标签 -> (重复两次的正则, 重复三次的正则)，过短的标签不参与
+        self._repeat_patterns: Dict[str, Tuple[Pattern, Optional[Pattern]]] = {
+            tag: (
+                re.compile(f"({re.escape(tag)})\\1{{1,}}"),
+                re.compile(f"({re.escape(tag)})\\1{{2,}}") if len(tag) >= 4 else None,
+            )
+            for tag in self.descriptions
+            if len(tag) >= 3
+        }
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self.tags
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __reduce__(self):
+        # MappingProxyType 不能序列化，跨进程传递时按原始数据重建
+        return (CatalogSnapshot, (self.group, dict(self.descriptions), self.version))
+
+    def repeat_pattern(self, tag: str, high_confidence: bool) -> Optional[Pattern]:
+        """
+        获取标签的重复模式正则
+
+        高置信度标签重复两次即可识别，其余标签需要重复三次且长度至少为 4。
+        不满足长度要求时返回 None。
+        """
+        patterns = self._repeat_patterns.get(tag)
+        if patterns is None:
+            return None
+        return patterns[0] if high_confidence else patterns[1]
+
+    def with_changes(self, version: int, updates: Optional[Dict[str, str]] = None, removed=()) -> "CatalogSnapshot":
+        """基于当前快照生成修改后的新快照（保持原有类别顺序）"""
+        descriptions = {k: v for k, v in self.descriptions.items() if k not in removed}
+        descriptions.update(updates or {})
+        return CatalogSnapshot(self.group, descriptions, version)
@@ -0,0 +1,206 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Iterable, Optional, Tuple
+from ..config import MEMES_BASE_DIR, MEMES_DIR
+from .catalog import MemeCatalog
+
+logger = logging.getLogger(__name__)
+
+THUMBS_DIR = os.path.join(MEMES_BASE_DIR, "thumbs")
+
+# 缩略图默认参数，可被插件配置中的 thumbnails 项覆盖
+DEFAULT_THUMB_OPTIONS = {
+    "workers": 2,
+    "use_process_pool": False,
+    "quality": 80,
+    "animated_preview": True,
+    "preview_frames": 12,
+    "prewarm": True,
+    "prewarm_width": 300,
+}
+
+# 允许的缩略图宽度，请求的宽度向上取整到其中之一，避免任意宽度撑大缓存
+THUMB_WIDTHS = (96, 150, 300, 600)
+
+
+def snap_width(width: Optional[int]) -> int:
+    """把请求的宽度取整到允许的宽度"""
+    if not width or width <= 0:
+        return THUMB_WIDTHS[1]
+    return next((w for w in THUMB_WIDTHS if w >= width), THUMB_WIDTHS[-1])
+
+
+def render_thumbnail(source: str, target: str, width: int, options: Dict[str, Any]) -> str:
+    """
+    生成 WebP 缩略图（在工作线程/进程中执行）
+
+    静态图缩放到指定宽度；动图在 animated_preview 开启时均匀抽取最多 preview_frames 帧
+    生成短动图预览，否则只取第一帧。先写临时文件再原子替换，并发生成同一缩略图不会产生半截文件。
+    """
+    from PIL import Image, ImageSequence
+
+    quality = int(options.get("quality") or 80)
+    with Image.open(source) as img:
+        frames = getattr(img, "n_frames", 1)
+        height = max(1, round(img.height * width / img.width)) if img.width > width else img.height
+        size = (min(width, img.width), height)
+
+        def convert(frame):
+            frame = frame.convert("RGBA" if frame.mode in ("RGBA", "LA", "P") else "RGB")
+            return frame.resize(size, Image.LANCZOS) if frame.size != size else frame
+
+        save_kwargs = {"format": "WEBP", "quality": quality, "method": 4}
+        if frames > 1 and options.get("animated_preview", True):
+            limit = max(1, int(options.get("preview_frames") or 1))
+            step = max(1, frames // limit)
+            picked, durations = [], []
+            for index, frame in enumerate(ImageSequence.Iterator(img)):
+                if index % step == 0 and len(picked) < limit:
+                    picked.append(convert(frame))
+                    durations.append(int(frame.info.get("duration", 100)) * step)
+            first = picked[0]
+            save_kwargs.update(save_all=True, append_images=picked[1:], duration=durations, loop=0)
+        else:
+            first = convert(img)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            first.save(tmp_path, **save_kwargs)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return target
+
+
+class ThumbnailService:
+    """WebUI 图库的缩略图服务
+
+    缩略图按内容哈希和宽度缓存在 thumbs 目录（thumbs/ab/<sha>_<宽度>.webp），
+    内容相同的文件（包括不同表情组中的硬链接）共用缩略图，文件被替换后哈希变化，自然使用新缩略图。
+    生成在线程池/进程池中执行，同一缩略图的并发请求只生成一次。
+    """
+
+    def __init__(self, catalog: MemeCatalog, options: Optional[Dict[str, Any]] = None, root: Optional[str] = None):
+        self.catalog = catalog
+        self.options = {**DEFAULT_THUMB_OPTIONS, **(options or {})}
+        self.root = str(root or THUMBS_DIR)
+        self._executor = None
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._prewarm_task: Optional[asyncio.Task] = None
+
+    def thumb_path(self, sha: str, width: int) -> str:
+        return os.path.join(self.root, sha[:2], f"{sha}_{width}.webp")
+
+    def _get_executor(self):
+        if self._executor is None:
+            workers = max(1, int(self.options.get("workers") or 1))
+            if self.options.get("use_process_pool"):
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="meme-thumb")
+        return self._executor
+
+    def _lookup(self, group: str, category: str, filename: str) -> Optional[Tuple[str, str]]:
+        """返回 (原图路径, 内容哈希)，索引中没有或文件不存在时返回 None"""
+        source = os.path.join(MEMES_DIR, group, category, filename)
+        row = self.catalog.fresh_file(group, category, filename, source)
+        return (source, row["hash"]) if row is not None else None
+
+    async def get(
+        self, group: str, category: str, filename: str, width: Optional[int] = None
+    ) -> Optional[Tuple[str, str]]:
+        """
+        获取缩略图，不存在时生成
+
+        Returns:
+            tuple | None: (缩略图路径, 原图内容哈希)，原图不存在时返回 None
+        """
+        width = snap_width(width)
+        found = await asyncio.to_thread(self._lookup, group, category, filename)
+        if found is None:
+            return None
+        source, sha = found
+        return await self._ensure(source, sha, width), sha
+
+    async def _ensure(self, source: str, sha: str, width: int) -> str:
+        target = self.thumb_path(sha, width)
+        if os.path.exists(target):
+            return target
+        key = (sha, width)
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), render_thumbnail, source, target, width, self.options)
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    def start_prewarm(self, groups: Iterable[str], width: Optional[int] = None) -> None:
+        """在后台为表情组预先生成缩略图（已有的跳过）"""
+        if not self.options.get("prewarm") or (self._prewarm_task and not self._prewarm_task.done()):
+            return
+        width = snap_width(width or self.options.get("prewarm_width"))
+        self._prewarm_task = asyncio.create_task(self._prewarm(list(groups), width))
+
+    async def _prewarm(self, groups, width: int) -> None:
+        created = 0
+        # 只占用一半的工作者，给图库页面的实时请求留出余量
+        limit = asyncio.Semaphore(max(1, int(self.options.get("workers") or 1) // 2))
+
+        async def one(source, sha):
+            nonlocal created
+            async with limit:
+                try:
+                    await self._ensure(source, sha, width)
+                    created += 1
+                except Exception as e:
+                    logger.debug(f"预生成缩略图失败 {source}: {e}")
+
+        for group in groups:
+            rows = await asyncio.to_thread(self.catalog.iter_group_files, group)
+            tasks = []
+            for row in rows:
+                if not row["hash"] or os.path.exists(self.thumb_path(row["hash"], width)):
+                    continue
+                source = os.path.join(MEMES_DIR, group, row["category"], row["filename"])
+                if os.path.isfile(source):
+                    tasks.append(one(source, row["hash"]))
+            await asyncio.gather(*tasks)
+        if created:
+            logger.info(f"已预生成 {created} 张缩略图")
+
+    async def stop(self) -> None:
+        if self._prewarm_task:
+            self._prewarm_task.cancel()
+            await asyncio.gather(self._prewarm_task, return_exceptions=True)
+            self._prewarm_task = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def gc(self) -> Dict[str, int]:
+        """删除索引中已不存在的内容对应的缩略图"""
+        stats = {"scanned": 0, "removed": 0}
+        if not os.path.isdir(self.root):
+            return stats
+        known = self.catalog.known_hashes()
+        with os.scandir(self.root) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as it:
+                    for entry in it:
+                        if not entry.name.endswith(".webp"):
+                            continue
+                        stats["scanned"] += 1
+                        if entry.name.rsplit("_", 1)[0] not in known:
+                            try:
+                                os.remove(entry.path)
+                                stats["removed"] += 1
+                            except FileNotFoundError:
+                                pass
+        return stats
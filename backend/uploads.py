@@ -0,0 +1,175 @@
+import os
+import uuid
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from .models import run_io
+
+logger = logging.getLogger(__name__)
+
+# 上传参数默认值，可被插件配置中的 uploads 项覆盖
+DEFAULT_UPLOAD_OPTIONS = {
+    "max_file_size_mb": 10,
+    "max_files": 50,
+    "max_archive_size_mb": 512,
+}
+
+# 上传文件先写入表情组目录下的暂存目录（以 . 开头，对账和监听都会跳过），
+# 与最终位置在同一文件系统上，完成后原子重命名
+UPLOAD_STAGING_DIR = ".uploads"
+
+# 累积到该大小再交给文件操作线程写入，减少线程切换
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# 普通表单字段（如 category）和分段头的最大长度
+MAX_FIELD_SIZE = 64 * 1024
+
+# 每次交给解析器的数据量：解析器未消费的缓冲加上新数据超过内存上限时会拒绝，
+# 请求体的分块可能很大，按此大小切开后逐段解析
+FEED_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """上传请求不合法，status 为应返回的 HTTP 状态码"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamedUpload:
+    """已流式写入暂存文件的上传文件，内容哈希在写入时同步计算"""
+
+    __slots__ = ("field", "filename", "tmp_path", "size", "sha256", "_file", "_digest")
+
+    def __init__(self, field: str, filename: str, staging_dir: str):
+        self.field = field
+        self.filename = filename
+        self.tmp_path = os.path.join(staging_dir, f"{uuid.uuid4().hex}.upload.tmp")
+        self.size = 0
+        self.sha256: Optional[str] = None
+        self._file = None
+        self._digest = hashlib.sha256()
+
+    def open(self) -> None:
+        os.makedirs(os.path.dirname(self.tmp_path), exist_ok=True)
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._digest.update(data)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.sha256 = self._digest.hexdigest()
+
+    def discard(self) -> None:
+        """删除暂存文件（已被移走时忽略）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def upload_content_limit(options: Dict[str, Any]) -> int:
+    """上传接口整个请求体的上限：单个文件上限乘以文件数，再留 1MB 给表单字段和分隔符"""
+    options = {**DEFAULT_UPLOAD_OPTIONS, **(options or {})}
+    return int(float(options["max_file_size_mb"]) * 1024 * 1024 * int(options["max_files"])) + 1024 * 1024
+
+
+def archive_content_limit(options: Dict[str, Any]) -> int:
+    """压缩包导入接口整个请求体的上限：压缩包大小上限，再留 1MB 给表单字段和分隔符"""
+    options = {**DEFAULT_UPLOAD_OPTIONS, **(options or {})}
+    return int(float(options["max_archive_size_mb"]) * 1024 * 1024) + 1024 * 1024
+
+
+async def receive_multipart(
+    request, staging_dir: str, max_file_size: int, max_files: int
+) -> Tuple[Dict[str, str], List[StreamedUpload]]:
+    """
+    流式解析 multipart 请求体
+
+    请求体按到达的分块解析，文件内容直接写入暂存目录并同时计算 SHA-256，
+    内存占用只与写缓冲大小有关，与文件大小和并发上传数无关。
+    单个文件超过 max_file_size 时立即停止读取。
+
+    Returns:
+        tuple: (普通表单字段, 上传文件列表)；出错时已写入的暂存文件会被删除
+    """
+    content_type, options = parse_options_header(request.headers.get("Content-Type", ""))
+    boundary = options.get("boundary")
+    if content_type != "multipart/form-data" or not boundary:
+        raise UploadError("请求不是 multipart/form-data 格式")
+
+    decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=MAX_FIELD_SIZE + FEED_SIZE)
+    form: Dict[str, str] = {}
+    uploads: List[StreamedUpload] = []
+    current: Optional[StreamedUpload] = None
+    field_name, field_data = None, bytearray()
+    buffer = bytearray()
+
+    async def flush() -> None:
+        if buffer:
+            await run_io(current.write, bytes(buffer))
+            buffer.clear()
+
+    async def handle(event) -> None:
+        nonlocal current, field_name
+        if isinstance(event, File):
+            if len(uploads) >= max_files:
+                raise UploadError(f"一次最多上传 {max_files} 个文件")
+            current = StreamedUpload(event.name, event.filename or "", staging_dir)
+            uploads.append(current)
+            await run_io(current.open)
+        elif isinstance(event, Field):
+            field_name = event.name
+            field_data.clear()
+        elif isinstance(event, Data):
+            if current is not None:
+                current.size += len(event.data)
+                if current.size > max_file_size:
+                    raise UploadError(
+                        f"文件 {current.filename} 超过大小限制 {max_file_size / 1024 / 1024:g}MB", 413
+                    )
+                buffer.extend(event.data)
+                if len(buffer) >= WRITE_BUFFER_SIZE or not event.more_data:
+                    await flush()
+                if not event.more_data:
+                    await run_io(current.close)
+                    current = None
+            else:
+                field_data.extend(event.data)
+                if len(field_data) > MAX_FIELD_SIZE:
+                    raise UploadError(f"表单字段 {field_name} 过长", 413)
+                if not event.more_data:
+                    form[field_name] = field_data.decode("utf-8", "replace")
+
+    async def feed(data: Optional[bytes]) -> None:
+        decoder.receive_data(data)
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            await handle(event)
+            event = decoder.next_event()
+
+    try:
+        async for chunk in request.body:
+            for start in range(0, len(chunk), FEED_SIZE):
+                await feed(chunk[start:start + FEED_SIZE])
+        await feed(None)
+        if current is not None:
+            raise UploadError("上传的数据不完整")
+    except BaseException as e:
+        for upload in uploads:
+            await run_io(upload.discard)
+        if isinstance(e, ValueError) and not isinstance(e, UploadError):
+            # werkzeug 解析错误（格式不正确、字段过长）
+            raise UploadError(f"无法解析上传数据: {e}") from e
+        raise
+    return form, uploads
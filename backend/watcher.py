@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import errno
+import struct
+import asyncio
+import logging
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Set
+from .reconciler import FilesystemReconciler
+
+logger = logging.getLogger(__name__)
+
+# 文件监视默认参数，可被插件配置中的 file_watcher 项覆盖
+DEFAULT_WATCHER_OPTIONS = {
+    "enable": False,
+    "debounce_seconds": 1.0,
+    "max_delay_seconds": 5.0,
+    "poll_interval": 5.0,
+    "force_polling": False,
+}
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """通过 ctypes 调用 libc 的最小 inotify 封装，不可用时构造抛出 OSError"""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify 仅在 Linux 上可用")
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._ctypes = ctypes
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self):
+        """读取当前可读的全部事件，返回 [(wd, mask, name)]"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class DirectoryWatcher:
+    """表情组目录监视器
+
+    优先使用 inotify 监视组目录及其类别目录，事件经过防抖合并后
+    只对发生变化的类别做增量对账；inotify 不可用时退化为定时对账，
+    每轮只读取组目录并比较类别目录的 mtime，开销与文件数量无关。
+
+    对账产生的事件（见 FilesystemReconciler）批量交给 on_change 回调，回调在事件循环中执行；
+    回调可以是协程函数，需要读写索引的回调应把阻塞操作交给线程。
+    """
+
+    def __init__(
+        self,
+        reconciler: FilesystemReconciler,
+        options: Optional[Dict[str, Any]] = None,
+        on_change: Optional[Callable[[List[Dict[str, Any]]], Optional[Awaitable[None]]]] = None,
+    ):
+        self.reconciler = reconciler
+        self.options = {**DEFAULT_WATCHER_OPTIONS, **(options or {})}
+        self.on_change = on_change
+        self.backend: Optional[str] = None
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, Optional[str]] = {}  # wd -> 类别名，None 表示组目录
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flushing = False
+        self._dirty: Set[str] = set()
+        self._full_rescan = False
+        self._first_dirty = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.options.get("enable"))
+
+    @property
+    def running(self) -> bool:
+        return self.backend is not None
+
+    async def start(self) -> None:
+        """在当前事件循环上开始监视"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        if not self.options.get("force_polling"):
+            try:
+                self._start_inotify()
+                self.backend = "inotify"
+            except OSError as e:
+                logger.info(f"inotify 不可用，改用轮询监视: {e}")
+                self._close_inotify()
+        if self.backend is None:
+            self._task = asyncio.create_task(self._poll())
+            self.backend = "polling"
+        logger.info(f"表情包目录监视已启动 ({self.backend}): {self.reconciler.memes_dir}")
+
+    async def stop(self) -> None:
+        """停止监视"""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._close_inotify()
+        self.backend = None
+
+    # ---- inotify ----
+
+    def _start_inotify(self) -> None:
+        self._inotify = _Inotify()
+        self._watches[self._inotify.add_watch(self.reconciler.memes_dir)] = None
+        with os.scandir(self.reconciler.memes_dir) as it:
+            for entry in it:
+                if not entry.name.startswith(".") and entry.is_dir():
+                    self._watch_category(entry.name)
+        self._loop.add_reader(self._inotify.fd, self._on_readable)
+
+    def _close_inotify(self) -> None:
+        if self._inotify is not None:
+            if self._loop is not None:
+                self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
+
+    def _watch_category(self, category: str) -> None:
+        try:
+            wd = self._inotify.add_watch(os.path.join(self.reconciler.memes_dir, category))
+            self._watches[wd] = category
+        except OSError as e:
+            # 目录在创建后马上又被删除，交给对账处理
+            logger.debug(f"无法监视类别目录 {category}: {e}")
+
+    def _on_readable(self) -> None:
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self._full_rescan = True
+                continue
+            if mask & IN_IGNORED:
+                category = self._watches.pop(wd, None)
+                if category is None:
+                    # 组目录本身被删除或移动，后续改为轮询
+                    self._full_rescan = True
+                continue
+            if wd not in self._watches:
+                continue
+            category = self._watches[wd]
+            if category is None:
+                if not (mask & IN_ISDIR) or not name or name.startswith("."):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_category(name)
+                self._dirty.add(name)
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self._dirty.add(category)
+            elif not name.startswith("."):
+                self._dirty.add(category)
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if not (self._dirty or self._full_rescan):
+            return
+        now = time.monotonic()
+        if not self._first_dirty:
+            self._first_dirty = now
+        if self._flush_handle:
+            self._flush_handle.cancel()
+        if self._flushing:
+            # 正在对账，结束后会重新检查
+            self._flush_handle = None
+            return
+        # 防抖：持续有事件时顺延，但最多等待 max_delay_seconds
+        delay = min(
+            float(self.options["debounce_seconds"]),
+            max(0.0, self._first_dirty + float(self.options["max_delay_seconds"]) - now),
+        )
+        self._flush_handle = self._loop.call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self) -> None:
+        self._flush_handle = None
+        dirty, self._dirty = self._dirty, set()
+        full, self._full_rescan = self._full_rescan, False
+        self._first_dirty = 0.0
+        self._flushing = True
+        try:
+            events = await self._loop.run_in_executor(None, self._reconcile, dirty, full)
+        except Exception as e:
+            logger.error(f"目录增量对账失败: {e}")
+            events = []
+        finally:
+            self._flushing = False
+        await self._dispatch(events)
+        if full and self.backend == "inotify" and not os.path.isdir(self.reconciler.memes_dir):
+            self._close_inotify()
+            self._task = asyncio.create_task(self._poll())
+            self.backend = "polling"
+        self._schedule_flush()
+
+    def _reconcile(self, dirty: Set[str], full: bool) -> List[Dict[str, Any]]:
+        if full:
+            return self.reconciler.reconcile()
+        events = []
+        for category in sorted(dirty):
+            events.extend(self.reconciler.reconcile_category(category))
+        return events
+
+    # ---- 轮询 ----
+
+    async def _poll(self) -> None:
+        interval = max(0.5, float(self.options.get("poll_interval") or 5.0))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                events = await self._loop.run_in_executor(None, self.reconciler.reconcile)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"目录轮询对账失败: {e}")
+                continue
+            await self._dispatch(events)
+
+    async def _dispatch(self, events: List[Dict[str, Any]]) -> None:
+        if events and self.on_change:
+            try:
+                result = self.on_change(events)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"目录变化回调执行失败: {e}")
@@ -0,0 +1,153 @@
+"""
+WebUI 响应压缩测试
+
+为一个大表情组（--files 个文件）请求 WebUI 首屏需要的资源：页面、script.js、styles.css、
+/api/categories、/api/emotions、前几个类别的第一页，以及完整列表 /api/emoji。
+分别以不压缩、gzip、brotli（已安装时）请求，统计传输量和服务端用时，
+并按给定带宽和往返延迟估算慢速网络下的页面可用时间：
+
+    页面 → 静态资源（并行，共用带宽）→ 首屏接口（并行，共用带宽）
+
+用法:
+    python benchmarks/compression.py
+    python benchmarks/compression.py --files 20000 --categories 40 --bandwidth-kbps 512 --rtt-ms 200
+
+注意: 使用插件真实的数据目录，测试表情组名为 compress_<时间戳>，结束后删除（--keep 保留）。
+静态资源复制到临时目录后再预压缩，不会在插件目录中留下 .br/.gz 文件。
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+
+def _load(module):
+    __import__(f"{PACKAGE}.{module}")
+    return sys.modules[f"{PACKAGE}.{module}"]
+
+
+# 首屏请求分三个阶段，同一阶段内的请求并行
+def _phases(categories, first_pages):
+    return [
+        ["/"],
+        ["/static/js/script.js", "/static/css/styles.css"],
+        ["/api/categories", "/api/emotions"]
+        + [f"/api/category/{c}/files?limit=120&sort=name&order=asc" for c in categories[:first_pages]],
+    ]
+
+
+async def measure(app, paths, accept_encoding):
+    """请求每个地址，返回 {地址: (传输字节数, 服务端用时)}"""
+    client = app.test_client()
+    async with client.session_transaction() as session:
+        session["authenticated"] = True
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    result = {}
+    for path in paths:
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        body = await response.get_data()
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: {response.status_code}")
+        result[path] = (len(body), elapsed)
+    return result
+
+
+def time_to_interactive(phases, sizes, bandwidth, rtt):
+    """按阶段估算：每个阶段一次往返，加上该阶段的总传输量除以带宽，再加最慢请求的服务端用时"""
+    total = 0.0
+    for phase in phases:
+        total += rtt + sum(sizes[p][0] for p in phase) / bandwidth + max(sizes[p][1] for p in phase)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebUI 响应压缩测试")
+    parser.add_argument("--files", type=int, default=10000, help="表情组中的文件数")
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--first-pages", type=int, default=3, help="首屏加载第一页的类别数")
+    parser.add_argument("--bandwidth-kbps", type=float, default=1000, help="模拟的下行带宽（kbit/s）")
+    parser.add_argument("--rtt-ms", type=float, default=150, help="模拟的往返延迟（毫秒）")
+    parser.add_argument("--keep", action="store_true", help="保留测试表情组")
+    args = parser.parse_args()
+
+    config = _load("config")
+    catalog_mod = _load("backend.catalog")
+    compression = _load("backend.compression")
+    category_manager = _load("backend.category_manager")
+    webui = _load("webui")
+
+    group = f"compress_{int(time.time())}"
+    group_dir = os.path.join(config.MEMES_DIR, group)
+    categories = [f"category_{i:03d}" for i in range(args.categories)]
+    for index in range(args.files):
+        category = categories[index % len(categories)]
+        os.makedirs(os.path.join(group_dir, category), exist_ok=True)
+        with open(os.path.join(group_dir, category, f"meme_{index:06d}_{category}.png"), "wb") as f:
+            f.write(os.urandom(64))
+
+    manager = category_manager.CategoryManager(group)
+    manager.sync_with_filesystem()
+    for category in categories:
+        manager.update_description(category, f"{category} 的表情，用于表达相应的情绪和语气")
+
+    static_dir = tempfile.mkdtemp(prefix="meme-static-")
+    shutil.copytree(webui.app.static_folder, static_dir, dirs_exist_ok=True)
+    original_static = webui.app.static_folder
+    webui.app.static_folder = static_dir
+    compression.precompress_static(static_dir)
+
+    webui.app.secret_key = os.urandom(16)
+    webui.app.config["PLUGIN_CONFIG"] = {
+        "category_manager": manager,
+        "plugin_config": {"active_emotion_group": group},
+    }
+    webui.app.config["COMPRESSION"] = dict(compression.DEFAULT_COMPRESSION_OPTIONS)
+
+    phases = _phases(categories, args.first_pages)
+    paths = [p for phase in phases for p in phase] + ["/api/emoji"]
+    modes = [("不压缩", None), ("gzip", "gzip")]
+    if compression.brotli is not None:
+        modes.append(("brotli", "br, gzip"))
+    results = [(name, asyncio.run(measure(webui.app, paths, accept))) for name, accept in modes]
+
+    bandwidth = args.bandwidth_kbps * 1000 / 8
+    rtt = args.rtt_ms / 1000
+    print(f"{args.files} 个文件 / {args.categories} 个类别，模拟 {args.bandwidth_kbps:g}kbit/s、往返 {args.rtt_ms:g}ms")
+    print(f"  {'资源':<52}" + "".join(f"{name:>14}" for name, _ in results))
+    for path in paths:
+        print(f"  {path[:50]:<52}" + "".join(f"{r[path][0] / 1024:>12.1f}KB" for _, r in results))
+    for label, subset in (("首屏传输量", [p for phase in phases for p in phase]), ("含完整列表", paths)):
+        print(f"  {label:<48}" + "".join(f"{sum(r[p][0] for p in subset) / 1024:>12.1f}KB" for _, r in results))
+    print(f"  {'服务端用时（首屏）':<45}"
+          + "".join(f"{sum(r[p][1] for phase in phases for p in phase) * 1000:>12.1f}ms" for _, r in results))
+    print(f"  {'估算页面可用时间':<46}"
+          + "".join(f"{time_to_interactive(phases, r, bandwidth, rtt) * 1000:>12.0f}ms" for _, r in results))
+    if compression.brotli is None:
+        print("  （未安装 brotli，只测试 gzip）")
+
+    webui.app.static_folder = original_static
+    shutil.rmtree(static_dir, ignore_errors=True)
+    if not args.keep:
+        manager.flush()
+        catalog_mod.get_catalog().delete_group(group)
+        shutil.rmtree(group_dir, ignore_errors=True)
+        for path in (
+            os.path.join(config.MEMES_BASE_DIR, f"memes_data_{group}.json"),
+            _load("backend.job_lock").JobLock(f"memes_data_{group}").path,
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
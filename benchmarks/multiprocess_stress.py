@@ -0,0 +1,166 @@
+"""
+多进程共用数据目录的压力测试
+
+模拟多个机器人实例同时操作同一个表情组：每个进程反复修改类别描述、写入新文件并增量对账、
+记录发送统计，并在跨进程任务锁内对一个计数文件做读-改-写。结束后检查：
+
+- 计数文件的值等于全部加锁操作次数（任务锁互斥，没有丢失更新）
+- memes_data_<group>.json 与索引中的类别描述一致（JSON 副本按索引最新数据写入）
+- 索引中的文件与磁盘一致
+- 每个进程按变更日志增量同步后，快照与索引一致
+
+用法:
+    python benchmarks/multiprocess_stress.py
+    python benchmarks/multiprocess_stress.py --processes 8 --rounds 200 --keep
+
+注意: 使用插件真实的数据目录，测试表情组名为 stress_<时间戳>，结束后删除（--keep 保留）。
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+
+def _load(module):
+    __import__(f"{PACKAGE}.{module}")
+    return sys.modules[f"{PACKAGE}.{module}"]
+
+
+def worker(index, group, rounds, categories, lock_root, counter_path, barrier, results):
+    category_manager = _load("backend.category_manager")
+    job_lock = _load("backend.job_lock")
+    change_log = _load("backend.catalog")
+
+    rng = random.Random(index)
+    manager = category_manager.CategoryManager(group)
+    start_id = manager.catalog.last_change_id()
+    barrier.wait()
+
+    stats = {"descriptions": 0, "files": 0, "locked": 0, "errors": 0, "lock_wait": 0.0}
+    started = time.perf_counter()
+    for round_no in range(rounds):
+        try:
+            category = rng.choice(categories)
+            manager.update_description(category, f"worker{index}-round{round_no}")
+            stats["descriptions"] += 1
+
+            category_dir = os.path.join(manager.memes_dir, category)
+            os.makedirs(category_dir, exist_ok=True)
+            path = os.path.join(category_dir, f"w{index}_{round_no}.png")
+            with open(path, "wb") as f:
+                f.write(os.urandom(64))
+            manager.reconciler.reconcile_category(category)
+            manager.record_usage(path)
+            stats["files"] += 1
+
+            waited = time.perf_counter()
+            with job_lock.JobLock("stress_counter", root=lock_root):
+                stats["lock_wait"] += time.perf_counter() - waited
+                with open(counter_path, "r") as f:
+                    value = int(f.read() or 0)
+                time.sleep(0.0005)  # 放大竞争窗口
+                with open(counter_path, "w") as f:
+                    f.write(str(value + 1))
+            stats["locked"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"[worker {index}] {type(e).__name__}: {e}", file=sys.stderr)
+    stats["elapsed"] = time.perf_counter() - started
+
+    manager.flush()
+    barrier.wait()  # 等待所有进程写完，再按变更日志增量同步
+
+    changed = {
+        row["name"]
+        for row in manager.catalog.changes_since(start_id)
+        if row["kind"] == change_log.CHANGE_DESCRIPTION and row["group_name"] == group
+    }
+    manager.reload_descriptions(sorted(changed))
+    stats["coherent"] = dict(manager.descriptions) == manager.catalog.get_descriptions(group)
+    results.put((index, stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程共用数据目录的压力测试")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="保留测试表情组")
+    args = parser.parse_args()
+
+    config = _load("config")
+    catalog_mod = _load("backend.catalog")
+    utils = _load("utils")
+
+    group = f"stress_{int(time.time())}"
+    categories = [f"cat{i}" for i in range(args.categories)]
+    lock_root = tempfile.mkdtemp(prefix="meme-stress-locks-")
+    counter_path = os.path.join(lock_root, "counter")
+    with open(counter_path, "w") as f:
+        f.write("0")
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.processes)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(i, group, args.rounds, categories, lock_root, counter_path, barrier, results))
+        for i in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for p in processes:
+        p.start()
+    stats = dict(results.get() for _ in processes)
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    catalog = catalog_mod.get_catalog()
+    memes_dir = os.path.join(config.MEMES_DIR, group)
+    data_path = os.path.join(config.MEMES_BASE_DIR, f"memes_data_{group}.json")
+    catalog.reconcile_group(group, memes_dir, force=True)
+    indexed = catalog.list_group_files(group)
+    on_disk = {
+        category: sorted(os.listdir(os.path.join(memes_dir, category)))
+        for category in categories
+        if os.path.isdir(os.path.join(memes_dir, category))
+    }
+    with open(counter_path) as f:
+        counter = int(f.read())
+
+    expected = args.processes * args.rounds
+    checks = {
+        "任务锁互斥（计数无丢失）": counter == sum(s["locked"] for s in stats.values()) == expected,
+        "JSON 副本与索引一致": utils.load_json(data_path) == catalog.get_descriptions(group),
+        "索引与磁盘文件一致": {c: sorted(f) for c, f in indexed.items() if f} == {c: f for c, f in on_disk.items() if f},
+        "各进程快照与索引一致": all(s["coherent"] for s in stats.values()),
+        "无操作失败": not any(s["errors"] for s in stats.values()),
+    }
+
+    print(f"{args.processes} 个进程 × {args.rounds} 轮，总用时 {elapsed:.2f}s，"
+          f"吞吐 {expected / elapsed:.0f} 轮/s")
+    for index in sorted(stats):
+        s = stats[index]
+        print(f"  进程 {index}: {s['elapsed']:.2f}s，等待任务锁 {s['lock_wait']:.2f}s，失败 {s['errors']} 次")
+    for name, ok in checks.items():
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}")
+
+    if not args.keep:
+        catalog.delete_group(group)
+        shutil.rmtree(memes_dir, ignore_errors=True)
+        for path in (data_path, _load("backend.job_lock").JobLock(f"memes_data_{group}").path):
+            if os.path.exists(path):
+                os.remove(path)
+    shutil.rmtree(lock_root, ignore_errors=True)
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
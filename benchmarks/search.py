@@ -0,0 +1,136 @@
+"""
+搜索索引测试
+
+在临时索引库中生成一个大表情组（--files 个文件、--categories 个类别，类别名和描述为中文，
+部分文件带标签），统计建立倒排索引的耗时，然后对几类典型查询各执行 --rounds 次，
+输出每类查询的命中数和延迟分位数（词第一次被单独查询时要对其倒排表排序，高分位数中包含这部分）：
+
+    类别名（中文二元组）、描述中的词、文件名前缀（边输入边搜索）、标签、多词组合
+
+最后修改一批文件标签和类别描述，测试按变更日志增量更新的耗时。
+
+用法:
+    python benchmarks/search.py
+    python benchmarks/search.py --files 100000 --categories 200 --rounds 2000
+
+注意: 索引库建在临时目录中，不读写插件的数据目录，也不创建表情文件。
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+# 生成类别名和描述用的词
+MOODS = ["开心", "难过", "生气", "惊讶", "害怕", "无语", "得意", "委屈", "困惑", "害羞",
+         "尴尬", "感动", "疲惫", "兴奋", "嫌弃", "期待", "紧张", "放松", "骄傲", "心虚"]
+SUBJECTS = ["猫猫", "狗狗", "熊猫", "兔子", "小鸟", "企鹅", "仓鼠", "狐狸", "青蛙", "鸭子"]
+TAGS = ["cute", "funny", "reaction", "anime", "cat", "dog", "meme", "gif", "retro", "pixel",
+        "可爱", "搞笑", "沙雕", "经典", "日常"]
+
+
+def _load(module):
+    __import__(f"{PACKAGE}.{module}")
+    return sys.modules[f"{PACKAGE}.{module}"]
+
+
+def populate(catalog, group, files, categories, rng):
+    """直接写入索引库：类别、描述和文件记录，约三分之一的文件带 1~3 个标签"""
+    names = []
+    for index in range(categories):
+        names.append(f"{rng.choice(SUBJECTS)}{rng.choice(MOODS)}_{index:03d}")
+    with catalog.transaction() as conn:
+        for name in names:
+            category_id = catalog._category_id(conn, group, name)
+            conn.execute(
+                "UPDATE categories SET description = ?, dir_exists = 1 WHERE id = ?",
+                (f"表示{rng.choice(MOODS)}和{rng.choice(MOODS)}的{rng.choice(SUBJECTS)}表情", category_id),
+            )
+        ids = {name: catalog._category_id(conn, group, name) for name in names}
+        rows = []
+        for index in range(files):
+            category = names[index % categories]
+            tags = " ".join(rng.sample(TAGS, rng.randint(1, 3))) if rng.random() < 0.33 else None
+            rows.append((ids[category], f"{rng.choice(TAGS)}_{index:06d}.png", 1024, 0.0, None, tags))
+        conn.executemany(
+            "INSERT INTO files (category_id, filename, size, mtime, hash, tags) VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+    return names
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索索引测试")
+    parser.add_argument("--files", type=int, default=100000, help="表情组中的文件数")
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=1000, help="每类查询的执行次数")
+    parser.add_argument("--limit", type=int, default=20, help="每次查询返回的条数")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    catalog_mod = _load("backend.catalog")
+    search = _load("backend.search")
+
+    rng = random.Random(args.seed)
+    tmp_dir = tempfile.mkdtemp(prefix="meme-search-")
+    catalog = catalog_mod.MemeCatalog(os.path.join(tmp_dir, "catalog.db"))
+    group = "search_bench"
+    names = populate(catalog, group, args.files, args.categories, rng)
+
+    started = time.perf_counter()
+    index = search.SearchIndex(group, catalog)
+    index.rebuild()
+    build_time = time.perf_counter() - started
+    print(f"{args.files} 个文件 / {args.categories} 个类别，索引 {len(index)} 条，"
+          f"{len(index._postings)} 个词，建立用时 {build_time * 1000:.0f}ms")
+
+    queries = {
+        "类别名": lambda: rng.choice(SUBJECTS) + rng.choice(MOODS),
+        "描述词": lambda: rng.choice(MOODS),
+        "文件名前缀": lambda: rng.choice(TAGS[:10])[:3],
+        "文件名编号": lambda: f"{rng.randrange(args.files):06d}",
+        "标签": lambda: rng.choice(TAGS),
+        "多词组合": lambda: f"{rng.choice(TAGS[10:])} {rng.choice(TAGS[:10])[:3]}",
+    }
+    print(f"  {'查询':<10}{'平均命中':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}")
+    for label, make_query in queries.items():
+        samples, hits = [], []
+        for _ in range(args.rounds):
+            query = make_query()
+            started = time.perf_counter()
+            result = index.search(query, args.limit)
+            samples.append(time.perf_counter() - started)
+            hits.append(result["total"])
+        print(f"  {label:<10}{statistics.mean(hits):>12.0f}"
+              + "".join(f"{value * 1000:>8.3f}ms" for value in (
+                  percentile(samples, 0.5), percentile(samples, 0.95), percentile(samples, 0.99), max(samples)
+              )))
+
+    # 增量更新：修改一批文件的标签和几个类别的描述
+    rows = catalog.iter_group_files(group, names[0])[:100]
+    for row in rows:
+        catalog.set_file_tags(group, row["category"], row["filename"], rng.sample(TAGS, 2))
+    for name in names[1:6]:
+        catalog.set_description(group, name, f"新的{rng.choice(MOODS)}表情")
+    started = time.perf_counter()
+    index.refresh()
+    print(f"  增量更新 {len(rows)} 个文件标签和 5 个类别描述: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    catalog.close()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
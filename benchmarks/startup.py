@@ -0,0 +1,188 @@
+"""
+插件启动耗时基准
+
+分别统计各模块的导入耗时（每个模块在独立的解释器中用 -X importtime 测量，
+互不共享模块缓存）以及插件初始化各组件的构造耗时，可用 --budget-ms 设定上限，
+超出时以非零状态退出，便于在部署前检查插件加载时间。
+
+用法:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 5 --budget-ms 300
+    python benchmarks/startup.py --modules main webui --top 10
+
+注意: 初始化部分会使用插件真实的数据目录（memes_data），与实际启动时一致。
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+PARENT_DIR = os.path.dirname(PLUGIN_DIR)
+
+# 默认统计的模块，main 依赖 AstrBot，未安装时会被跳过
+DEFAULT_MODULES = [
+    "config",
+    "utils",
+    "init",
+    "backend.catalog",
+    "backend.category_manager",
+    "backend.group_registry",
+    "backend.ingest",
+    "backend.watcher",
+    "backend.blob_store",
+    "backend.cold_tier",
+    "image_host.img_sync",
+    "webui",
+    "main",
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure_import(module: str):
+    """在新的解释器中导入模块，返回 (总耗时 ms, [(直接依赖, 累计 us)])，导入失败时返回 (None, 错误信息)"""
+    name = f"{PACKAGE}.{module}"
+    code = (
+        "import time, sys\n"
+        "t = time.perf_counter()\n"
+        f"import {name}\n"
+        "print((time.perf_counter() - t) * 1000)\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PARENT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["未知错误"])[-1]
+        return None, last
+    elapsed = float(proc.stdout.strip().splitlines()[-1])
+    # -X importtime 先输出子模块再输出父模块，子模块缩进更深；
+    # 收集目标模块所在顶层块中的直接依赖（比顶层多一级缩进）
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((len(match.group(3)), match.group(4), int(match.group(2))))
+    depth = min((e[0] for e in entries), default=0)
+    block, children = [], []
+    for indent, mod, cumulative in entries:
+        if indent == depth:
+            if mod == name:
+                children = [(m, c) for i, m, c in block if i == depth + 2]
+            block = []
+        else:
+            block.append((indent, mod, cumulative))
+    return elapsed, children
+
+
+def measure_init():
+    """在当前进程中构造插件启动时创建的组件，返回 [(名称, ms)]"""
+    sys.path.insert(0, PARENT_DIR)
+
+    def load(module):
+        __import__(f"{PACKAGE}.{module}")
+        return sys.modules[f"{PACKAGE}.{module}"]
+
+    results = []
+
+    def timed(label, func):
+        t = time.perf_counter()
+        value = func()
+        results.append((label, (time.perf_counter() - t) * 1000))
+        return value
+
+    init = load("init")
+    catalog_mod = load("backend.catalog")
+    registry_mod = load("backend.group_registry")
+    ingest_mod = load("backend.ingest")
+    watcher_mod = load("backend.watcher")
+    cold_tier_mod = load("backend.cold_tier")
+
+    timed("init_plugin()", init.init_plugin)
+    catalog = timed("get_catalog()", catalog_mod.get_catalog)
+    registry = timed("GroupRegistry()", lambda: registry_mod.GroupRegistry(catalog=catalog))
+    manager = timed("GroupRegistry.get('default')", lambda: registry.get("default"))
+    timed("GroupRegistry.prompt_for('default')", lambda: registry.prompt_for("default"))
+    timed("IngestPool()", lambda: ingest_mod.IngestPool({}))
+    timed("DirectoryWatcher()", lambda: watcher_mod.DirectoryWatcher(manager.reconciler, {}))
+    timed("ColdTierManager()", lambda: cold_tier_mod.ColdTierManager(catalog, None, {}))
+    registry.flush_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="插件启动耗时基准")
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES, help="要统计的模块（相对插件包）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块导入的重复次数，取中位数")
+    parser.add_argument("--top", type=int, default=5, help="每个模块显示耗时最多的直接依赖数量")
+    parser.add_argument("--budget-ms", type=float, default=0, help="导入 main（或最后一个模块）加初始化的总耗时上限")
+    parser.add_argument("--no-init", action="store_true", help="只统计导入耗时")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    report = {"package": PACKAGE, "python": sys.version.split()[0], "imports": {}, "init": []}
+    for module in args.modules:
+        samples, children, error = [], [], None
+        for _ in range(max(1, args.repeat)):
+            elapsed, detail = measure_import(module)
+            if elapsed is None:
+                error = detail
+                break
+            samples.append(elapsed)
+            children = detail
+        if error:
+            report["imports"][module] = {"error": error}
+            continue
+        deps = sorted(children, key=lambda item: item[1], reverse=True)[: args.top]
+        report["imports"][module] = {
+            "median_ms": round(statistics.median(samples), 2),
+            "min_ms": round(min(samples), 2),
+            "heaviest": [{"module": mod, "ms": round(us / 1000, 2)} for mod, us in deps],
+        }
+
+    if not args.no_init:
+        report["init"] = [{"component": label, "ms": round(ms, 2)} for label, ms in measure_init()]
+
+    measured = [m for m in args.modules if "median_ms" in report["imports"].get(m, {})]
+    entry = "main" if "main" in measured else (measured[-1] if measured else None)
+    import_ms = report["imports"][entry]["median_ms"] if entry else 0.0
+    init_ms = sum(item["ms"] for item in report["init"])
+    report["total"] = {"entry": entry, "import_ms": import_ms, "init_ms": round(init_ms, 2),
+                       "total_ms": round(import_ms + init_ms, 2), "budget_ms": args.budget_ms}
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"包: {PACKAGE}  Python {report['python']}  重复 {args.repeat} 次")
+        print("\n导入耗时（独立解释器，中位数）")
+        for module, info in report["imports"].items():
+            if "error" in info:
+                print(f"  {module:<28} 跳过: {info['error']}")
+                continue
+            print(f"  {module:<28} {info['median_ms']:>9.1f} ms")
+            for dep in info["heaviest"]:
+                print(f"      {dep['module']:<36} {dep['ms']:>9.1f} ms")
+        if report["init"]:
+            print("\n初始化耗时")
+            for item in report["init"]:
+                print(f"  {item['component']:<36} {item['ms']:>9.1f} ms")
+        total = report["total"]
+        print(f"\n合计: 导入 {total['entry']} {total['import_ms']:.1f} ms + 初始化 {total['init_ms']:.1f} ms"
+              f" = {total['total_ms']:.1f} ms")
+
+    if args.budget_ms and report["total"]["total_ms"] > args.budget_ms:
+        print(f"超出预算: {report['total']['total_ms']:.1f} ms > {args.budget_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+WebUI 并发负载测试
+
+在同一事件循环中并发发起列表请求（/api/categories、/api/category/<类别>/files）
+和上传请求（/api/emoji/add），统计各请求的延迟、总用时和事件循环的最大卡顿。
+--disk-latency 为每次索引查询和文件读取额外加上的延迟，用来模拟慢磁盘。
+
+默认先以"内联"方式（文件操作直接在事件循环中执行，即改动前的行为）运行一轮，
+再以线程池方式运行一轮并对比：内联时一个慢请求会阻塞所有请求，延迟随并发数线性增长；
+使用线程池后事件循环保持响应，请求之间不再串行。
+
+用法:
+    python benchmarks/webui_load.py
+    python benchmarks/webui_load.py --listings 200 --uploads 40 --disk-latency 10 --workers 8
+
+注意: 使用插件真实的数据目录，测试表情组名为 load_<时间戳>，结束后删除（--keep 保留）。
+"""
+import os
+import io
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import statistics
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+
+def _load(module):
+    __import__(f"{PACKAGE}.{module}")
+    return sys.modules[f"{PACKAGE}.{module}"]
+
+
+def _slow(func, latency):
+    """给阻塞调用加上固定延迟，模拟慢磁盘"""
+    def wrapper(*args, **kwargs):
+        time.sleep(latency)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+async def _inline_run_io(func, *args, **kwargs):
+    """改动前的行为：直接在事件循环中执行阻塞调用"""
+    return func(*args, **kwargs)
+
+
+class LoopLag:
+    """测量事件循环的卡顿：定时唤醒并记录实际唤醒比预期晚了多久"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run_round(app, group, categories, args, round_no):
+    from werkzeug.datastructures import FileStorage
+
+    client = app.test_client()
+    async with client.session_transaction() as session:
+        session["authenticated"] = True
+
+    async def timed(coro):
+        started = time.perf_counter()
+        response = await coro
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.status_code}: {await response.get_data(as_text=True)}")
+        return time.perf_counter() - started
+
+    def listing(i):
+        if i % 2 == 0:
+            return client.get("/api/categories")
+        return client.get(f"/api/category/{categories[i % len(categories)]}/files?limit=100&sort=mtime&order=desc")
+
+    def upload(i):
+        content = os.urandom(args.upload_kb * 1024)
+        return client.post(
+            "/api/emoji/add",
+            form={"category": categories[i % len(categories)]},
+            files={"image_file": FileStorage(io.BytesIO(content), filename=f"upload_{round_no}_{i}.png")},
+        )
+
+    jobs = [("list", timed(listing(i))) for i in range(args.listings)]
+    jobs += [("upload", timed(upload(i))) for i in range(args.uploads)]
+    started = time.perf_counter()
+    with LoopLag() as lag:
+        latencies = await asyncio.gather(*(job for _, job in jobs))
+    elapsed = time.perf_counter() - started
+
+    result = {"elapsed": elapsed, "max_lag": lag.max_lag}
+    for kind in ("list", "upload"):
+        values = sorted(t for (k, _), t in zip(jobs, latencies) if k == kind)
+        if values:
+            result[kind] = {
+                "p50": statistics.median(values),
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebUI 并发负载测试")
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--files", type=int, default=500, help="每个类别预先生成的文件数")
+    parser.add_argument("--listings", type=int, default=100, help="并发列表请求数")
+    parser.add_argument("--uploads", type=int, default=20, help="并发上传请求数")
+    parser.add_argument("--upload-kb", type=int, default=64)
+    parser.add_argument("--disk-latency", type=float, default=5.0, help="模拟的磁盘延迟（毫秒）")
+    parser.add_argument("--workers", type=int, default=4, help="文件操作线程数")
+    parser.add_argument("--no-inline", action="store_true", help="跳过改动前行为的对照轮")
+    parser.add_argument("--keep", action="store_true", help="保留测试表情组")
+    args = parser.parse_args()
+
+    config = _load("config")
+    models = _load("backend.models")
+    api = _load("backend.api")
+    catalog_mod = _load("backend.catalog")
+    webui = _load("webui")
+    category_manager = _load("backend.category_manager")
+
+    group = f"load_{int(time.time())}"
+    group_dir = os.path.join(config.MEMES_DIR, group)
+    categories = [f"cat{i}" for i in range(args.categories)]
+    for category in categories:
+        os.makedirs(os.path.join(group_dir, category), exist_ok=True)
+        for i in range(args.files):
+            with open(os.path.join(group_dir, category, f"seed_{i}.png"), "wb") as f:
+                f.write(os.urandom(256))
+
+    manager = category_manager.CategoryManager(group)
+    webui.app.secret_key = os.urandom(16)
+    webui.app.config["PLUGIN_CONFIG"] = {
+        "category_manager": manager,
+        "plugin_config": {"active_emotion_group": group},
+    }
+
+    latency = args.disk_latency / 1000
+    if latency > 0:
+        catalog_mod.MemeCatalog._query = _slow(catalog_mod.MemeCatalog._query, latency)
+        models.probe_file = _slow(models.probe_file, latency)
+    models.configure_io(args.workers)
+
+    modes = [] if args.no_inline else [("内联（改动前）", _inline_run_io)]
+    modes.append((f"线程池（{args.workers} 线程）", models.run_io))
+    results = []
+    for round_no, (name, run_io) in enumerate(modes):
+        models.run_io = api.run_io = webui.run_io = run_io
+        results.append((name, asyncio.run(run_round(webui.app, group, categories, args, round_no))))
+    models.shutdown_io()
+
+    print(f"{args.listings} 个列表请求 + {args.uploads} 个上传请求并发，模拟磁盘延迟 {args.disk_latency:g}ms")
+    for name, r in results:
+        print(f"  {name}: 总用时 {r['elapsed'] * 1000:.0f}ms，事件循环最大卡顿 {r['max_lag'] * 1000:.1f}ms")
+        for kind, label in (("list", "列表"), ("upload", "上传")):
+            if kind in r:
+                print(f"    {label}: p50 {r[kind]['p50'] * 1000:.1f}ms  p95 {r[kind]['p95'] * 1000:.1f}ms")
+
+    if not args.keep:
+        manager.flush()
+        catalog_mod.get_catalog().delete_group(group)
+        shutil.rmtree(group_dir, ignore_errors=True)
+        for path in (
+            os.path.join(config.MEMES_BASE_DIR, f"memes_data_{group}.json"),
+            _load("backend.job_lock").JobLock(f"memes_data_{group}").path,
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
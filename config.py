@@ -1,5 +1,5 @@
 import os
-import sys
+import logging
 from pathlib import Path
 
 # 获取当前插件目录的绝对路径
@@ -13,9 +13,10 @@ MEMES_DIR = MEMES_BASE_DIR / "memes"
 # 确保目录存在
 os.makedirs(MEMES_DIR, exist_ok=True)
 
-# 添加日志输出帮助调试
-print(f"插件目录: {PLUGIN_DIR}", file=sys.stderr)
-print(f"表情包基础目录: {MEMES_BASE_DIR}", file=sys.stderr)
+# 调试用的路径信息，只在 DEBUG 日志级别输出
+logger = logging.getLogger(__name__)
+logger.debug(f"插件目录: {PLUGIN_DIR}")
+logger.debug(f"表情包基础目录: {MEMES_BASE_DIR}")
 
 # 获取当前文件所在目录
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,7 +24,11 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 # 基础路径配置
 BASE_DATA_DIR = os.path.join(CURRENT_DIR, "../../memes_data")
 MEMES_DATA_PATH_DEFAULT = os.path.join(BASE_DATA_DIR, "memes_data_default.json")  # 默认类别描述数据文件路径
+CATALOG_DB_PATH = MEMES_BASE_DIR / "memes_catalog.db"  # 表情包目录索引数据库
 TEMP_DIR = os.path.join(CURRENT_DIR, "../../temp")
+BUNDLED_MEMES_DIR = os.path.join(CURRENT_DIR, "memes")  # 插件自带的默认表情包
+BUNDLED_MANIFEST_PATH = os.path.join(CURRENT_DIR, "memes_manifest.json")  # 自带表情包清单
+BUNDLED_INSTALL_MARKER = MEMES_BASE_DIR / ".bundled_install.json"  # 已安装的清单版本
 
 # 默认的类别描述
 DEFAULT_CATEGORY_DESCRIPTIONS = {
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import List, Dict
 
@@ -7,18 +8,30 @@ class FileHandler:
 
     SUPPORTED_FORMATS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
-    def __init__(self, base_dir: Path):
+    def __init__(self, base_dir: Path, catalog=None, group: str = None):
+        """
+        Args:
+            base_dir: 本地图片目录
+            catalog: 可选的目录索引，提供时直接查询索引而不遍历目录
+            group: 索引中对应的表情组名
+        """
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.catalog = catalog
+        self.group = group
 
     def scan_local_images(self) -> List[Dict[str, str]]:
         """扫描本地图片"""
+        if self.catalog is not None and self.group:
+            return self._images_from_catalog()
+
         images = []
-        for file_path in self.base_dir.rglob("*"):
-            if (
-                file_path.is_file()
-                and file_path.suffix.lower() in self.SUPPORTED_FORMATS
-            ):
+        # os.walk 基于 os.scandir，目录项自带类型信息，不需要逐个 stat
+        for dirpath, _, filenames in os.walk(self.base_dir):
+            for name in filenames:
+                file_path = Path(dirpath) / name
+                if file_path.suffix.lower() not in self.SUPPORTED_FORMATS:
+                    continue
                 # 计算相对路径
                 rel_path = file_path.relative_to(self.base_dir)
                 category = str(rel_path.parent).replace("\\", "/")
@@ -39,6 +52,32 @@ class FileHandler:
                 )
         return images
 
+    def _images_from_catalog(self) -> List[Dict[str, str]]:
+        """
+        从目录索引读取本地图片列表
+
+        已移到图床（cloud 层级）的表情也列出，避免从云端同步时又被下载回来；
+        它们在本地没有文件，tier 为 cloud，不能上传。
+        """
+        images = []
+        for row in self.catalog.iter_group_files(self.group):
+            category, filename = row["category"], row["filename"]
+            images.append(
+                {
+                    "path": str(self.base_dir / category / filename),
+                    "id": f"{category}/{filename}",
+                    "filename": filename,
+                    "category": category,
+                    "tier": row["tier"],
+                }
+            )
+        return images
+
+    def refresh_index(self) -> None:
+        """本地文件变化后重新扫描目录索引"""
+        if self.catalog is not None and self.group:
+            self.catalog.reconcile_group(self.group, str(self.base_dir))
+
     def get_file_path(self, category: str, filename: str) -> Path:
         """获取文件完整路径，支持分类目录"""
         path = self.base_dir
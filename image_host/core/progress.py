@@ -0,0 +1,108 @@
+import time
+import queue
+from typing import Any, Dict, List, Optional
+
+# 进度中保留的最近错误条数
+MAX_ERRORS = 20
+
+
+class SyncProgress:
+    """同步进度
+
+    在同步进程中更新，通过 multiprocessing.Queue 发送给启动同步的进程（WebUI）。
+    每次发送的是完整快照而不是增量，接收方只需保留最新一条，丢失中间的快照不影响结果；
+    队列已满时直接丢弃，同步本身不会因为没人读取进度而阻塞。
+    """
+
+    def __init__(self, progress_queue=None, task: str = "", min_interval: float = 0.2):
+        self.queue = progress_queue
+        self.task = task
+        self.min_interval = min_interval
+        self.stage = "starting"
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.current: Optional[str] = None
+        self.errors: List[Dict[str, str]] = []
+        self.completed = False
+        self.success: Optional[bool] = None
+        self.message: Optional[str] = None
+        self._started = time.monotonic()
+        self._stage_started = self._started
+        self._stage_bytes = 0
+        self._last_sent = 0.0
+
+    def start_stage(self, stage: str, total: int = 0) -> None:
+        """进入新阶段（scanning / upload / download / delete），计数从零开始"""
+        self.stage = stage
+        self.total = total
+        self.done = self.failed = 0
+        self.current = None
+        self._stage_started = time.monotonic()
+        self._stage_bytes = self.bytes
+        self._send(force=True)
+
+    def file_started(self, name: str) -> None:
+        self.current = name
+        self._send()
+
+    def file_done(self, size: int = 0) -> None:
+        self.done += 1
+        self.bytes += size
+        self._send()
+
+    def file_failed(self, name: str, error: str) -> None:
+        self.failed += 1
+        self.errors.append({"file": name, "error": error})
+        del self.errors[:-MAX_ERRORS]
+        self._send(force=True)
+
+    def finish(self, success: bool, error: Optional[str] = None, message: Optional[str] = None) -> None:
+        self.stage = "finished"
+        self.current = None
+        self.completed = True
+        self.success = success
+        self.message = message
+        if error:
+            self.errors.append({"file": "", "error": error})
+            del self.errors[:-MAX_ERRORS]
+        self._send(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        stage_elapsed = now - self._stage_started
+        return {
+            "task": self.task,
+            "stage": self.stage,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "elapsed": round(now - self._started, 2),
+            # 当前阶段的平均速度（字节/秒、文件/秒）
+            "throughput": round((self.bytes - self._stage_bytes) / stage_elapsed) if stage_elapsed > 0 else 0,
+            "files_per_second": round((self.done + self.failed) / stage_elapsed, 2) if stage_elapsed > 0 else 0,
+            "current": self.current,
+            "errors": list(self.errors),
+            "completed": self.completed,
+            "success": self.success,
+            "message": self.message,
+        }
+
+    def _send(self, force: bool = False) -> None:
+        if self.queue is None:
+            return
+        now = time.monotonic()
+        # 逐文件的更新按时间间隔节流，阶段切换、错误和结束总是发送
+        if not force and now - self._last_sent < self.min_interval:
+            return
+        self._last_sent = now
+        try:
+            if self.completed:
+                # 最后一条必须送达，稍等队列腾出空间
+                self.queue.put(self.snapshot(), timeout=2)
+            else:
+                self.queue.put_nowait(self.snapshot())
+        except queue.Full:
+            pass
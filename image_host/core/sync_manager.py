@@ -3,14 +3,24 @@ from typing import Dict, List
 from tqdm import tqdm
 from ..interfaces.image_host import ImageHostInterface
 from .file_handler import FileHandler
+from .progress import SyncProgress
 
 
 class SyncManager:
     """同步管理器"""
 
-    def __init__(self, image_host: ImageHostInterface, local_dir: Path):
+    def __init__(
+        self,
+        image_host: ImageHostInterface,
+        local_dir: Path,
+        catalog=None,
+        group: str = None,
+        progress: SyncProgress = None,
+    ):
         self.image_host = image_host
-        self.file_handler = FileHandler(local_dir)
+        self.file_handler = FileHandler(local_dir, catalog=catalog, group=group)
+        # 结构化进度，未提供时只更新不发送
+        self.progress = progress or SyncProgress()
 
     def check_sync_status(self) -> Dict[str, List[Dict]]:
         """检查同步状态"""
@@ -38,7 +48,11 @@ class SyncManager:
         remote_files = {img["id"].replace("\\", "/"): img for img in remote_images}
 
         # 找出差异
-        to_upload = [img for img in local_images if img["id"] not in remote_files]
+        # 已移到图床的表情本地没有文件，即使图床上缺失也无法上传
+        to_upload = [
+            img for img in local_images
+            if img["id"] not in remote_files and img.get("tier", "local") == "local"
+        ]
         to_download = [img for img in remote_images if img["id"] not in local_files]
 
         if to_upload:
@@ -68,6 +82,7 @@ class SyncManager:
 
     def sync_to_remote(self) -> bool:
         """同步本地文件到远程"""
+        self.progress.start_stage("scanning")
         status = self.check_sync_status()
 
         if status.get("is_synced", False):
@@ -77,31 +92,40 @@ class SyncManager:
         to_upload = status["to_upload"]
         if to_upload:
             print(f"\n开始上传 {len(to_upload)} 个文件...")
+            self.progress.start_stage("upload", len(to_upload))
             with tqdm(total=len(to_upload), desc="上传进度") as pbar:
                 for image in to_upload:
                     file_path = Path(image["path"])
+                    self.progress.file_started(image["id"])
                     try:
                         self.image_host.upload_image(file_path)
                         pbar.update(1)
+                        self.progress.file_done(file_path.stat().st_size)
                     except Exception as e:
                         print(f"\n上传失败: {file_path.name} - {str(e)}")
+                        self.progress.file_failed(image["id"], str(e))
 
         # 删除远程文件
         to_delete = status["to_delete_remote"]
         if to_delete:
             print(f"\n开始删除远程文件 {len(to_delete)} 个...")
+            self.progress.start_stage("delete", len(to_delete))
             with tqdm(total=len(to_delete), desc="删除进度") as pbar:
                 for image in to_delete:
+                    self.progress.file_started(image["id"])
                     try:
                         self.image_host.delete_image(image["id"])
                         pbar.update(1)
+                        self.progress.file_done()
                     except Exception as e:
                         print(f"\n删除失败: {image['id']} - {str(e)}")
+                        self.progress.file_failed(image["id"], str(e))
 
         return True
 
     def sync_from_remote(self) -> bool:
         """从远程同步文件到本地"""
+        self.progress.start_stage("scanning")
         status = self.check_sync_status()
 
         if status.get("is_synced", False):
@@ -111,8 +135,10 @@ class SyncManager:
         to_download = status["to_download"]
         if to_download:
             print(f"\n开始下载 {len(to_download)} 个文件...")
+            self.progress.start_stage("download", len(to_download))
             with tqdm(total=len(to_download), desc="下载进度") as pbar:
                 for image in to_download:
+                    self.progress.file_started(image["id"])
                     try:
                         # 使用图片信息中的分类
                         category = image.get("category", "default")
@@ -123,10 +149,14 @@ class SyncManager:
 
                         if self.image_host.download_image(image, save_path):
                             pbar.update(1)
+                            self.progress.file_done(save_path.stat().st_size if save_path.exists() else 0)
                         else:
                             print(f"\n下载失败: {filename}")
+                            self.progress.file_failed(image["id"], "下载失败")
                     except Exception as e:
                         print(f"\n下载失败: {filename} - {str(e)}")
+                        self.progress.file_failed(image["id"], str(e))
+            self.file_handler.refresh_index()
 
         # 删除本地文件
         to_delete = status["to_delete_local"]
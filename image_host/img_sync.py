@@ -1,14 +1,20 @@
 from pathlib import Path
 from typing import Dict, List, Union
 from .core.sync_manager import SyncManager
+from .core.progress import SyncProgress
 from .providers.stardots_provider import StarDotsProvider
 import multiprocessing
+import threading
+import queue
 import sys
 import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 同步进程发送进度快照的队列长度（接收方只关心最新一条，满了直接丢弃）
+PROGRESS_QUEUE_SIZE = 64
+
 
 class ImageSync:
     """图片同步客户端
@@ -36,16 +42,20 @@ class ImageSync:
         sync.sync_all()
     """
 
-    def __init__(self, config: Dict[str, str], local_dir: Union[str, Path]):
+    def __init__(self, config: Dict[str, str], local_dir: Union[str, Path], catalog=None, group: str = None):
         """
         初始化同步客户端
 
         Args:
             config: 包含图床配置信息的字典，必须包含 key、secret 和 space
             local_dir: 本地图片目录的路径
+            catalog: 可选的表情包目录索引，提供时本地文件列表从索引读取
+            group: 索引中对应的表情组名
         """
         self.config = config
         self.local_dir = Path(local_dir)
+        self.catalog = catalog
+        self.group = group
         self.provider = StarDotsProvider(
             {
                 "key": config["key"],
@@ -55,10 +65,13 @@ class ImageSync:
             }
         )
         self.sync_manager = SyncManager(
-            image_host=self.provider, local_dir=self.local_dir
+            image_host=self.provider, local_dir=self.local_dir, catalog=catalog, group=group
         )
         self.sync_process = None
         self._sync_task = None
+        # 最近一次同步的进度快照，seq 每次更新加一
+        self.progress: Dict = {"seq": 0, "stage": "idle", "completed": True, "success": None}
+        self._progress_cond = threading.Condition()
 
     def check_status(self) -> Dict[str, List[Dict[str, str]]]:
         """
@@ -98,10 +111,7 @@ class ImageSync:
             return True
 
         # 创建并启动进程
-        self.sync_process = multiprocessing.Process(
-            target=run_sync_process, args=(self.config, str(self.local_dir), task)
-        )
-        self.sync_process.start()
+        self.sync_process = self._start_sync_process(task)
 
         # 创建异步任务来等待进程完成
         loop = asyncio.get_event_loop()
@@ -191,33 +201,112 @@ class ImageSync:
         """
         return self.provider.delete_image(filename)
 
+    def wait_progress(self, seen: int, timeout: float) -> Dict:
+        """
+        等待比 seen 更新的进度快照（阻塞，在线程中调用）
+
+        Args:
+            seen: 调用方已收到的快照序号
+            timeout: 最长等待秒数，超时返回当前快照（序号可能未变）
+
+        Returns:
+            进度快照的副本
+        """
+        with self._progress_cond:
+            self._progress_cond.wait_for(lambda: self.progress["seq"] > seen, timeout)
+            return dict(self.progress)
+
+    def _set_progress(self, snapshot: Dict) -> None:
+        with self._progress_cond:
+            self.progress = {**snapshot, "seq": self.progress["seq"] + 1}
+            self._progress_cond.notify_all()
+
+    def _relay_progress(self, process: multiprocessing.Process, progress_queue) -> None:
+        """把同步进程发来的进度转存为最新快照，进程结束后补上最终状态（在后台线程中运行）"""
+        last = None
+        while True:
+            try:
+                last = progress_queue.get(timeout=0.5)
+                self._set_progress(last)
+                continue
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                break
+            if not process.is_alive():
+                break
+        process.join()
+        if last is None or not last.get("completed"):
+            # 进程没有发送最终进度（异常退出、被终止或跳过同步）
+            success = process.exitcode == 0
+            snapshot = dict(last or {"stage": "finished", "errors": []})
+            snapshot.update(stage="finished", current=None, completed=True, success=success)
+            if not success:
+                snapshot["errors"] = snapshot.get("errors", []) + [
+                    {"file": "", "error": f"同步进程异常退出 (exitcode={process.exitcode})"}
+                ]
+            self._set_progress(snapshot)
+        progress_queue.close()
+
     def _start_sync_process(self, task: str) -> multiprocessing.Process:
         """
-        在独立进程中运行同步任务
+        在独立进程中运行同步任务，进度通过队列发送回本进程，由 wait_progress 读取
         """
+        progress_queue = multiprocessing.Queue(PROGRESS_QUEUE_SIZE)
+        self._set_progress({**SyncProgress(task=task).snapshot(), "stage": "starting"})
+
         # 创建进程对象
         process = multiprocessing.Process(
-            target=run_sync_process, args=(self.config, str(self.local_dir), task)
+            target=run_sync_process,
+            args=(self.config, str(self.local_dir), task, self.catalog, self.group, progress_queue),
         )
 
         # 启动进程
         process.start()
+        threading.Thread(
+            target=self._relay_progress, args=(process, progress_queue), name="meme-sync-progress", daemon=True
+        ).start()
         return process
 
 
-def run_sync_process(config: Dict[str, str], local_dir: str, task: str):
+def run_sync_process(
+    config: Dict[str, str], local_dir: str, task: str, catalog=None, group: str = None, progress_queue=None
+):
     """
     在独立进程中运行同步任务
+
+    多个机器人实例共用数据目录时，同一表情组同一时间只有一个进程在同步，其余直接跳过。
+    提供 progress_queue 时同步进度的快照会发送到该队列。
     """
-    sync = ImageSync(config, local_dir)
+    from ..backend.job_lock import single_writer
+
+    progress = SyncProgress(progress_queue, task)
+    with single_writer(f"sync_{group or Path(local_dir).name}") as acquired:
+        if not acquired:
+            logger.info("其他进程正在同步该表情组，跳过本次同步")
+            progress.finish(True, message="其他进程正在同步该表情组，已跳过")
+            sys.exit(0)
+        try:
+            success = _run_sync_task(config, local_dir, task, catalog, group, progress)
+        except Exception as e:
+            progress.finish(False, str(e))
+            raise
+        progress.finish(success)
+        sys.exit(0 if success else 1)
+
+
+def _run_sync_task(
+    config: Dict[str, str], local_dir: str, task: str, catalog=None, group: str = None, progress: SyncProgress = None
+) -> bool:
+    sync = ImageSync(config, local_dir, catalog=catalog, group=group)
+    sync.sync_manager.progress = progress or SyncProgress(task=task)
 
     if task == "upload":
-        success = sync.sync_manager.sync_to_remote()
-        sys.exit(0 if success else 1)
+        return sync.sync_manager.sync_to_remote()
     elif task == "download":
-        success = sync.sync_manager.sync_from_remote()
-        sys.exit(0 if success else 1)
+        return sync.sync_manager.sync_from_remote()
     elif task == "sync_all":
         upload_success = sync.sync_manager.sync_to_remote()
         download_success = sync.sync_manager.sync_from_remote()
-        sys.exit(0 if upload_success and download_success else 1)
+        return upload_success and download_success
+    raise ValueError(f"未知的同步任务: {task}")
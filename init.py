@@ -1,6 +1,6 @@
 import os
 import logging
-from .utils import ensure_dir_exists, save_json, copy_memes_if_not_exists
+from .utils import ensure_dir_exists, save_json, install_bundled_memes
 from .config import (
     BASE_DATA_DIR,
     MEMES_DIR,
@@ -10,14 +10,15 @@ from .config import (
 
 logger = logging.getLogger(__name__)
 
-def init_plugin():
+def init_plugin(config: dict = None):
     """初始化插件，创建必要的目录和配置文件"""
+    config = config or {}
     try:
         # 创建基础数据目录
         ensure_dir_exists(BASE_DATA_DIR)
         
-        # 创建表情包目录
-        copy_memes_if_not_exists()
+        # 按清单安装自带表情包（已安装同一版本时不遍历目录）
+        install_bundled_memes(allow_hardlink=config.get("bundled_memes_hardlink", False))
         
         # 初始化默认的 memes_data_default.json
         if not os.path.exists(MEMES_DATA_PATH_DEFAULT):
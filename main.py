@@ -5,16 +5,14 @@ import random
 import logging
 import json
 import time
-import aiohttp
 import ssl
 import copy
-from PIL import Image
 import asyncio
 import shutil
-from multiprocessing import Process
+import tempfile
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
-from astrbot.api.provider import LLMResponse
+from astrbot.api.provider import LLMResponse, ProviderRequest
 from astrbot.api.message_components import *
 from astrbot.api.event.filter import EventMessageType
 from astrbot.api.event import ResultContentType
@@ -24,13 +22,22 @@ from astrbot.core.message.message_event_result import MessageChain
 from astrbot.api.provider import Personality
 from astrbot.core.platform.sources.gewechat.gewechat_platform_adapter import GewechatPlatformAdapter
 from astrbot.core.platform.sources.gewechat.gewechat_event import GewechatPlatformEvent
-from .webui import run_server, ServerState
-from .utils import get_public_ip, generate_secret_key, dict_to_string, load_json
-from .image_host.img_sync import ImageSync
-from .config import MEMES_DIR
-from .backend.category_manager import CategoryManager
+from .utils import get_public_ip, generate_secret_key, dict_to_string, load_json, save_json
+from .config import MEMES_DIR, MEMES_BASE_DIR, TEMP_DIR
+from .backend.group_registry import GroupRegistry
+from .backend.ingest import IngestPool
+from .backend.watcher import DirectoryWatcher
+from .backend.archive_import import import_archive
+from .backend.blob_store import BlobStore
+from .backend.cold_tier import ColdTierManager
+from .backend.change_feed import ChangeFeed
+from .backend.catalog import CHANGE_DESCRIPTION, CHANGE_GROUP_DELETED, CHANGE_RESET, CHANGE_SETTING
+from .backend.search import get_search_index, drop_search_index
 from .init import init_plugin
 
+# 搜索命令列出的结果条数
+SEARCH_COMMAND_RESULTS = 8
+
 
 @register(
     "meme_manager", "anka", "anka - 表情包管理器 - 支持表情包发送及表情包上传", "2.0"
@@ -42,38 +49,62 @@ class MemeSender(Star):
         self.name = "meme_manager"
         
         # 初始化插件
-        if not init_plugin():
+        if not init_plugin(self.config):
             raise RuntimeError("插件初始化失败")
 
         # 获取当前激活的表情组
         self.active_group = self.config.get("active_emotion_group", "default")
         
-        # 初始化类别管理器
-        self.category_manager = CategoryManager(self.active_group)
+        # 初始化类别管理器（最近使用的表情组保留在缓存中，切换时无需重载）
+        # 其他表情组在第一次被会话使用时才加载，超出内存预算后按 LRU 淘汰
+        self.groups = GroupRegistry(
+            capacity=self.config.get("group_cache_size", 4),
+            memory_budget_kb=self.config.get("group_memory_budget_kb", 0),
+            render_prompt=self._render_prompt_suffix,
+        )
+        self.category_manager = self.groups.get(self.active_group)
+        self.groups.pinned = {self.active_group}
+        self.category_manager.catalog.set_setting("active_group", self.active_group)
+        # 按会话指定的表情组：{unified_msg_origin: group}
+        self.chat_groups = self.category_manager.catalog.get_chat_groups()
         
         # 初始化图床同步客户端
-        self.img_sync = None
-        if self.config.get("image_host") == "stardots":
-            stardots_config = self.config.get("image_host_config", {}).get("stardots", {})
-            if stardots_config.get("key") and stardots_config.get("secret"):
-                self.img_sync = ImageSync(
-                    config={
-                        "key": stardots_config["key"],
-                        "secret": stardots_config["secret"],
-                        "space": stardots_config.get("space", "memes")
-                    },
-                    local_dir=self.category_manager.memes_dir # 使用当前组的目录
-                )
+        self.img_sync = self._create_img_sync()
+
+        # 磁盘配额：超出时把最久未发送的表情移到图床，发送时再取回
+        self.cold_tier = ColdTierManager(
+            self.category_manager.catalog,
+            self.img_sync.provider if self.img_sync else None,
+            self.config.get("disk_quota", {}),
+        )
+        self._quota_task = None
+
+        # 初始化入库处理池（图片规范化在事件循环之外执行）
+        self.ingest_pool = IngestPool(self.config.get("ingest", {}))
+        self.ingest_pool.add_listener(self._on_ingest_done)
+
+        # 初始化目录监视（手动放入或同步下载的文件无需重载即可生效）
+        self.file_watcher = self._create_file_watcher()
+        self._watcher_task = None
 
-        # 用于管理服务器
+        # 接收 WebUI 进程对类别描述和当前表情组的修改
+        self.change_feed = ChangeFeed(
+            self.category_manager.catalog,
+            self._on_catalog_changes,
+            self.config.get("change_poll_interval", 0.5),
+        )
+
+        # 用于管理服务器：独立进程模式的进程，或进程内模式在本事件循环上运行的任务
         self.webui_process = None
+        self.webui_task = None
+        self._webui_shutdown = None
 
         self.server_key = None
         self.server_port = self.config.get("webui_port", 5000)
 
 
         # 初始化表情状态
-        self.found_emotions = []  # 存储找到的表情
+        self.pending_emotions = {}  # 存储各会话待发送的表情：{unified_msg_origin: [emotion]}
         self.upload_states = {}   # 存储上传状态：{user_session: {"category": str, "expire_time": float}}
         self.pending_images = {}  # 存储待发送的图片
         
@@ -96,16 +127,21 @@ class MemeSender(Star):
         self.persona_backup = copy.deepcopy(personas)
         self._reload_personas()
 
+        self._ensure_background_tasks()
+
     @filter.command_group("表情管理")
     def meme_manager(self):
         """表情包管理命令组:
         开启管理后台
         关闭管理后台
         查看图库
+        搜索
         添加表情
+        导入表情包
         同步状态
         同步到云端
         从云端同步
+        入库状态
         """
         pass
 
@@ -117,13 +153,15 @@ class MemeSender(Star):
         删除
         切换
         列表
+        绑定
+        解绑
         """
         pass
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @meme_group_manager.command("创建")
-    async def create_emotion_group(self, event: AstrMessageEvent, group_name: str):
-        """创建一个新的表情组"""
+    async def create_emotion_group(self, event: AstrMessageEvent, group_name: str, source_group: str = None):
+        """创建一个新的表情组，指定 source_group 时复制该组的类别和表情包"""
         if not re.match(r"^[a-zA-Z0-9_]+$", group_name):
             yield event.plain_result("组名只能包含字母、数字和下划线。")
             return
@@ -134,14 +172,34 @@ class MemeSender(Star):
             yield event.plain_result(f"表情组 '{group_name}' 已存在。")
             return
 
-        groups[group_name] = {"high_confidence_emotions": []}
+        if source_group and source_group not in groups:
+            yield event.plain_result(f"表情组 '{source_group}' 不存在。")
+            return
+        if source_group and not plugin_conf.get("enable_blob_store", False):
+            yield event.plain_result("复制表情组需要在插件配置中开启 enable_blob_store。")
+            return
+
+        groups[group_name] = copy.deepcopy(groups[source_group]) if source_group else {"high_confidence_emotions": []}
         plugin_conf["emotion_groups"] = groups
         plugin_conf.save_config()
         
         # 创建对应文件夹
         os.makedirs(os.path.join(MEMES_DIR, group_name), exist_ok=True)
 
-        yield event.plain_result(f"表情组 '{group_name}' 创建成功！请重载插件以应用更改。")
+        if source_group:
+            # 图片以硬链接共享同一份 blob，只复制描述和索引记录
+            source = await self._manager_for(source_group)
+            save_json(dict(source.get_descriptions()), os.path.join(MEMES_BASE_DIR, f"memes_data_{group_name}.json"))
+            stats = await asyncio.to_thread(
+                BlobStore().clone_group, self.category_manager.catalog, source_group, group_name
+            )
+            yield event.plain_result(
+                f"表情组 '{group_name}' 创建成功，已从 '{source_group}' 复制 {stats['files']} 个表情包！"
+                f"可使用 /表情组管理 切换 {group_name} 启用。"
+            )
+            return
+
+        yield event.plain_result(f"表情组 '{group_name}' 创建成功！可使用 /表情组管理 切换 {group_name} 启用。")
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @meme_group_manager.command("删除")
@@ -169,8 +227,14 @@ class MemeSender(Star):
         group_dir = os.path.join(MEMES_DIR, group_name)
         if os.path.exists(group_dir):
             shutil.rmtree(group_dir)
+        self.groups.discard(group_name)
+        await asyncio.to_thread(self.category_manager.catalog.delete_group, group_name)
+        drop_search_index(group_name)
+        self.chat_groups = {o: g for o, g in self.chat_groups.items() if g != group_name}
+        if plugin_conf.get("enable_blob_store", False):
+            await asyncio.to_thread(BlobStore().gc)
 
-        yield event.plain_result(f"表情组 '{group_name}' 已被删除！请重载插件以应用更改。")
+        yield event.plain_result(f"表情组 '{group_name}' 已被删除！")
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @meme_group_manager.command("切换")
@@ -184,7 +248,8 @@ class MemeSender(Star):
 
         plugin_conf["active_emotion_group"] = group_name
         plugin_conf.save_config()
-        yield event.plain_result(f"已切换到表情组 '{group_name}'。请重载插件以生效。")
+        elapsed = await self._activate_group(group_name)
+        yield event.plain_result(f"已切换到表情组 '{group_name}'（用时 {elapsed * 1000:.0f}ms）。")
 
     @meme_group_manager.command("列表")
     async def list_emotion_groups(self, event: AstrMessageEvent):
@@ -192,6 +257,7 @@ class MemeSender(Star):
         plugin_conf = self.config
         groups = plugin_conf.get("emotion_groups", {})
         active_group = plugin_conf.get("active_emotion_group", "default")
+        chat_group = self.chat_groups.get(event.unified_msg_origin)
         
         group_list = []
         for name in groups.keys():
@@ -199,9 +265,34 @@ class MemeSender(Star):
                 group_list.append(f"- {name} (当前)")
             else:
                 group_list.append(f"- {name}")
+            if name == chat_group:
+                group_list[-1] += " (本会话)"
         
         yield event.plain_result("可用的表情组：\n" + "\n".join(group_list))
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @meme_group_manager.command("绑定")
+    async def bind_emotion_group(self, event: AstrMessageEvent, group_name: str):
+        """让当前会话使用指定的表情组"""
+        if group_name not in self.config.get("emotion_groups", {}):
+            yield event.plain_result(f"表情组 '{group_name}' 不存在。")
+            return
+
+        origin = event.unified_msg_origin
+        await asyncio.to_thread(self.groups.get, group_name)
+        await asyncio.to_thread(self.category_manager.catalog.set_chat_group, origin, group_name)
+        self.chat_groups[origin] = group_name
+        yield event.plain_result(f"本会话已改用表情组 '{group_name}'。")
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @meme_group_manager.command("解绑")
+    async def unbind_emotion_group(self, event: AstrMessageEvent):
+        """让当前会话恢复使用默认表情组"""
+        origin = event.unified_msg_origin
+        await asyncio.to_thread(self.category_manager.catalog.set_chat_group, origin, None)
+        self.chat_groups.pop(origin, None)
+        yield event.plain_result(f"本会话已恢复使用当前表情组 '{self.active_group}'。")
+
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @meme_manager.command("开启管理后台")
@@ -210,8 +301,9 @@ class MemeSender(Star):
         yield event.plain_result("🚀 正在启动管理后台，请稍等片刻～")
 
         try:
-            state = ServerState()
-            state.ready.clear()
+            # WebUI（Quart、Hypercorn）只在启动后台时加载
+            from .webui import run_server
+            from multiprocessing import Process
 
             # 生成秘钥
             self.server_key = generate_secret_key(8)
@@ -232,16 +324,21 @@ class MemeSender(Star):
                 "plugin_context": self.context,
                 "plugin_name": self.name
             }
-            self.webui_process = Process(target=run_server, args=(config_for_server,))
-            self.webui_process.start()
-
-            # 等待服务器就绪（轮询检测端口激活）
-            for i in range(10):
-                if await self._check_port_active():
-                    break
-                await asyncio.sleep(1)
+            started = time.perf_counter()
+            if self.config.get("webui_mode") == "inprocess":
+                await self._start_webui_in_process(config_for_server)
             else:
-                raise RuntimeError("⌛ 启动超时，请检查防火墙设置")
+                self.webui_process = Process(target=run_server, args=(config_for_server,))
+                self.webui_process.start()
+
+                # 等待服务器就绪（轮询检测端口激活）
+                for i in range(10):
+                    if await self._check_port_active():
+                        break
+                    await asyncio.sleep(1)
+                else:
+                    raise RuntimeError("⌛ 启动超时，请检查防火墙设置")
+            self.logger.info(f"管理后台已启动，用时 {(time.perf_counter() - started) * 1000:.0f}ms")
 
             # 获取公网IP并返回结果
             public_ip = await get_public_ip()
@@ -263,6 +360,167 @@ class MemeSender(Star):
             await self._cleanup_resources()
 
 
+    async def _start_webui_in_process(self, config_for_server: dict):
+        """
+        在本事件循环上运行 WebUI（进程内模式）
+
+        WebUI 与插件共用表情组缓存（同一个类别管理器）和入库处理池，修改立即对机器人生效；
+        before_serving 执行完即视为就绪，不需要轮询端口。关闭时触发 shutdown_trigger 优雅退出。
+        """
+        from .webui import start_server, ServerState
+
+        state = ServerState()
+        state.ready.clear()
+        config_for_server.update(group_registry=self.groups, ingest_pool=self.ingest_pool)
+        self._webui_shutdown = asyncio.Event()
+        self.webui_task = asyncio.create_task(
+            start_server(config_for_server, shutdown_trigger=self._webui_shutdown.wait)
+        )
+        self.webui_task.add_done_callback(self._on_webui_task_done)
+        # WebUI 写入索引的记录与本进程同 pid，需要一并处理
+        self.change_feed.include_own = True
+
+        ready = asyncio.create_task(state.ready.wait())
+        done, _ = await asyncio.wait({ready, self.webui_task}, timeout=10, return_when=asyncio.FIRST_COMPLETED)
+        if ready not in done:
+            ready.cancel()
+            if self.webui_task.done() and self.webui_task.exception():
+                raise self.webui_task.exception()
+            raise RuntimeError("⌛ 启动超时，请检查防火墙设置")
+
+    def _on_webui_task_done(self, task: asyncio.Task):
+        if task is not self.webui_task:
+            return
+        if not task.cancelled() and task.exception():
+            self.logger.error(f"管理后台异常退出: {task.exception()}")
+        self.webui_task = None
+        self._webui_shutdown = None
+        self.change_feed.include_own = False
+
+    def _create_img_sync(self):
+        """按当前表情组创建图床同步客户端，未配置图床时返回 None"""
+        if self.config.get("image_host") != "stardots":
+            return None
+        stardots_config = self.config.get("image_host_config", {}).get("stardots", {})
+        if not (stardots_config.get("key") and stardots_config.get("secret")):
+            return None
+        from .image_host.img_sync import ImageSync
+
+        return ImageSync(
+            config={
+                "key": stardots_config["key"],
+                "secret": stardots_config["secret"],
+                "space": stardots_config.get("space", "memes")
+            },
+            local_dir=self.category_manager.memes_dir, # 使用当前组的目录
+            catalog=self.category_manager.catalog,
+            group=self.active_group,
+        )
+
+    def _create_file_watcher(self):
+        return DirectoryWatcher(
+            self.category_manager.reconciler,
+            self.config.get("file_watcher", {}),
+            on_change=self._on_files_changed,
+        )
+
+    async def _activate_group(self, group_name: str) -> float:
+        """
+        在运行中切换当前表情组
+
+        缓存中的组只做一次增量对账，随后一次性替换类别管理器并重新生成人格提示词，
+        进行中的表情发送状态保持不变。
+
+        Returns:
+            float: 切换用时（秒）
+        """
+        started = time.perf_counter()
+
+        def prepare():
+            manager = self.groups.get(group_name)
+            manager.sync_with_filesystem()
+            return manager
+
+        manager = await asyncio.to_thread(prepare)
+        old_sync = self.img_sync
+        await self.file_watcher.stop()
+
+        self.category_manager = manager
+        self.active_group = group_name
+        self.groups.pinned = {group_name}
+        self.img_sync = self._create_img_sync()
+        self.cold_tier.provider = self.img_sync.provider if self.img_sync else None
+        self.file_watcher = self._create_file_watcher()
+        self._watcher_task = None
+        self._reload_personas()
+
+        if self.webui_task:
+            # 进程内的 WebUI 直接使用新的类别管理器和图床客户端
+            from .webui import app as webui_app
+
+            webui_app.config["PLUGIN_CONFIG"].update(category_manager=manager, img_sync=self.img_sync)
+        if old_sync:
+            old_sync.stop_sync()
+        self._ensure_background_tasks()
+        await asyncio.to_thread(manager.catalog.set_setting, "active_group", group_name)
+        elapsed = time.perf_counter() - started
+        self.logger.info(f"已切换到表情组 {group_name}，用时 {elapsed * 1000:.1f}ms")
+        return elapsed
+
+    async def _follow_active_group(self):
+        """跟随 WebUI 中切换的表情组（WebUI 运行在独立进程，通过索引库共享当前组）"""
+        group_name = await asyncio.to_thread(self.category_manager.catalog.get_setting, "active_group")
+        if not group_name or group_name == self.active_group:
+            return
+        if group_name not in self.config.get("emotion_groups", {}):
+            return
+        self.config["active_emotion_group"] = group_name
+        await self._activate_group(group_name)
+
+    async def _on_catalog_changes(self, changes: list):
+        """应用其他进程（WebUI）写入索引的修改：只重新读取变化的类别，必要时重新生成提示词"""
+        follow = False
+        changed = {}  # 组 -> 变化的类别
+        # 多个机器人实例共用数据目录时，只跟随本实例启动的 WebUI 切换的表情组
+        if self.webui_task:
+            webui_pid = os.getpid()
+        else:
+            webui_pid = self.webui_process.pid if self.webui_process else None
+        for change in changes:
+            if change["kind"] == CHANGE_RESET:
+                # 部分记录已被清理：重新读取所有已加载表情组的描述，并检查当前表情组
+                for group in self.groups.groups():
+                    changed[group] = None
+                follow = webui_pid is not None
+            elif change["kind"] == CHANGE_SETTING and change["name"] == "active_group":
+                follow = follow or change["pid"] == webui_pid
+            elif change["kind"] == CHANGE_DESCRIPTION:
+                if changed.get(change["group_name"], set()) is not None:
+                    changed.setdefault(change["group_name"], set()).add(change["name"])
+            elif change["kind"] == CHANGE_GROUP_DELETED and change["group_name"] != self.active_group:
+                self.groups.discard(change["group_name"])
+
+        reload_personas = False
+        for group, categories in changed.items():
+            manager = self.groups.peek(group)
+            if manager is None:
+                # 未加载的组下次使用时会从索引读取
+                continue
+            reloaded = await asyncio.to_thread(
+                manager.reload_descriptions, None if categories is None else sorted(categories)
+            )
+            # 进程内的 WebUI 直接修改共用的类别管理器，快照已是最新，按提示词使用的快照是否过期判断
+            if group == self.active_group and (reloaded or self.category_mapping is not manager.get_descriptions()):
+                reload_personas = True
+        if reload_personas:
+            self._reload_personas()
+            categories = changed.get(self.active_group)
+            self.logger.info(
+                "已同步 WebUI 中修改的类别描述: " + ("全部类别" if categories is None else "、".join(sorted(categories)))
+            )
+        if follow:
+            await self._follow_active_group()
+
     async def _check_port_active(self):
         """验证端口是否实际已激活"""
         try:
@@ -291,6 +549,17 @@ class MemeSender(Star):
             await self._cleanup_resources()
         
     async def _shutdown(self):
+        if self.webui_task:
+            task = self.webui_task
+            self._webui_shutdown.set()
+            try:
+                # Hypercorn 的 graceful_timeout 为 5 秒
+                await asyncio.wait_for(asyncio.shield(task), timeout=10)
+            except asyncio.TimeoutError:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            except Exception as e:
+                self.logger.error(f"关闭管理后台时出错: {e}")
         if self.webui_process:
             self.webui_process.terminate()
             self.webui_process.join()
@@ -300,6 +569,8 @@ class MemeSender(Star):
             self.img_sync.stop_sync()
         self.server_key = None
         self.server_port = None
+        if self.webui_task:
+            await self._shutdown()
         if self.webui_process:
             if self.webui_process.is_alive():
                 self.webui_process.terminate()
@@ -307,27 +578,97 @@ class MemeSender(Star):
         self.webui_process = None
         self.logger.info("资源清理完成")
 
+    def _render_prompt_suffix(self, descriptions: dict) -> str:
+        """根据类别描述生成人格提示词后缀"""
+        return self.prompt_head + dict_to_string(descriptions) + self.prompt_tail_1 + str(self.max_emotions_per_message) + self.prompt_tail_2
+
     def _reload_personas(self):
         """重新注入人格"""
         self.category_mapping = self.category_manager.get_descriptions()
         self.category_mapping_string = dict_to_string(self.category_mapping)
-        self.sys_prompt_add = self.prompt_head + self.category_mapping_string + self.prompt_tail_1 + str(self.max_emotions_per_message) + self.prompt_tail_2
+        self.sys_prompt_add = self.groups.prompt_for(self.active_group)
         
         # 更新人格
         personas = self.context.provider_manager.personas
         for persona, persona_backup in zip(personas, self.persona_backup):
             persona["prompt"] =  persona_backup["prompt"] + self.sys_prompt_add
 
+    def _group_of(self, event: AstrMessageEvent) -> str:
+        """事件所在会话使用的表情组"""
+        group = self.chat_groups.get(event.unified_msg_origin)
+        if group and group in self.config.get("emotion_groups", {}):
+            return group
+        return self.active_group
+
+    async def _manager_for(self, group: str):
+        """获取表情组的类别管理器，首次使用的组在线程中加载索引"""
+        if group == self.active_group:
+            return self.category_manager
+        if group in self.groups:
+            return self.groups.get(group)
+        return await asyncio.to_thread(self.groups.get, group)
+
+    @filter.on_llm_request()
+    async def inject_group_prompt(self, event: AstrMessageEvent, req: ProviderRequest):
+        """会话绑定了其他表情组时，把请求中的表情提示词替换为该组的"""
+        group = self._group_of(event)
+        if group == self.active_group:
+            return
+        await self._manager_for(group)
+        suffix = await asyncio.to_thread(self.groups.prompt_for, group)
+        system_prompt = req.system_prompt or ""
+        if self.sys_prompt_add and self.sys_prompt_add in system_prompt:
+            system_prompt = system_prompt.replace(self.sys_prompt_add, suffix)
+        # 人格中可能已带有其他表情组的提示词，先去掉，保证请求中只有该会话所用组的一份
+        for known in {self.sys_prompt_add or "", *self.groups.rendered_prompts()} - {suffix, ""}:
+            system_prompt = system_prompt.replace(known, "")
+        if suffix not in system_prompt:
+            system_prompt += suffix
+        req.system_prompt = system_prompt
+
     @meme_manager.command("查看图库")
     async def list_emotions(self, event: AstrMessageEvent):
         """查看所有可用表情包类别"""
-        descriptions = self.category_mapping
+        descriptions = (await self._manager_for(self._group_of(event))).get_descriptions()
         categories = "\n".join([
             f"- {tag}: {desc}" 
             for tag, desc in descriptions.items()
         ])
         yield event.plain_result(f"🖼️ 当前图库：\n{categories}")
 
+    @meme_manager.command("搜索")
+    async def search_memes(self, event: AstrMessageEvent, query: str = None):
+        """按类别名、描述、文件名和标签搜索表情包，列出最匹配的结果并发送第一张表情"""
+        if not query:
+            yield event.plain_result("📌 用法：/表情管理 搜索 [关键词]")
+            return
+
+        group = self._group_of(event)
+        catalog = self.category_manager.catalog
+        # 查询也会等待索引锁（其他线程可能正在更新索引），与更新一起在线程中执行
+        result = await asyncio.to_thread(
+            lambda: get_search_index(group, catalog).search(query, SEARCH_COMMAND_RESULTS)
+        )
+        if not result["total"]:
+            yield event.plain_result(f"没有找到与「{query}」匹配的表情包。")
+            return
+
+        lines = []
+        for hit in result["results"]:
+            if hit["kind"] == "category":
+                lines.append(f"- 类别 {hit['category']}")
+            else:
+                lines.append(f"- {hit['category']}/{hit['filename']}")
+        more = f"（共 {result['total']} 个，显示前 {len(lines)} 个）" if result["total"] > len(lines) else ""
+        chain = [Plain(f"🔍「{query}」的搜索结果{more}：\n" + "\n".join(lines))]
+
+        top_file = next((hit for hit in result["results"] if hit["kind"] == "file"), None)
+        if top_file is not None:
+            path = os.path.join(MEMES_DIR, group, top_file["category"], top_file["filename"])
+            if await self._ensure_local(group, path):
+                chain.append(Image.fromFileSystem(path))
+        yield event.chain_result(chain)
+
     @filter.permission_type(filter.PermissionType.ADMIN)
     @meme_manager.command("添加表情")
     async def upload_meme(self, event: AstrMessageEvent, category: str = None):
@@ -353,9 +694,150 @@ class MemeSender(Star):
             f"请在30秒内发送要添加到【{category}】类别的图片（可发送多张图片）。"
         )
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @meme_manager.command("导入表情包")
+    async def import_meme_archive(self, event: AstrMessageEvent, category: str = None):
+        """从 zip/tar 压缩包批量导入表情包，文件夹名即类别名"""
+        user_key = f"{event.session_id}_{event.get_sender_id()}"
+        self.upload_states[user_key] = {
+            "mode": "archive",
+            "category": category,
+            "expire_time": time.time() + 120,
+        }
+        hint = f"，根目录下的图片将归入【{category}】" if category else ""
+        yield event.plain_result(
+            f"请在120秒内发送 zip/tar 压缩包，压缩包内的文件夹名会作为类别名{hint}。"
+        )
+
+    async def _handle_archive_upload(self, event: AstrMessageEvent, user_key: str, upload_state: dict):
+        """处理用户上传的表情包压缩包"""
+        files = [c for c in event.message_obj.message if isinstance(c, File)]
+        if not files:
+            yield event.plain_result("请发送 zip/tar 压缩包文件来进行导入哦。")
+            return
+
+        del self.upload_states[user_key]
+        yield event.plain_result("📦 已收到压缩包，正在导入...")
+
+        total = {"imported": 0, "duplicates": 0, "invalid": 0, "categories": set(), "paths": []}
+        for file in files:
+            archive_path, is_temp = None, False
+            try:
+                archive_path = await file.get_file() if hasattr(file, "get_file") else file.file
+                archive_path = archive_path or getattr(file, "url", "")
+                if not archive_path:
+                    raise ValueError("无法获取文件内容")
+                if archive_path.startswith(("http://", "https://")):
+                    archive_path, is_temp = await self._download_to_temp(archive_path), True
+
+                manager = self.category_manager
+                summary = await asyncio.to_thread(
+                    import_archive,
+                    archive_path,
+                    manager.memes_dir,
+                    upload_state.get("category"),
+                    catalog=manager.catalog,
+                    group=manager.active_group,
+                )
+                for key in ("imported", "duplicates", "invalid"):
+                    total[key] += summary[key]
+                total["categories"].update(summary["categories"])
+                total["paths"].extend(summary["paths"])
+                for error in summary["errors"][:3]:
+                    yield event.plain_result(f"⚠️ {error}")
+            except Exception as e:
+                self.logger.error(f"导入压缩包失败: {str(e)}")
+                yield event.plain_result(f"压缩包 {file.name} 导入失败: {str(e)}")
+            finally:
+                if is_temp and archive_path and os.path.exists(archive_path):
+                    os.remove(archive_path)
+
+        # 所有文件落盘后只同步一次配置
+        await self.reload_emotions()
+        self._reload_personas()
+        if total["paths"]:
+            asyncio.create_task(self._submit_to_ingest(total["paths"]))
+
+        yield event.plain_result(
+            f"✅ 导入完成：新增 {total['imported']} 张，跳过重复 {total['duplicates']} 张，"
+            f"无效 {total['invalid']} 张\n涉及类别：{'、'.join(sorted(total['categories'])) or '无'}"
+        )
+
+    async def _download_to_temp(self, url: str) -> str:
+        """流式下载文件到临时目录"""
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=TEMP_DIR, suffix=".archive")
+        import aiohttp
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(64 * 1024):
+                        f.write(chunk)
+        return temp_path
+
+    def _on_ingest_done(self, result: dict):
+        """规范化完成后更新索引（文件大小、格式可能变化，转为 WebP 时文件名也会变化；在线程中执行）"""
+        if result.get("original_path"):
+            self.category_manager.refresh_file(result["original_path"])
+        self.category_manager.refresh_file(result["path"])
+
+    def _ensure_background_tasks(self):
+        """在事件循环可用时启动目录监视和磁盘配额检查"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self.file_watcher.enabled and self._watcher_task is None:
+            self._watcher_task = loop.create_task(self.file_watcher.start())
+        if self.cold_tier.enabled and self._quota_task is None:
+            self._quota_task = loop.create_task(self._quota_loop())
+        if not self.change_feed.running:
+            self.change_feed.start()
+
+    async def _quota_loop(self):
+        """定期检查当前表情组的磁盘配额"""
+        interval = max(60, int(self.cold_tier.options.get("check_interval") or 600))
+        while True:
+            try:
+                await asyncio.to_thread(
+                    self.cold_tier.enforce, self.active_group, self.category_manager.memes_dir
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"磁盘配额检查失败: {e}")
+            await asyncio.sleep(interval)
+
+    async def _ensure_local(self, group: str, path: str) -> bool:
+        """确保选中的表情在本地，已移到图床的表情在此时下载回来（会话绑定的表情组不一定是当前组）"""
+        if os.path.exists(path):
+            return True
+        manager = await self._manager_for(group)
+        category, filename = os.path.split(os.path.relpath(path, manager.memes_dir))
+        return await asyncio.to_thread(self.cold_tier.fetch, group, category, filename, path)
+
+    async def _on_files_changed(self, events):
+        """目录监视发现变化后更新类别描述（在线程中写入索引），必要时刷新人格提示词"""
+        manager = self.category_manager
+        if await asyncio.to_thread(manager.apply_events, events):
+            # 提示词在线程中渲染好，人格只在事件循环上修改
+            await asyncio.to_thread(self.groups.prompt_for, self.active_group)
+            self._reload_personas()
+        self.logger.info(f"检测到 {len(events)} 个表情包文件变化，索引已更新")
+
+    async def _submit_to_ingest(self, paths):
+        """把批量导入的图片逐个交给入库处理池"""
+        for path in paths:
+            await self.ingest_pool.submit(path)
+
     @filter.event_message_type(EventMessageType.ALL)
     async def handle_upload_image(self, event: AstrMessageEvent, *args, **kwargs):
         """处理用户上传的图片"""
+        # 插件加载时事件循环可能尚未运行，收到第一条消息时补启动目录监视
+        self._ensure_background_tasks()
+
         user_key = f"{event.session_id}_{event.get_sender_id()}"
         upload_state = self.upload_states.get(user_key)
 
@@ -364,6 +846,11 @@ class MemeSender(Star):
                 del self.upload_states[user_key]
             return
 
+        if upload_state.get("mode") == "archive":
+            async for result in self._handle_archive_upload(event, user_key, upload_state):
+                yield result
+            return
+
         images = [c for c in event.message_obj.message if isinstance(c, Image)]
 
         if not images:
@@ -377,6 +864,9 @@ class MemeSender(Star):
             os.makedirs(save_dir, exist_ok=True)
             saved_files = []
 
+            import aiohttp
+            from PIL import Image as PILImage  # 与消息组件 Image 区分
+
             # 创建忽略 SSL 验证的上下文
             ssl_context = ssl.create_default_context()
             ssl_context.check_hostname = False
@@ -403,8 +893,8 @@ class MemeSender(Star):
                                 content = await resp.read()
 
                     try:
-                        with Image.open(io.BytesIO(content)) as img:
-                            file_type = img.format.lower()
+                        with PILImage.open(io.BytesIO(content)) as pil_img:
+                            file_type = pil_img.format.lower()
                     except Exception as e:
                         self.logger.error(f"图片格式检测失败: {str(e)}")
                         file_type = "unknown"
@@ -422,6 +912,8 @@ class MemeSender(Star):
                     with open(save_path, "wb") as f:
                         f.write(content)
                     saved_files.append(filename)
+                    # 文件名已回复给用户，处理时不改名
+                    await self.ingest_pool.submit(save_path, rename=False)
 
                 except Exception as e:
                     self.logger.error(f"下载图片失败: {str(e)}")
@@ -438,11 +930,25 @@ class MemeSender(Star):
         except Exception as e:
             yield event.plain_result(f"保存失败了：{str(e)}")
 
+    @meme_manager.command("入库状态")
+    async def ingest_status(self, event: AstrMessageEvent):
+        """查看图片规范化处理进度"""
+        status = self.ingest_pool.status()
+        if not status["enabled"]:
+            yield event.plain_result("图片规范化未开启，可在插件配置的 ingest 项中开启。")
+            return
+
+        yield event.plain_result(
+            f"📦 入库处理状态：\n"
+            f"排队中: {status['queued']}，处理中: {status['processing']}\n"
+            f"已完成: {status['done']}（已优化 {status['normalized']}，失败 {status['failed']}）\n"
+            f"共节省空间: {status['saved_bytes'] / 1024:.1f} KB"
+        )
+
     async def reload_emotions(self):
         """动态重新加载表情配置"""
         try:
-            self.category_manager.sync_with_filesystem()
-            
+            await asyncio.to_thread(self.category_manager.sync_with_filesystem)
         except Exception as e:
             self.logger.error(f"重新加载表情配置失败: {str(e)}")
 
@@ -453,21 +959,19 @@ class MemeSender(Star):
             self.logger.error(f"表情包根目录不存在，请检查: {self.category_manager.memes_dir}")
             return
 
+        catalog = self.category_manager.catalog
+        local_categories = set(catalog.get_directory_categories(self.active_group))
         for emotion in self.category_manager.get_descriptions().keys():
             emotion_path = os.path.join(self.category_manager.memes_dir, emotion)
-            if not os.path.exists(emotion_path):
+            if emotion not in local_categories:
                 self.logger.error(f"表情分类 {emotion} 对应的目录不存在，请查看: {emotion_path}")
                 continue
 
-            memes = [
-                f
-                for f in os.listdir(emotion_path)
-                if f.endswith((".jpg", ".png", ".gif"))
-            ]
-            if not memes:
+            count = catalog.count_files(self.active_group, emotion)
+            if not count:
                 self.logger.error(f"表情分类 {emotion} 对应的目录为空: {emotion_path}")
             else:
-                self.logger.info(f"表情分类 {emotion} 对应的目录 {emotion_path} 包含 {len(memes)} 个图片")
+                self.logger.info(f"表情分类 {emotion} 对应的目录 {emotion_path} 包含 {count} 个图片")
 
     @filter.on_llm_response(priority=99999)
     async def resp(self, event: AstrMessageEvent, response: LLMResponse):
@@ -477,8 +981,11 @@ class MemeSender(Star):
             return
 
         text = response.completion_text
-        self.found_emotions = []  # 重置表情列表
-        valid_emoticons = set(self.category_mapping.keys())  # 预加载合法表情集合
+        group = self._group_of(event)
+        manager = await self._manager_for(group)
+        found_emotions = []  # 本次回复中找到的表情
+        snapshot = manager.snapshot  # 本次处理只使用这一版本的类别描述
+        valid_emoticons = snapshot.tags
         
         clean_text = text
         
@@ -502,7 +1009,7 @@ class MemeSender(Star):
         for original, emotion in temp_replacements:
             clean_text = clean_text.replace(original, "", 1)  # 每次替换第一个匹配项
             if emotion:
-                self.found_emotions.append(emotion)
+                found_emotions.append(emotion)
         
         # 第二阶段：替代标记处理（如[emotion]、(emotion)等）
         if self.config.get("enable_alternative_markup", True):
@@ -523,7 +1030,7 @@ class MemeSender(Star):
                     
             for original, emotion in bracket_replacements:
                 clean_text = clean_text.replace(original, "", 1)
-                self.found_emotions.append(emotion)
+                found_emotions.append(emotion)
                 
             # 处理(emotion)格式
             paren_pattern = r'\(([^()]+)\)'
@@ -541,67 +1048,54 @@ class MemeSender(Star):
                 
             for original, emotion in paren_replacements:
                 clean_text = clean_text.replace(original, "", 1)
-                self.found_emotions.append(emotion)
+                found_emotions.append(emotion)
         
         # 第三阶段：处理重复表情模式（如angryangryangry）
         if self.config.get("enable_repeated_emotion_detection", True):
-            active_group_config = self.config.get("emotion_groups", {}).get(self.active_group, {})
+            active_group_config = self.config.get("emotion_groups", {}).get(group, {})
             high_confidence_emotions = active_group_config.get("high_confidence_emotions", [])
             
-            for emotion in valid_emoticons:
-                # 跳过太短的表情词，避免误判
-                if len(emotion) < 3:
+            for emotion in snapshot.tags:
+                # 高置信度表情重复两次即可识别（如 happyhappy），
+                # 普通表情需要重复至少3次且长度>=4，过短的表情词不参与，避免误判
+                repeat_pattern = snapshot.repeat_pattern(emotion, emotion in high_confidence_emotions)
+                if repeat_pattern is None:
                     continue
-                    
-                # 对高置信度表情，重复两次即可识别
-                if emotion in high_confidence_emotions:
-                    # 检测重复两次的模式，如 happyhappy
-                    repeat_pattern = f'({re.escape(emotion)})\\1{{1,}}'
-                    matches = re.finditer(repeat_pattern, clean_text)
-                    for match in matches:
-                        original = match.group(0)
-                        clean_text = clean_text.replace(original, "", 1)
-                        self.found_emotions.append(emotion)
-                else:
-                    # 普通表情词需要重复至少3次才识别
-                    # 只检查长度>=4的表情，以减少误判
-                    if len(emotion) >= 4:
-                        # 查找表情词重复3次以上的模式
-                        repeat_pattern = f'({re.escape(emotion)})\\1{{2,}}'
-                        matches = re.finditer(repeat_pattern, clean_text)
-                        for match in matches:
-                            original = match.group(0)
-                            clean_text = clean_text.replace(original, "", 1)
-                            self.found_emotions.append(emotion)
+                for match in repeat_pattern.finditer(clean_text):
+                    original = match.group(0)
+                    clean_text = clean_text.replace(original, "", 1)
+                    found_emotions.append(emotion)
         
         # 第四阶段：智能识别可能的表情（松散模式）
         if self.config.get("enable_loose_emotion_matching", True):
             # 查找所有可能的表情词
-            for emotion in valid_emoticons:
-                # 使用单词边界确保不是其他单词的一部分
-                pattern = r'\b(' + re.escape(emotion) + r')\b'
-                for match in re.finditer(pattern, clean_text):
+            # 使用单词边界确保不是其他单词的一部分（正则随快照预编译）
+            for emotion, pattern in snapshot.loose_patterns:
+                for match in pattern.finditer(clean_text):
                     word = match.group(1)
                     position = match.start()
                     
                     # 判断是否可能是表情而非英文单词
-                    if self._is_likely_emotion(word, clean_text, position, valid_emoticons):
+                    if self._is_likely_emotion(word, clean_text, position, valid_emoticons, group):
                         # 添加到表情列表
-                        self.found_emotions.append(word)
+                        found_emotions.append(word)
                         # 替换文本中的表情词
                         clean_text = clean_text[:position] + clean_text[position + len(word):]
         
         # 去重并应用数量限制
         seen = set()
         filtered_emotions = []
-        for emo in self.found_emotions:
+        for emo in found_emotions:
             if emo not in seen:
                 seen.add(emo)
                 filtered_emotions.append(emo)
             if len(filtered_emotions) >= self.max_emotions_per_message:
                 break
                     
-        self.found_emotions = filtered_emotions
+        if filtered_emotions:
+            self.pending_emotions[event.unified_msg_origin] = (group, filtered_emotions)
+        else:
+            self.pending_emotions.pop(event.unified_msg_origin, None)
 
         # 防御性清理残留符号
         clean_text = re.sub(r'&&+', '', clean_text)  # 清除未成对的&&符号
@@ -636,7 +1130,7 @@ class MemeSender(Star):
         # 默认情况下认为可能是表情
         return True
 
-    def _is_likely_emotion(self, word, text, position, valid_emotions):
+    def _is_likely_emotion(self, word, text, position, valid_emotions, group=None):
         """判断一个单词是否可能是表情而非普通英文单词"""
         
         # 先获取上下文
@@ -669,7 +1163,7 @@ class MemeSender(Star):
             return True
         
         # 规则5：如果是已知的表情占比很高(>=70%)的单词，即使在英文上下文中也可能是表情
-        active_group_config = self.config.get("emotion_groups", {}).get(self.active_group, {})
+        active_group_config = self.config.get("emotion_groups", {}).get(group or self.active_group, {})
         high_confidence_emotions = active_group_config.get("high_confidence_emotions", [])
         if word in high_confidence_emotions:
             return True
@@ -679,7 +1173,7 @@ class MemeSender(Star):
     @filter.on_decorating_result()
     async def on_decorating_result(self, event: AstrMessageEvent):
         """在消息发送前处理文本部分"""
-        if not self.found_emotions:
+        if event.unified_msg_origin not in self.pending_emotions:
             return
 
         result = event.get_result()
@@ -720,30 +1214,24 @@ class MemeSender(Star):
     @filter.after_message_sent()
     async def after_message_sent(self, event: AstrMessageEvent):
         """消息发送后处理图片部分"""
-        if not self.found_emotions:
+        pending = self.pending_emotions.pop(event.unified_msg_origin, None)
+        if not pending:
             return
 
         try:
-            for emotion in self.found_emotions:
+            group, emotions = pending
+            manager = await self._manager_for(group)
+            for emotion in emotions:
                 if not emotion:
                     continue
 
-                emotion_path = os.path.join(self.category_manager.memes_dir, emotion)
-                if not os.path.exists(emotion_path):
+                meme_file = await asyncio.to_thread(manager.pick_random_file, emotion)
+                if not meme_file:
                     continue
-
-                memes = [
-                    f
-                    for f in os.listdir(emotion_path)
-                    if f.endswith((".jpg", ".png", ".gif"))
-                ]
-                if not memes:
-                    continue
-
-                meme = random.choice(memes)
-                meme_file = os.path.join(emotion_path, meme)
                 
                 if random.randint(0, 100) <= self.emotions_probability:
+                    if not await self._ensure_local(group, meme_file):
+                        continue
                     if event.get_platform_name() == "gewechat":
                         await event.send(MessageChain([Image.fromFileSystem(meme_file)]))
                     else:
@@ -751,15 +1239,13 @@ class MemeSender(Star):
                             event.unified_msg_origin,
                             MessageChain([Image.fromFileSystem(meme_file)]),
                         )
-            self.found_emotions = []
+                    await asyncio.to_thread(manager.record_usage, meme_file)
 
         except Exception as e:
             self.logger.error(f"发送表情图片失败: {str(e)}")
             import traceback
 
             self.logger.error(traceback.format_exc())
-        finally:
-            self.found_emotions = []
 
     @meme_manager.command("同步状态")
     async def check_sync_status(self, event: AstrMessageEvent):
@@ -846,6 +1332,16 @@ class MemeSender(Star):
         # 停止图床同步
         if self.img_sync:
             self.img_sync.stop_sync()
+
+        # 停止入库处理池、目录监视和配额检查
+        await self.ingest_pool.stop()
+        await self.file_watcher.stop()
+        await self.change_feed.stop()
+        if self._quota_task:
+            self._quota_task.cancel()
+
+        # 写入尚未落盘的类别描述
+        self.groups.flush_all()
         
         await self._shutdown()
         await self._cleanup_resources()
@@ -1,10 +1,57 @@
 document.addEventListener("DOMContentLoaded", () => {
+  // 当前表情组（图库缩略图地址中使用）
+  let activeGroup = "default";
+  // 图库方块为 150px，按设备像素比请求缩略图宽度
+  const thumbWidth = Math.round(150 * Math.min(window.devicePixelRatio || 1, 2));
+
+  // 分页加载：每个类别先只渲染一页，滚动到类别末尾附近时再加载下一页
+  const PAGE_SIZE = 120;
+  // 排序方式及对应的顺序（名称升序，其余按最新/最大/最常用在前）
+  const SORT_ORDERS = { name: "asc", mtime: "desc", size: "desc", usage: "desc" };
+  let sortKey = "name";
+  // 当前列表对应的索引变更版本，用于 /api/changes 增量刷新
+  let listingVersion = 0;
+  // 类别 -> { grid, uploadBlock, countEl, cursor, done, loading }
+  let categoryPages = {};
+  let refreshing = false;
+  // 批量操作中选中的表情包："类别/文件名" -> { category, filename }
+  const selectedItems = new Map();
+
+  // 图片进入可视区域时才加载缩略图
+  const thumbObserver = new IntersectionObserver(
+    (entries, observer) => {
+      entries.forEach((entry) => {
+        if (entry.isIntersecting) {
+          const emojiItem = entry.target;
+          const bgUrl = emojiItem.getAttribute("data-bg");
+          emojiItem.style.backgroundImage = `url('${bgUrl}')`; // 加载背景图片
+          emojiItem.removeAttribute("data-bg"); // 移除临时属性
+          observer.unobserve(emojiItem); // 停止观察
+        }
+      });
+    },
+    { threshold: 0.1 }
+  );
+
+  // 类别末尾（上传块）接近可视区域时加载下一页
+  const pageObserver = new IntersectionObserver(
+    (entries) => {
+      entries.forEach((entry) => {
+        if (entry.isIntersecting) {
+          loadNextPage(entry.target.dataset.category);
+        }
+      });
+    },
+    { rootMargin: "800px 0px" }
+  );
+
   // 获取表情组
   async function fetchGroups() {
     try {
       const response = await fetch("/api/groups");
       if (!response.ok) throw new Error("获取表情组失败");
       const data = await response.json();
+      activeGroup = data.active_group || activeGroup;
       const groupSelect = document.getElementById("group-select");
       groupSelect.innerHTML = "";
       data.groups.forEach((group) => {
@@ -21,11 +68,11 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
-  // 获取表情包数据和描述
+  // 获取类别列表和描述，表情包按类别分页加载
   async function fetchEmojis() {
     try {
-      const [emojiResponse, tagDescriptions] = await Promise.all([
-        fetch("/api/emoji").then((res) => {
+      const [listing, tagDescriptions] = await Promise.all([
+        fetch("/api/categories").then((res) => {
           if (!res.ok) throw new Error("获取表情包数据失败");
           return res.json();
         }),
@@ -34,19 +81,154 @@ document.addEventListener("DOMContentLoaded", () => {
           return res.json();
         }),
       ]);
-      displayCategories(emojiResponse, tagDescriptions);
-      updateSidebar(emojiResponse, tagDescriptions);
+      listingVersion = listing.version;
+      displayCategories(listing.categories, tagDescriptions);
+      updateSidebar(listing.categories);
     } catch (error) {
       console.error("加载表情包数据失败", error);
     }
   }
 
-  // 根据数据生成 DOM 节点，展示每个分类及其表情包，并添加上传块
-  function displayCategories(emojiData, tagDescriptions) {
+  // 创建单个表情包方块
+  function createEmojiItem(category, item) {
+    const emojiItem = document.createElement("div");
+    emojiItem.className = "emoji-item";
+    emojiItem.dataset.filename = item.filename;
+    emojiItem.style.width = "150px";
+    emojiItem.style.height = "150px";
+    emojiItem.style.backgroundSize = "contain";
+    emojiItem.style.backgroundPosition = "center";
+    emojiItem.style.backgroundRepeat = "no-repeat";
+    emojiItem.style.cursor = "pointer";
+    emojiItem.style.border = "1px solid #ddd";
+    emojiItem.style.borderRadius = "4px";
+    emojiItem.style.flexShrink = "0";
+    emojiItem.style.position = "relative";
+
+    // 删除按钮
+    const deleteBtn = document.createElement("button");
+    deleteBtn.className = "delete-btn";
+    deleteBtn.innerHTML = "×";
+    deleteBtn.onclick = (e) => {
+      e.stopPropagation();
+      deleteEmoji(category, item.filename);
+    };
+    emojiItem.appendChild(deleteBtn);
+    if (item.tags && item.tags.length > 0) emojiItem.title = item.tags.join(" ");
+
+    // 点击选中/取消选中，用于批量操作
+    const key = `${category}/${item.filename}`;
+    if (selectedItems.has(key)) emojiItem.classList.add("selected");
+    emojiItem.onclick = () => {
+      if (selectedItems.has(key)) {
+        selectedItems.delete(key);
+        emojiItem.classList.remove("selected");
+      } else {
+        selectedItems.set(key, { category, filename: item.filename });
+        emojiItem.classList.add("selected");
+      }
+      updateBatchActions();
+    };
+
+    // 使用 data-bg 存储缩略图URL
+    // 地址带上内容版本号，文件不变时浏览器直接使用缓存
+    const path = [activeGroup, category, item.filename].map(encodeURIComponent).join("/");
+    const query = item.version ? `w=${thumbWidth}&v=${item.version}` : `w=${thumbWidth}`;
+    emojiItem.setAttribute("data-bg", `/thumb/${path}?${query}`);
+    thumbObserver.observe(emojiItem);
+    return emojiItem;
+  }
+
+  // 加载类别的下一页表情包
+  async function loadNextPage(category) {
+    const state = categoryPages[category];
+    if (!state || state.done || state.loading) return;
+    state.loading = true;
+    try {
+      const params = new URLSearchParams({
+        sort: sortKey,
+        order: SORT_ORDERS[sortKey],
+        limit: PAGE_SIZE,
+      });
+      if (state.cursor) params.set("cursor", state.cursor);
+      const response = await fetch(`/api/category/${encodeURIComponent(category)}/files?${params}`);
+      if (!response.ok) throw new Error("获取表情包数据失败");
+      const page = await response.json();
+      // 重新加载列表后旧的请求结果直接丢弃
+      if (categoryPages[category] !== state) return;
+      const fragment = document.createDocumentFragment();
+      page.items.forEach((item) => fragment.appendChild(createEmojiItem(category, item)));
+      state.grid.insertBefore(fragment, state.uploadBlock);
+      state.cursor = page.next_cursor;
+      state.done = !page.next_cursor;
+    } catch (error) {
+      console.error(`加载类别 ${category} 失败`, error);
+      state.done = true;
+    } finally {
+      state.loading = false;
+    }
+    // 一页不足以填满可视区域时继续加载（观察器只在进出可视区域时触发）
+    const rect = state.uploadBlock.getBoundingClientRect();
+    if (!state.done && rect.top < window.innerHeight + 800) {
+      loadNextPage(category);
+    }
+  }
+
+  function setCategoryCount(category, count) {
+    const state = categoryPages[category];
+    if (state) state.countEl.textContent = `(${count})`;
+    const link = document.querySelector(`#sidebar-list a[data-category="${CSS.escape(category)}"]`);
+    if (link) link.textContent = `${category} (${count})`;
+  }
+
+  // 按索引变更日志增量刷新已加载的表情包，不重新加载整个列表
+  async function refreshChanges() {
+    if (refreshing) return;
+    refreshing = true;
+    try {
+      const response = await fetch(`/api/changes?since=${listingVersion}`);
+      if (!response.ok) return;
+      const data = await response.json();
+      // 类别增删或改名、变更日志已被清理时整体重新加载
+      if (data.reset || data.categories.length > 0) {
+        await fetchEmojis();
+        return;
+      }
+      listingVersion = data.version;
+      data.files.forEach((item) => {
+        const state = categoryPages[item.category];
+        if (!state) return;
+        const existing = state.grid.querySelector(
+          `.emoji-item[data-filename="${CSS.escape(item.filename)}"]`
+        );
+        if (item.deleted) {
+          if (existing) existing.remove();
+          selectedItems.delete(`${item.category}/${item.filename}`);
+        } else if (existing) {
+          state.grid.replaceChild(createEmojiItem(item.category, item), existing);
+        } else if (state.done) {
+          // 尚未加载完的类别，新文件在翻到对应位置时自然出现
+          state.grid.insertBefore(createEmojiItem(item.category, item), state.uploadBlock);
+        }
+      });
+      Object.entries(data.counts).forEach(([category, count]) => setCategoryCount(category, count));
+    } catch (error) {
+      console.error("刷新表情包变化失败", error);
+    } finally {
+      refreshing = false;
+    }
+  }
+
+  // 根据数据生成 DOM 节点，展示每个分类，表情包在滚动到对应位置时分页加载，并添加上传块
+  function displayCategories(categories, tagDescriptions) {
     const container = document.getElementById("emoji-categories");
     container.innerHTML = "";
+    pageObserver.disconnect();
+    categoryPages = {};
+    selectedItems.clear();
+    updateBatchActions();
 
-    Object.entries(emojiData).forEach(([category, emojis]) => {
+    categories.forEach(({ name: category, count }) => {
       const categoryDiv = document.createElement("div");
       categoryDiv.className = "category";
       categoryDiv.id = `category-${category}`;
@@ -57,6 +239,7 @@ document.addEventListener("DOMContentLoaded", () => {
       titleDiv.innerHTML = `
             <div class="category-header">
                 <div class="category-name" id="category-name-${category}">${category}</div>
+                <span class="category-count">(${count})</span>
                 <div class="category-actions">
                     <button class="edit-category-btn" onclick="editCategory('${category}')">编辑类别</button>
                     <button class="delete-category-btn" data-category="${category}">删除类别</button>
@@ -85,41 +268,10 @@ document.addEventListener("DOMContentLoaded", () => {
       emojiGrid.style.gap = "10px";
       emojiGrid.style.padding = "10px";
 
-      // emojis 是数组
-      if (Array.isArray(emojis)) {
-        emojis.forEach((emoji) => {
-          const emojiItem = document.createElement("div");
-          emojiItem.className = "emoji-item";
-          emojiItem.style.width = "150px";
-          emojiItem.style.height = "150px";
-          emojiItem.style.backgroundSize = "contain";
-          emojiItem.style.backgroundPosition = "center";
-          emojiItem.style.backgroundRepeat = "no-repeat";
-          emojiItem.style.cursor = "pointer";
-          emojiItem.style.border = "1px solid #ddd";
-          emojiItem.style.borderRadius = "4px";
-          emojiItem.style.flexShrink = "0";
-          emojiItem.style.position = "relative";
-
-          // 删除按钮
-          const deleteBtn = document.createElement("button");
-          deleteBtn.className = "delete-btn";
-          deleteBtn.innerHTML = "×";
-          deleteBtn.onclick = (e) => {
-            e.stopPropagation();
-            deleteEmoji(category, emoji);
-          };
-          emojiItem.appendChild(deleteBtn);
-
-          // 使用 data-bg 存储图片URL
-          emojiItem.setAttribute("data-bg", `/memes/${category}/${emoji}`);
-          emojiGrid.appendChild(emojiItem);
-        });
-      }
-
       // 添加上传块
       const uploadBlock = document.createElement("div");
       uploadBlock.className = "emoji-upload";
+      uploadBlock.dataset.category = category;
       uploadBlock.style.width = "150px";
       uploadBlock.style.height = "150px";
       uploadBlock.style.border = "2px dashed #ccc";
@@ -152,9 +304,7 @@ document.addEventListener("DOMContentLoaded", () => {
       fileInput.addEventListener("change", (event) => {
         const files = event.target.files;
         if (files && files.length > 0) {
-          Array.from(files).forEach((file) => {
-            uploadEmoji(category, file);
-          });
+          uploadEmojis(category, Array.from(files));
         }
         // 清空文件输入框，以便可以再次选择相同的文件
         fileInput.value = "";
@@ -174,13 +324,11 @@ document.addEventListener("DOMContentLoaded", () => {
       uploadBlock.addEventListener("drop", (e) => {
         e.preventDefault();
         uploadBlock.style.backgroundColor = "#f9f9f9";
-        const files = e.dataTransfer.files;
-        if (files && files.length > 0) {
-          Array.from(files).forEach((file) => {
-            if (file.type.startsWith("image/")) {
-              uploadEmoji(category, file);
-            }
-          });
+        const files = Array.from(e.dataTransfer.files || []).filter((file) =>
+          file.type.startsWith("image/")
+        );
+        if (files.length > 0) {
+          uploadEmojis(category, files);
         }
       });
 
@@ -190,27 +338,16 @@ document.addEventListener("DOMContentLoaded", () => {
 
       categoryDiv.appendChild(emojiGrid);
       container.appendChild(categoryDiv);
-    });
-
-    // 懒加载背景图片
-    const lazyBackgrounds = document.querySelectorAll(".emoji-item");
-    const observer = new IntersectionObserver(
-      (entries, observer) => {
-        entries.forEach((entry) => {
-          if (entry.isIntersecting) {
-            const emojiItem = entry.target;
-            const bgUrl = emojiItem.getAttribute("data-bg");
-            emojiItem.style.backgroundImage = `url('${bgUrl}')`; // 加载背景图片
-            emojiItem.removeAttribute("data-bg"); // 移除临时属性
-            observer.unobserve(emojiItem); // 停止观察
-          }
-        });
-      },
-      { threshold: 0.1 }
-    );
 
-    lazyBackgrounds.forEach((item) => {
-      observer.observe(item);
+      categoryPages[category] = {
+        grid: emojiGrid,
+        uploadBlock,
+        countEl: titleDiv.querySelector(".category-count"),
+        cursor: null,
+        done: count === 0,
+        loading: false,
+      };
+      pageObserver.observe(uploadBlock);
     });
 
     // 编辑描述的事件监听器
@@ -218,26 +355,27 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   // 更新侧边栏目录
-  function updateSidebar(data, tagDescriptions) {
+  function updateSidebar(categories) {
     const sidebarList = document.getElementById("sidebar-list");
     if (!sidebarList) return;
     sidebarList.innerHTML = "";
 
-    for (const category in data) {
+    categories.forEach(({ name: category, count }) => {
       const li = document.createElement("li");
       const a = document.createElement("a");
       a.href = "#category-" + category;
-      a.textContent = category;
+      a.dataset.category = category;
+      a.textContent = `${category} (${count})`;
       li.appendChild(a);
       sidebarList.appendChild(li);
-    }
+    });
   }
 
-  // 上传表情包
-  async function uploadEmoji(category, file) {
+  // 上传表情包，选中的多个文件在同一个请求中上传
+  async function uploadEmojis(category, files) {
     const formData = new FormData();
     formData.append("category", category);
-    formData.append("image_file", file);
+    files.forEach((file) => formData.append("image_file", file));
 
     try {
       const response = await fetch("/api/emoji/add", {
@@ -283,12 +421,21 @@ document.addEventListener("DOMContentLoaded", () => {
       // 正常响应处理
       try {
         const data = await response.json();
-        fetchEmojis(); // 刷新表情包列表
-        alert(`添加表情包成功: ${data.filename} 到类别 ${data.category}`);
+        refreshChanges(); // 增量刷新表情包列表
+        const failed = (data.files || []).filter((item) => item.error);
+        if (files.length === 1) {
+          alert(`添加表情包成功: ${data.filename} 到类别 ${data.category}`);
+        } else {
+          const lines = failed.map((item) => `${item.filename}: ${item.error}`);
+          alert(
+            `已添加 ${files.length - failed.length}/${files.length} 个表情包到类别 ${data.category}` +
+              (lines.length ? `\n失败:\n${lines.join("\n")}` : "")
+          );
+        }
       } catch (jsonError) {
         console.error("解析成功响应失败", jsonError);
         alert("表情包可能已上传，但无法解析服务器响应");
-        fetchEmojis(); // 刷新表情包列表以确认
+        refreshChanges(); // 刷新表情包列表以确认
       }
     } catch (error) {
       console.error("添加表情包失败", error);
@@ -312,13 +459,186 @@ document.addEventListener("DOMContentLoaded", () => {
         alert(data.message);
         return;
       }
-      fetchEmojis(); // 刷新表情包列表
+      refreshChanges(); // 增量刷新表情包列表
       alert(`删除表情包成功: ${data.filename} 从类别 ${data.category}`);
     } catch (error) {
       console.error("删除表情包失败", error);
     }
   }
 
+  // 显示/隐藏批量操作栏，并刷新可移动到的类别
+  function updateBatchActions() {
+    const bar = document.getElementById("batch-actions");
+    if (!bar) return;
+    bar.style.display = selectedItems.size > 0 ? "flex" : "none";
+    document.getElementById("batch-count").textContent = `已选择 ${selectedItems.size} 个`;
+    const target = document.getElementById("batch-move-target");
+    const categories = Object.keys(categoryPages);
+    if (target.options.length !== categories.length) {
+      const current = target.value;
+      target.innerHTML = "";
+      categories.forEach((category) => target.add(new Option(category, category)));
+      if (categories.includes(current)) target.value = current;
+    }
+  }
+
+  // 一次请求提交所有选中项的操作，返回失败的项
+  async function runBatch(operations) {
+    const response = await fetch("/api/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ operations }),
+    });
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.message);
+    return data.results.filter((r) => !r.ok).map((r) => ({ ...operations[r.index], error: r.error }));
+  }
+
+  async function batchOperate(buildOperation, confirmText) {
+    const items = [...selectedItems.values()];
+    if (items.length === 0 || !confirm(confirmText(items.length))) return;
+    try {
+      const failed = await runBatch(items.map(buildOperation));
+      selectedItems.clear();
+      updateBatchActions();
+      await refreshChanges(); // 增量刷新表情包列表
+      if (failed.length > 0) {
+        alert(`${failed.length} 项操作失败:\n` + failed.map((f) => `${f.category}/${f.filename}: ${f.error}`).join("\n"));
+      }
+    } catch (error) {
+      console.error("批量操作失败", error);
+      alert(`批量操作失败: ${error.message}`);
+    }
+  }
+
+  document.getElementById("batch-delete-btn")?.addEventListener("click", () =>
+    batchOperate(
+      ({ category, filename }) => ({ op: "delete", category, filename }),
+      (count) => `确定删除选中的 ${count} 个表情包吗？此操作不可恢复！`
+    )
+  );
+
+  document.getElementById("batch-move-btn")?.addEventListener("click", () => {
+    const target = document.getElementById("batch-move-target").value;
+    if (!target) return;
+    batchOperate(
+      ({ category, filename }) => ({ op: "move", category, filename, to_category: target }),
+      (count) => `确定把选中的 ${count} 个表情包移动到 "${target}" 吗？`
+    );
+  });
+
+  document.getElementById("batch-clear-btn")?.addEventListener("click", () => {
+    selectedItems.clear();
+    document.querySelectorAll(".emoji-item.selected").forEach((el) => el.classList.remove("selected"));
+    updateBatchActions();
+  });
+
+  // 搜索：输入停顿后查询，结果分页显示在图库上方
+  const SEARCH_PAGE_SIZE = 40;
+  const searchInput = document.getElementById("search-input");
+  const searchResults = document.getElementById("search-results");
+  let searchTimer = null;
+  // 每次查询递增，较慢返回的旧查询结果直接丢弃
+  let searchSeq = 0;
+
+  async function runSearch(query, offset = 0) {
+    const seq = ++searchSeq;
+    if (!query) {
+      searchResults.style.display = "none";
+      searchResults.innerHTML = "";
+      return;
+    }
+    try {
+      const params = new URLSearchParams({ q: query, limit: SEARCH_PAGE_SIZE, offset });
+      const response = await fetch(`/api/search?${params}`);
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.message);
+      if (seq !== searchSeq) return;
+      renderSearchResults(query, data, offset);
+    } catch (error) {
+      console.error("搜索失败", error);
+      if (seq === searchSeq) {
+        searchResults.style.display = "block";
+        searchResults.textContent = `搜索失败: ${error.message}`;
+      }
+    }
+  }
+
+  function renderSearchResults(query, data, offset) {
+    if (offset === 0) {
+      searchResults.innerHTML = "";
+      const summary = document.createElement("div");
+      summary.className = "search-summary";
+      searchResults.appendChild(summary);
+      const grid = document.createElement("div");
+      grid.className = "search-grid";
+      searchResults.appendChild(grid);
+    }
+    searchResults.style.display = "block";
+    searchResults.querySelector(".search-summary").textContent =
+      data.total > 0 ? `找到 ${data.total} 个结果` : "没有找到匹配的类别或表情包";
+    const grid = searchResults.querySelector(".search-grid");
+    searchResults.querySelector(".search-more")?.remove();
+
+    data.results.forEach((hit) => {
+      if (hit.kind === "category") {
+        const link = document.createElement("a");
+        link.className = "search-category";
+        link.href = `#category-${hit.category}`;
+        link.textContent = hit.category;
+        if (hit.description) link.title = hit.description;
+        grid.appendChild(link);
+        return;
+      }
+      const wrapper = document.createElement("div");
+      wrapper.className = "search-file";
+      wrapper.appendChild(createEmojiItem(hit.category, hit));
+      const caption = document.createElement("div");
+      caption.className = "search-caption";
+      caption.textContent = `${hit.category} / ${hit.filename}`;
+      const tagsBtn = document.createElement("button");
+      tagsBtn.className = "search-tags-btn";
+      tagsBtn.textContent = hit.tags && hit.tags.length > 0 ? `标签: ${hit.tags.join(" ")}` : "添加标签";
+      tagsBtn.onclick = () => editTags(hit, tagsBtn);
+      wrapper.appendChild(caption);
+      wrapper.appendChild(tagsBtn);
+      grid.appendChild(wrapper);
+    });
+
+    if (data.next_offset !== null) {
+      const more = document.createElement("button");
+      more.className = "search-more";
+      more.textContent = "加载更多";
+      more.onclick = () => runSearch(query, data.next_offset);
+      searchResults.appendChild(more);
+    }
+  }
+
+  // 编辑表情包的标签（以空格分隔）
+  async function editTags(hit, button) {
+    const value = prompt(`${hit.category}/${hit.filename} 的标签（以空格分隔）`, (hit.tags || []).join(" "));
+    if (value === null) return;
+    try {
+      const response = await fetch("/api/emoji/tags", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ category: hit.category, filename: hit.filename, tags: value }),
+      });
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.message);
+      hit.tags = data.tags;
+      button.textContent = data.tags.length > 0 ? `标签: ${data.tags.join(" ")}` : "添加标签";
+    } catch (error) {
+      console.error("设置标签失败", error);
+      alert(`设置标签失败: ${error.message}`);
+    }
+  }
+
+  searchInput?.addEventListener("input", () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => runSearch(searchInput.value.trim()), 200);
+  });
+
   // 删除表情包类别
   async function deleteCategory(category) {
     if (
@@ -398,6 +718,49 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     });
 
+  // 导入压缩包，压缩包内的文件夹名即类别名
+  async function importArchive(file) {
+    const btn = document.getElementById("import-archive-btn");
+    const formData = new FormData();
+    formData.append("archive_file", file);
+
+    btn.disabled = true;
+    btn.textContent = "导入中...";
+    try {
+      const response = await fetch("/api/emoji/import", {
+        method: "POST",
+        body: formData,
+      });
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.message);
+
+      await fetchEmojis();
+      let message = `导入完成：新增 ${data.imported} 张，跳过重复 ${data.duplicates} 张，无效 ${data.invalid} 张`;
+      if (data.errors && data.errors.length > 0) {
+        message += `\n${data.errors.slice(0, 3).join("\n")}`;
+      }
+      alert(message);
+    } catch (error) {
+      console.error("导入压缩包失败:", error);
+      alert("导入压缩包失败: " + error.message);
+    } finally {
+      btn.disabled = false;
+      btn.innerHTML = '<i class="fas fa-file-zipper icon"></i>导入压缩包';
+    }
+  }
+
+  const archiveInput = document.getElementById("import-archive-input");
+  document
+    .getElementById("import-archive-btn")
+    .addEventListener("click", () => archiveInput.click());
+  archiveInput.addEventListener("change", (event) => {
+    const file = event.target.files[0];
+    if (file) {
+      importArchive(file);
+    }
+    archiveInput.value = "";
+  });
+
   // 编辑描述的处理函数
   function setupEditDescriptionHandlers() {
     const editButtons = document.querySelectorAll(".edit-description-btn");
@@ -524,6 +887,81 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  // 显示图床同步进度
+  function renderSyncProgress(progress) {
+    const el = document.getElementById("img-sync-progress");
+    if (!el || !progress) return;
+    const stages = {
+      starting: "准备中",
+      scanning: "扫描文件",
+      upload: "上传中",
+      download: "下载中",
+      delete: "删除中",
+      finished: "已结束",
+    };
+    const mb = (bytes) => (bytes / 1024 / 1024).toFixed(1);
+    let text = stages[progress.stage] || progress.stage || "";
+    if (progress.total) {
+      text += ` ${progress.done}/${progress.total}`;
+      if (progress.failed) text += `（失败 ${progress.failed}）`;
+    }
+    if (progress.bytes) text += ` · ${mb(progress.bytes)}MB`;
+    if (progress.throughput && !progress.completed) text += ` · ${mb(progress.throughput)}MB/s`;
+    if (progress.current) text += ` · ${progress.current}`;
+    if (progress.message) text += ` · ${progress.message}`;
+    el.textContent = text;
+    el.style.display = "block";
+    const bar = progress.total ? ((progress.done + progress.failed) / progress.total) * 100 : 0;
+    el.style.setProperty("--progress", `${progress.completed ? 100 : bar}%`);
+  }
+
+  function syncErrorMessage(progress) {
+    const errors = (progress && progress.errors) || [];
+    return errors.length > 0 ? `同步失败: ${errors[errors.length - 1].error}` : "同步失败";
+  }
+
+  // 等待图床同步结束：优先通过事件流接收进度推送，不支持或连接失败时退回轮询 check_process
+  function waitForImgSync() {
+    return new Promise((resolve, reject) => {
+      const poll = async () => {
+        try {
+          while (true) {
+            const statusResponse = await fetch("/api/img_host/sync/check_process");
+            if (!statusResponse.ok) throw new Error("检查同步状态失败");
+            const status = await statusResponse.json();
+            renderSyncProgress(status.progress);
+            if (status.completed) {
+              resolve({ success: status.success, progress: status.progress });
+              return;
+            }
+            await new Promise((r) => setTimeout(r, 1000));
+          }
+        } catch (error) {
+          reject(error);
+        }
+      };
+
+      if (!window.EventSource) {
+        poll();
+        return;
+      }
+      const source = new EventSource("/api/img_host/sync/events");
+      source.addEventListener("progress", (event) => {
+        const progress = JSON.parse(event.data);
+        renderSyncProgress(progress);
+        if (progress.completed) {
+          source.close();
+          resolve({ success: progress.success, progress });
+        }
+      });
+      source.onerror = () => {
+        // 连接失败（如被代理缓冲或断开）时改用轮询，不依赖浏览器的自动重连
+        source.close();
+        poll();
+      };
+    });
+  }
+
   async function syncToRemote() {
     try {
       const btn = document.getElementById("upload-sync-btn");
@@ -535,25 +973,11 @@ document.addEventListener("DOMContentLoaded", () => {
       });
       if (!response.ok) throw new Error("同步到云端失败");
 
-      // 开始轮询检查进度
-      while (true) {
-        const statusResponse = await fetch("/api/img_host/sync/check_process");
-        if (!statusResponse.ok) throw new Error("检查同步状态失败");
-        const status = await statusResponse.json();
-
-        if (status.completed) {
-          if (status.success) {
-            alert("同步到云端完成！");
-            await checkSyncStatus(); // 刷新同步状态
-          } else {
-            throw new Error("同步失败");
-          }
-          break;
-        }
-
-        // 等待1秒后再次检查
-        await new Promise((resolve) => setTimeout(resolve, 1000));
-      }
+      // 等待同步结束，期间显示推送的进度
+      const result = await waitForImgSync();
+      if (!result.success) throw new Error(syncErrorMessage(result.progress));
+      alert("同步到云端完成！");
+      await checkSyncStatus(); // 刷新同步状态
     } catch (error) {
       console.error("同步到云端失败:", error);
       alert("同步到云端失败: " + error.message);
@@ -575,26 +999,12 @@ document.addEventListener("DOMContentLoaded", () => {
       });
       if (!response.ok) throw new Error("从云端同步失败");
 
-      // 开始轮询检查进度
-      while (true) {
-        const statusResponse = await fetch("/api/img_host/sync/check_process");
-        if (!statusResponse.ok) throw new Error("检查同步状态失败");
-        const status = await statusResponse.json();
-
-        if (status.completed) {
-          if (status.success) {
-            alert("从云端同步完成！");
-            await checkSyncStatus(); // 刷新同步状态
-            await fetchEmojis(); // 刷新表情包列表
-          } else {
-            throw new Error("同步失败");
-          }
-          break;
-        }
-
-        // 等待1秒后再次检查
-        await new Promise((resolve) => setTimeout(resolve, 1000));
-      }
+      // 等待同步结束，期间显示推送的进度
+      const result = await waitForImgSync();
+      if (!result.success) throw new Error(syncErrorMessage(result.progress));
+      alert("从云端同步完成！");
+      await checkSyncStatus(); // 刷新同步状态
+      await fetchEmojis(); // 刷新表情包列表
     } catch (error) {
       console.error("从云端同步失败:", error);
       alert("从云端同步失败: " + error.message);
@@ -821,29 +1231,25 @@ document.addEventListener("DOMContentLoaded", () => {
 
   initialize();
 
+  // 切换排序方式后按新顺序重新分页加载
+  const sortSelect = document.getElementById("sort-select");
+  if (sortSelect) {
+    sortSelect.addEventListener("change", () => {
+      sortKey = sortSelect.value;
+      fetchEmojis();
+    });
+  }
+
+  // 页面可见时定期拉取其他地方（机器人、其他管理页面）产生的变化
+  setInterval(() => {
+    if (document.visibilityState === "visible") refreshChanges();
+  }, 10000);
+
   // 加载类别数据并更新显示
   async function loadCategories() {
-    try {
-      const response = await fetch("/api/emotions");
-      if (!response.ok) {
-        throw new Error("无法加载类别数据");
-      }
-      const data = await response.json();
-      if (typeof data !== "object" || Array.isArray(data)) {
-        throw new Error("返回的数据格式不正确");
-      }
-
-      updateSidebar(data, data);
-      displayCategories(data, data);
-    } catch (error) {
-      console.error("加载类别失败:", error);
-      alert("加载类别失败: " + error.message);
-    }
+    await fetchEmojis();
   }
 
-  // 在 DOMContentLoaded 事件中调用 loadCategories
-  loadCategories(); // 页面加载时获取类别
-
   // 检查图床同步状态
   async function checkImgHostSyncStatus() {
     try {
@@ -878,21 +1284,9 @@ document.addEventListener("DOMContentLoaded", () => {
       if (!response.ok) throw new Error("同步到云端失败");
 
       alert("开始同步到云端...");
-      // 轮询检查进程
-      while (true) {
-        const statusResponse = await fetch("/api/img_host/sync/check_process");
-        if (!statusResponse.ok) throw new Error("检查同步状态失败");
-        const status = await statusResponse.json();
-
-        if (status.completed) {
-          if (status.success) {
-          } else {
-            throw new Error("同步失败");
-          }
-          break; // 退出循环
-        }
-        await new Promise((resolve) => setTimeout(resolve, 1000));
-      }
+      // 等待同步结束，期间显示推送的进度
+      const result = await waitForImgSync();
+      if (!result.success) throw new Error(syncErrorMessage(result.progress));
     } catch (error) {
       console.error("同步到云端失败:", error);
       alert("同步到云端失败: " + error.message);
@@ -916,21 +1310,9 @@ document.addEventListener("DOMContentLoaded", () => {
       if (!response.ok) throw new Error("从云端同步失败");
 
       alert("开始从云端同步...");
-      // 轮询检查进程
-      while (true) {
-        const statusResponse = await fetch("/api/img_host/sync/check_process");
-        if (!statusResponse.ok) throw new Error("检查同步状态失败");
-        const status = await statusResponse.json();
-
-        if (status.completed) {
-          if (status.success) {
-          } else {
-            throw new Error("同步失败");
-          }
-          break; // 退出循环
-        }
-        await new Promise((resolve) => setTimeout(resolve, 1000));
-      }
+      // 等待同步结束，期间显示推送的进度
+      const result = await waitForImgSync();
+      if (!result.success) throw new Error(syncErrorMessage(result.progress));
     } catch (error) {
       console.error("从云端同步失败:", error);
       alert("从云端同步失败: " + error.message);
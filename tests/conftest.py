@@ -0,0 +1,16 @@
+import os
+import sys
+import importlib
+
+import pytest
+
+# 插件目录名不固定（安装到 AstrBot 时为 astrbot_plugin_meme_manager），按目录名作为包导入
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(PLUGIN_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+
+@pytest.fixture
+def plugin():
+    """按相对插件包的模块名导入模块，例如 plugin("backend.catalog")"""
+    return lambda module: importlib.import_module(f"{PACKAGE}.{module}")
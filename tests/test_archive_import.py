@@ -0,0 +1,43 @@
+import io
+import zipfile
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_deduplicates_against_catalog_hashes(plugin, tmp_path, monkeypatch):
+    archive_import = plugin("backend.archive_import")
+    catalog_mod = plugin("backend.catalog")
+    monkeypatch.setattr(archive_import, "MEMES_BASE_DIR", str(tmp_path))
+    memes_dir = tmp_path / "memes" / "g"
+    (memes_dir / "happy").mkdir(parents=True)
+    (memes_dir / "happy" / "red.png").write_bytes(_png("red"))
+    catalog = catalog_mod.MemeCatalog(str(tmp_path / "catalog.db"))
+    catalog.ensure_group_indexed("g", str(memes_dir))
+    # 索引之后放入的文件没有哈希记录，只有它需要重新读取
+    (memes_dir / "happy" / "blue.png").write_bytes(_png("blue"))
+
+    hashed = []
+    original = archive_import._hash_file
+    monkeypatch.setattr(archive_import, "_hash_file", lambda path: hashed.append(path) or original(path))
+
+    archive = tmp_path / "pack.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("happy/red_copy.png", _png("red"))
+        zf.writestr("happy/blue_copy.png", _png("blue"))
+        zf.writestr("happy/green.png", _png("green"))
+
+    summary = archive_import.import_archive(str(archive), str(memes_dir), catalog=catalog, group="g")
+
+    assert summary["imported"] == 1
+    assert summary["duplicates"] == 2
+    assert [p.rsplit("/", 1)[-1] for p in hashed] == ["blue.png"]
+    assert (memes_dir / "happy" / "green.png").exists()
+    catalog.close()
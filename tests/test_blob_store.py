@@ -0,0 +1,35 @@
+import os
+
+
+def test_clone_group_commits_in_batches(plugin, tmp_path, monkeypatch):
+    catalog_mod = plugin("backend.catalog")
+    blob_store = plugin("backend.blob_store")
+    monkeypatch.setattr(blob_store, "CLONE_BATCH_SIZE", 3)
+
+    catalog = catalog_mod.MemeCatalog(str(tmp_path / "catalog.db"))
+    source_dir = tmp_path / "memes" / "src"
+    for index in range(7):
+        category = source_dir / f"cat{index % 2}"
+        category.mkdir(parents=True, exist_ok=True)
+        (category / f"{index}.png").write_bytes(os.urandom(64))
+    catalog.ensure_group_indexed("src", str(source_dir))
+
+    # 复制过程中其他线程的查询不应等待整个复制完成：统计最外层事务（即提交）的次数
+    commits = []
+    original = catalog.transaction
+
+    def counting_transaction():
+        if not catalog._depth:
+            commits.append(1)
+        return original()
+
+    monkeypatch.setattr(catalog, "transaction", counting_transaction)
+    store = blob_store.BlobStore(str(tmp_path / "blobs"))
+    stats = store.clone_group(catalog, "src", "dst", str(source_dir), str(tmp_path / "memes" / "dst"))
+
+    assert stats["files"] == 7
+    assert len(commits) == 3
+    assert catalog.list_group_files("dst") == catalog.list_group_files("src")
+    cloned = tmp_path / "memes" / "dst" / "cat0" / "0.png"
+    assert cloned.read_bytes() == (source_dir / "cat0" / "0.png").read_bytes()
+    catalog.close()
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+
+
+def _catalog(plugin, tmp_path):
+    catalog_mod = plugin("backend.catalog")
+    return catalog_mod, catalog_mod.MemeCatalog(str(tmp_path / "catalog.db"))
+
+
+def _write(path, size=16):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(os.urandom(size))
+
+
+def test_migrates_old_database_to_latest_version(plugin, tmp_path):
+    catalog_mod = plugin("backend.catalog")
+    path = str(tmp_path / "catalog.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(catalog_mod.SCHEMA_MIGRATIONS[0])
+    conn.execute("PRAGMA user_version = 1")
+    conn.execute("INSERT INTO groups (name) VALUES ('g')")
+    conn.commit()
+    conn.close()
+
+    catalog = catalog_mod.MemeCatalog(path)
+    assert catalog.conn.execute("PRAGMA user_version").fetchone()[0] == len(catalog_mod.SCHEMA_MIGRATIONS)
+    columns = {row[1] for row in catalog.conn.execute("PRAGMA table_info(files)")}
+    assert {"tier", "remote_url", "tags"} <= columns
+    # 已有数据保留，重复打开不再迁移
+    assert catalog.conn.execute("SELECT name FROM groups").fetchall()[0][0] == "g"
+    catalog.close()
+    catalog_mod.MemeCatalog(path).close()
+
+
+def test_reconcile_group_applies_directory_changes(plugin, tmp_path):
+    _, catalog = _catalog(plugin, tmp_path)
+    memes_dir = tmp_path / "memes"
+    _write(memes_dir / "happy" / "a.png")
+    _write(memes_dir / "happy" / "b.png")
+    catalog.ensure_group_indexed("g", str(memes_dir))
+    assert catalog.list_group_files("g") == {"happy": ["a.png", "b.png"]}
+    # 目录没有变化时不读取类别目录
+    assert catalog.reconcile_group("g", str(memes_dir)) == []
+
+    (memes_dir / "happy" / "a.png").unlink()
+    _write(memes_dir / "happy" / "c.png")
+    _write(memes_dir / "sad" / "d.png")
+    os.utime(memes_dir / "happy", ns=(1, 1))
+    diffs = catalog.reconcile_group("g", str(memes_dir))
+
+    assert sorted(diff["category"] for diff in diffs) == ["happy", "sad"]
+    assert catalog.list_group_files("g") == {"happy": ["b.png", "c.png"], "sad": ["d.png"]}
+    catalog.close()
+
+
+def test_list_files_page_cursor_walks_all_files_once(plugin, tmp_path):
+    _, catalog = _catalog(plugin, tmp_path)
+    memes_dir = tmp_path / "memes"
+    for index in range(7):
+        # 大小有重复，同值时按文件名排序
+        _write(memes_dir / "happy" / f"{index}.png", size=10 + index % 3)
+    catalog.ensure_group_indexed("g", str(memes_dir))
+
+    for sort, descending in (("name", False), ("size", False), ("size", True)):
+        seen, after = [], None
+        while True:
+            page = catalog.list_files_page("g", "happy", sort=sort, descending=descending, limit=3, after=after)
+            if not page:
+                break
+            seen.extend(row["filename"] for row in page)
+            after = (page[-1]["sort_value"], page[-1]["filename"])
+        expected = sorted(
+            (f"{index}.png" for index in range(7)),
+            key=lambda name: (os.path.getsize(memes_dir / "happy" / name), name) if sort == "size" else name,
+            reverse=descending,
+        )
+        assert seen == expected
+    catalog.close()
+
+
+def test_group_changes_since_reports_reset_after_pruning(plugin, tmp_path, monkeypatch):
+    catalog_mod, catalog = _catalog(plugin, tmp_path)
+    memes_dir = tmp_path / "memes"
+    _write(memes_dir / "happy" / "a.png")
+    catalog.ensure_group_indexed("g", str(memes_dir))
+    version = catalog.last_change_id()
+
+    catalog.set_description("g", "happy", "开心")
+    changes = catalog.group_changes_since("g", version)
+    assert not changes["reset"]
+    assert changes["categories"] == ["happy"]
+
+    monkeypatch.setattr(catalog_mod, "CHANGES_KEEP", 3)
+    for index in range(5):
+        catalog.set_description("g", "happy", f"描述{index}")
+    assert catalog.group_changes_since("g", version)["reset"]
+    assert not catalog.group_changes_since("g", catalog.last_change_id())["reset"]
+    catalog.close()
+
+
+def test_reconcile_category_and_lookups_do_not_create_groups(plugin, tmp_path):
+    _, catalog = _catalog(plugin, tmp_path)
+    memes_dir = tmp_path / "memes"
+    _write(memes_dir / "happy" / "a.png")
+
+    # 只查询的操作不应为不存在的表情组写入记录
+    catalog.set_tier("missing", "happy", "a.png", "cloud")
+    assert catalog.get_file("missing", "happy", "a.png") is None
+    assert "missing" not in catalog.list_groups()
+
+    diff = catalog.reconcile_category("g", "happy", str(memes_dir))
+    assert not diff["was_indexed"]
+    assert catalog.list_group_files("g") == {"happy": ["a.png"]}
+    assert catalog.reconcile_category("g", "happy", str(memes_dir))["was_indexed"]
+    catalog.close()
@@ -0,0 +1,39 @@
+def _feed(plugin, tmp_path):
+    catalog_mod = plugin("backend.catalog")
+    change_feed = plugin("backend.change_feed")
+    path = str(tmp_path / "catalog.db")
+    reader, writer = catalog_mod.MemeCatalog(path), catalog_mod.MemeCatalog(path)
+    feed = change_feed.ChangeFeed(reader, None)
+    feed.include_own = True
+    feed._last_id = reader.last_change_id()
+    feed._data_version = reader.data_version()
+    return catalog_mod, reader, writer, feed
+
+
+def test_poll_returns_new_changes_in_order(plugin, tmp_path):
+    catalog_mod, reader, writer, feed = _feed(plugin, tmp_path)
+    writer.set_description("g", "cat", "开心")
+    writer.set_setting("active_group", "g")
+
+    changes = feed._poll()
+
+    assert [change["kind"] for change in changes] == [catalog_mod.CHANGE_DESCRIPTION, catalog_mod.CHANGE_SETTING]
+    assert feed._poll() == []
+    reader.close()
+    writer.close()
+
+
+def test_poll_signals_reset_when_unread_changes_were_pruned(plugin, tmp_path, monkeypatch):
+    catalog_mod, reader, writer, feed = _feed(plugin, tmp_path)
+    monkeypatch.setattr(catalog_mod, "CHANGES_KEEP", 5)
+    # 描述记录之后的大量记录把它挤出了变更日志
+    writer.set_description("g", "cat", "开心")
+    for index in range(10):
+        writer.set_setting(f"key{index}", "value")
+
+    changes = feed._poll()
+
+    assert changes[0]["kind"] == catalog_mod.CHANGE_RESET
+    assert all(change["kind"] == catalog_mod.CHANGE_SETTING for change in changes[1:])
+    reader.close()
+    writer.close()
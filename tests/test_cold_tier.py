@@ -0,0 +1,76 @@
+import os
+
+
+class FakeProvider:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def get_image_list(self):
+        return [{"id": file_id, "url": f"https://example.com/{file_id}"} for file_id in self.ids]
+
+
+def _make_manager(plugin, tmp_path, monkeypatch, count, remote_ids):
+    catalog_mod = plugin("backend.catalog")
+    cold_tier = plugin("backend.cold_tier")
+    monkeypatch.setattr(cold_tier, "EVICTION_BATCH_SIZE", 2)
+    memes_dir = tmp_path / "memes" / "g"
+    category = memes_dir / "cat"
+    category.mkdir(parents=True)
+    for index in range(count):
+        path = category / f"{index}.png"
+        path.write_bytes(os.urandom(100))
+        # 固定修改时间，保证移出顺序就是文件编号顺序
+        os.utime(path, (1000 + index, 1000 + index))
+    catalog = catalog_mod.MemeCatalog(str(tmp_path / "catalog.db"))
+    catalog.ensure_group_indexed("g", str(memes_dir))
+    manager = cold_tier.ColdTierManager(catalog, FakeProvider(remote_ids), {"enable": True, "group_limit_mb": 1})
+    manager.blobs = plugin("backend.blob_store").BlobStore(str(tmp_path / "blobs"))
+    return catalog, manager, memes_dir
+
+
+def test_enforce_skips_past_files_missing_from_remote(plugin, tmp_path, monkeypatch):
+    # 最久的 5 个文件不在图床上，超过一批候选的数量
+    catalog, manager, memes_dir = _make_manager(
+        plugin, tmp_path, monkeypatch, 8, [f"cat/{index}.png" for index in range(5, 8)]
+    )
+    monkeypatch.setattr(manager, "bytes_to_free", lambda group: 250)
+
+    stats = manager.enforce("g", str(memes_dir))
+
+    assert stats["evicted"] == 3
+    assert stats["freed_bytes"] == 300
+    assert stats["skipped"] == 5
+    assert catalog.list_group_files("g") == {"cat": [f"{i}.png" for i in range(5)]}
+    catalog.close()
+
+
+def test_enforce_keeps_files_shared_with_other_groups(plugin, tmp_path, monkeypatch):
+    catalog, manager, memes_dir = _make_manager(plugin, tmp_path, monkeypatch, 2, ["cat/0.png", "cat/1.png"])
+    # 0.png 还被另一个表情组引用，删除后空间不会释放，应保留在本地
+    os.link(memes_dir / "cat" / "0.png", tmp_path / "other.png")
+    monkeypatch.setattr(manager, "bytes_to_free", lambda group: 150)
+
+    stats = manager.enforce("g", str(memes_dir))
+
+    assert stats["evicted"] == 1
+    assert stats["freed_bytes"] == 100
+    assert stats["skipped"] == 1
+    assert catalog.list_group_files("g") == {"cat": ["0.png"]}
+    assert (memes_dir / "cat" / "0.png").exists()
+    catalog.close()
+
+
+def test_disk_usage_counts_shared_content_once(plugin, tmp_path):
+    catalog_mod = plugin("backend.catalog")
+    memes_dir = tmp_path / "memes" / "g"
+    data = os.urandom(100)
+    for category in ("a", "b"):
+        (memes_dir / category).mkdir(parents=True)
+        (memes_dir / category / "same.png").write_bytes(data)
+    (memes_dir / "a" / "other.png").write_bytes(os.urandom(50))
+    catalog = catalog_mod.MemeCatalog(str(tmp_path / "catalog.db"))
+    catalog.ensure_group_indexed("g", str(memes_dir))
+
+    assert catalog.disk_usage("g") == 150
+    assert catalog.disk_usage() == 150
+    catalog.close()
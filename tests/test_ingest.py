@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _options(ingest, tmp_path, **overrides):
+    return {
+        **ingest.DEFAULT_INGEST_OPTIONS,
+        "memes_dir": str(tmp_path),
+        "originals_dir": str(tmp_path / "originals"),
+        **overrides,
+    }
+
+
+def _jpeg_with_metadata(path, orientation=1):
+    img = Image.new("RGB", (64, 48), "red")
+    exif = Image.Exif()
+    exif[0x0112] = orientation  # Orientation
+    exif[0x010F] = "Camera"  # Make
+    img.save(path, "JPEG", exif=exif.tobytes(), comment=b"comment", xmp=b"<x:xmpmeta/>" * 50)
+
+
+def test_strips_jpeg_metadata(plugin, tmp_path):
+    ingest = plugin("backend.ingest")
+    path = tmp_path / "photo.jpg"
+    _jpeg_with_metadata(path)
+
+    result = ingest.normalize_image(str(path), _options(ingest, tmp_path))
+
+    assert result["status"] == "normalized"
+    assert result["path"] == str(path)
+    with Image.open(path) as img:
+        assert img.format == "JPEG"
+        assert not img.getexif()
+        assert "comment" not in img.info and "xmp" not in img.info
+
+
+def test_applies_exif_orientation_before_stripping(plugin, tmp_path):
+    ingest = plugin("backend.ingest")
+    path = tmp_path / "rotated.jpg"
+    _jpeg_with_metadata(path, orientation=6)  # 顺时针旋转 90 度
+
+    result = ingest.normalize_image(str(path), _options(ingest, tmp_path))
+
+    assert result["status"] == "normalized"
+    with Image.open(path) as img:
+        assert img.size == (48, 64)
+        assert not img.getexif()
+
+
+def test_resizes_large_jpeg(plugin, tmp_path):
+    ingest = plugin("backend.ingest")
+    path = tmp_path / "large.jpg"
+    Image.new("RGB", (400, 200), "blue").save(path, "JPEG")
+
+    result = ingest.normalize_image(str(path), _options(ingest, tmp_path, max_dimension=100))
+
+    assert result["status"] == "normalized"
+    with Image.open(path) as img:
+        assert img.size == (100, 50)
+
+
+def _large_png(path):
+    # 平滑的渐变图，无损 WebP 明显小于 PNG
+    gradient = Image.linear_gradient("L").resize((512, 512))
+    Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.ROTATE_90), gradient)).save(path, "PNG")
+
+
+def test_large_png_becomes_webp_with_matching_extension(plugin, tmp_path):
+    ingest = plugin("backend.ingest")
+    path = tmp_path / "big.png"
+    _large_png(path)
+    (tmp_path / "big.webp").write_bytes(b"taken")
+
+    result = ingest.normalize_image(str(path), _options(ingest, tmp_path, png_to_webp_threshold_kb=1))
+
+    assert result["status"] == "normalized"
+    assert result["original_path"] == str(path)
+    assert result["path"] == str(tmp_path / "big_1.webp")
+    assert not path.exists()
+    with Image.open(result["path"]) as img:
+        assert img.format == "WEBP"
+
+
+def test_large_png_is_not_converted_when_name_must_stay(plugin, tmp_path):
+    ingest = plugin("backend.ingest")
+    path = tmp_path / "big.png"
+    _large_png(path)
+
+    result = ingest.normalize_image(str(path), _options(ingest, tmp_path, png_to_webp_threshold_kb=1), rename=False)
+
+    # 文件名已经返回给用户：不改名，也就不转换格式
+    assert result["path"] == str(path)
+    assert "original_path" not in result
+    assert os.listdir(tmp_path) == ["big.png"]
+    with Image.open(path) as img:
+        assert img.format == "PNG"
+
+
+def test_keeps_original_when_requested(plugin, tmp_path):
+    ingest = plugin("backend.ingest")
+    path = tmp_path / "cat" / "photo.jpg"
+    path.parent.mkdir()
+    _jpeg_with_metadata(path)
+
+    ingest.normalize_image(str(path), _options(ingest, tmp_path, keep_originals=True))
+
+    original = tmp_path / "originals" / "cat" / "photo.jpg"
+    with Image.open(original) as img:
+        assert img.getexif()
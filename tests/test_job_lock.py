@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+
+def test_shared_instance_waits_for_other_thread(plugin, tmp_path):
+    job_lock = plugin("backend.job_lock")
+    lock = job_lock.JobLock("shared", str(tmp_path))
+    assert lock.acquire()
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(lock.acquire(timeout=5)))
+    worker.start()
+    # 其他线程应等待释放，而不是把持有中的实例当作重入
+    worker.join(0.2)
+    assert worker.is_alive()
+    lock.release()
+    worker.join(5)
+
+    assert results == [True]
+    assert lock.locked
+    lock.release()
+
+
+def test_same_thread_reentry_raises(plugin, tmp_path):
+    job_lock = plugin("backend.job_lock")
+    lock = job_lock.JobLock("reentry", str(tmp_path))
+    assert lock.acquire()
+    with pytest.raises(RuntimeError):
+        lock.acquire(blocking=False)
+    lock.release()
+    assert lock.acquire(blocking=False)
+    lock.release()
@@ -0,0 +1,59 @@
+import os
+
+
+def _index(plugin, tmp_path, files):
+    catalog_mod = plugin("backend.catalog")
+    search = plugin("backend.search")
+    memes_dir = tmp_path / "memes" / "g"
+    for relative in files:
+        path = memes_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(32))
+    catalog = catalog_mod.MemeCatalog(str(tmp_path / "catalog.db"))
+    catalog.ensure_group_indexed("g", str(memes_dir))
+    return catalog, search.SearchIndex("g", catalog), memes_dir
+
+
+def _files(result):
+    return sorted((hit["category"], hit["filename"]) for hit in result["results"] if hit["kind"] == "file")
+
+
+def test_query_can_combine_category_and_filename(plugin, tmp_path):
+    catalog, index, _ = _index(plugin, tmp_path, ["happy/cat_01.png", "happy/dog_01.png", "sad/cat_02.png"])
+    catalog.set_description("g", "happy", "开心的表情")
+    index.rebuild()
+
+    assert _files(index.search("happy ca")) == [("happy", "cat_01.png")]
+    assert _files(index.search("开心 dog")) == [("happy", "dog_01.png")]
+    # 类别文档排在其下的文件前面
+    assert index.search("happy")["results"][0]["kind"] == "category"
+    catalog.close()
+
+
+def test_refresh_reindexes_files_when_description_changes(plugin, tmp_path):
+    catalog, index, _ = _index(plugin, tmp_path, ["happy/cat_01.png"])
+    catalog.set_description("g", "happy", "开心")
+    index.refresh()
+    assert _files(index.search("开心 cat")) == [("happy", "cat_01.png")]
+
+    catalog.set_description("g", "happy", "难过")
+    assert index.refresh()
+
+    assert index.search("开心 cat")["total"] == 0
+    assert _files(index.search("难过 cat")) == [("happy", "cat_01.png")]
+    assert not index.refresh()
+    catalog.close()
+
+
+def test_refresh_picks_up_tag_and_file_changes(plugin, tmp_path):
+    catalog, index, memes_dir = _index(plugin, tmp_path, ["happy/a.png", "happy/b.png"])
+    index.refresh()
+
+    catalog.set_file_tags("g", "happy", "a.png", ["wow"])
+    (memes_dir / "happy" / "b.png").unlink()
+    catalog.reconcile_group("g", str(memes_dir))
+    index.refresh()
+
+    assert _files(index.search("wow")) == [("happy", "a.png")]
+    assert index.search("b")["total"] == 0
+    catalog.close()
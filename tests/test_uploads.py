@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+
+import pytest
+
+BOUNDARY = "testboundary"
+
+
+class FakeRequest:
+    """只提供 receive_multipart 用到的 headers 和按分块到达的 body"""
+
+    def __init__(self, payload, chunk_size=7000):
+        self.headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+        self._chunks = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+
+    @property
+    def body(self):
+        async def chunks():
+            for chunk in self._chunks:
+                yield chunk
+        return chunks()
+
+
+def _payload(files, fields=None):
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for filename, data in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image_file"; filename="{filename}"\r\n'
+            f"Content-Type: image/png\r\n\r\n".encode() + data + b"\r\n"
+        )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _receive(uploads, payload, staging, **limits):
+    options = {"max_file_size": 1024 * 1024, "max_files": 5, **limits}
+    return asyncio.run(uploads.receive_multipart(FakeRequest(payload), str(staging), **options))
+
+
+def test_streams_files_to_staging_with_hash(plugin, tmp_path):
+    uploads = plugin("backend.uploads")
+    data = bytes(range(256)) * 100
+    form, files = _receive(uploads, _payload([("a.png", data), ("b.png", b"xy")], {"category": "开心"}), tmp_path)
+
+    assert form == {"category": "开心"}
+    assert [(f.filename, f.size) for f in files] == [("a.png", len(data)), ("b.png", 2)]
+    assert files[0].sha256 == hashlib.sha256(data).hexdigest()
+    with open(files[0].tmp_path, "rb") as f:
+        assert f.read() == data
+
+
+def test_rejects_oversized_file_and_discards_staged_files(plugin, tmp_path):
+    uploads = plugin("backend.uploads")
+    payload = _payload([("small.png", b"ok"), ("big.png", b"\0" * 5000)])
+
+    with pytest.raises(uploads.UploadError) as excinfo:
+        _receive(uploads, payload, tmp_path, max_file_size=4096)
+
+    assert excinfo.value.status == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rejects_too_many_files(plugin, tmp_path):
+    uploads = plugin("backend.uploads")
+    payload = _payload([(f"{index}.png", b"x") for index in range(3)])
+
+    with pytest.raises(uploads.UploadError):
+        _receive(uploads, payload, tmp_path, max_files=2)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rejects_non_multipart_request(plugin, tmp_path):
+    uploads = plugin("backend.uploads")
+    request = FakeRequest(b"{}")
+    request.headers = {"Content-Type": "application/json"}
+
+    with pytest.raises(uploads.UploadError):
+        asyncio.run(uploads.receive_multipart(request, str(tmp_path), 1024, 1))
+
+
+def test_upload_content_limit_covers_max_files(plugin):
+    uploads = plugin("backend.uploads")
+    limit = uploads.upload_content_limit({"max_file_size_mb": 2, "max_files": 3})
+    assert limit == 2 * 1024 * 1024 * 3 + 1024 * 1024
+    assert uploads.upload_content_limit({}) == 10 * 1024 * 1024 * 50 + 1024 * 1024
@@ -0,0 +1,54 @@
+import os
+import stat
+import threading
+
+import pytest
+
+
+@pytest.mark.skipif(not hasattr(os, "fchmod"), reason="需要 POSIX 文件权限")
+def test_save_json_keeps_existing_mode(plugin, tmp_path):
+    utils = plugin("utils")
+    path = tmp_path / "data.json"
+
+    assert utils.save_json({"a": 1}, str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == utils.DEFAULT_FILE_MODE
+
+    os.chmod(path, 0o640)
+    assert utils.save_json({"a": 2}, str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert utils.load_json(str(path)) == {"a": 2}
+
+
+def test_writer_schedule_does_not_wait_for_file_lock(plugin, tmp_path):
+    utils = plugin("utils")
+    file_lock = threading.Lock()
+    writer = utils.DebouncedJsonWriter(str(tmp_path / "data.json"), delay=60, lock=file_lock)
+    writer.schedule({"a": 1})
+
+    # 另一个进程正在写入：跨进程锁被占用时落盘会等待，但登记新的写入不能被阻塞
+    file_lock.acquire()
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    try:
+        scheduled = threading.Event()
+        threading.Thread(target=lambda: (writer.schedule({"a": 2}), scheduled.set()), daemon=True).start()
+        assert scheduled.wait(2)
+    finally:
+        file_lock.release()
+        flusher.join()
+
+    assert writer.flush()
+    assert utils.load_json(str(tmp_path / "data.json")) == {"a": 2}
+
+
+def test_clone_file_does_not_hardlink_unless_allowed(plugin, tmp_path):
+    utils = plugin("utils")
+    src = tmp_path / "src.png"
+    src.write_bytes(b"bundled")
+
+    method = utils._clone_file(str(src), str(tmp_path / "copy.png"))
+    assert method in ("reflink", "copy")
+    assert not os.path.samefile(src, tmp_path / "copy.png")
+
+    assert utils._clone_file(str(src), str(tmp_path / "link.png"), allow_hardlink=True) == "hardlink"
+    assert os.path.samefile(src, tmp_path / "link.png")
@@ -0,0 +1,15 @@
+import asyncio
+
+
+def test_dispatch_awaits_coroutine_callbacks(plugin):
+    watcher_mod = plugin("backend.watcher")
+    received = []
+
+    async def on_change(events):
+        await asyncio.sleep(0)
+        received.append(events)
+
+    watcher = watcher_mod.DirectoryWatcher(None, {}, on_change=on_change)
+    asyncio.run(watcher._dispatch([{"type": "added", "category": "c", "filename": "a.png"}]))
+
+    assert received == [[{"type": "added", "category": "c", "filename": "a.png"}]]
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+BIG = 17 * 1024 * 1024  # 超过 Quart 默认的 16MB MAX_CONTENT_LENGTH
+
+
+def _multipart(boundary, filename, data):
+    return (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image_file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+
+
+def test_only_upload_route_accepts_large_bodies(plugin, tmp_path, monkeypatch):
+    webui = plugin("webui")
+    api = plugin("backend.api")
+    monkeypatch.setattr(api, "MEMES_DIR", str(tmp_path))
+    monkeypatch.setitem(webui.app.config, "PLUGIN_CONFIG", {"plugin_config": {"uploads": {"max_file_size_mb": 20}}})
+    monkeypatch.setattr(webui.app, "secret_key", "test")
+
+    async def run():
+        client = webui.app.test_client()
+        async with client.session_transaction() as session:
+            session["authenticated"] = True
+        upload = await client.post(
+            "/api/emoji/add",
+            data=_multipart("xyz", "big.png", b"\0" * BIG),
+            headers={"Content-Type": "multipart/form-data; boundary=xyz"},
+        )
+        other = await client.post(
+            "/api/emoji/delete",
+            data=json.dumps({"category": "c", "image_file": "x" * BIG}),
+            headers={"Content-Type": "application/json"},
+        )
+        return upload.status_code, other.status_code
+
+    upload_status, other_status = asyncio.run(run())
+    # 请求体被完整接收，因为没有指定类别而返回 400
+    assert upload_status == 400
+    assert webui.app.config["MAX_CONTENT_LENGTH"] == 16 * 1024 * 1024
+    assert other_status == 413
+
+
+def test_archive_import_accepts_large_archives_and_streams_them(plugin, tmp_path, monkeypatch):
+    webui = plugin("webui")
+    api = plugin("backend.api")
+    archive_import = plugin("backend.archive_import")
+    monkeypatch.setattr(api, "MEMES_DIR", str(tmp_path / "memes"))
+    monkeypatch.setattr(api, "TEMP_DIR", str(tmp_path / "temp"))
+    monkeypatch.setattr(api, "get_catalog", lambda: None)
+    monkeypatch.setattr(archive_import, "MEMES_BASE_DIR", str(tmp_path))
+    monkeypatch.setitem(webui.app.config, "PLUGIN_CONFIG", {"plugin_config": {}})
+    monkeypatch.setattr(webui.app, "secret_key", "test")
+    payload = _multipart("xyz", "pack.zip", b"x" * BIG).replace(b'name="image_file"', b'name="archive_file"')
+
+    async def run():
+        client = webui.app.test_client()
+        async with client.session_transaction() as session:
+            session["authenticated"] = True
+        response = await client.post(
+            "/api/emoji/import", data=payload, headers={"Content-Type": "multipart/form-data; boundary=xyz"}
+        )
+        return response.status_code, await response.get_json()
+
+    status, body = asyncio.run(run())
+    # 请求体完整接收后才发现不是压缩包；暂存的压缩包已删除
+    assert status == 400
+    assert "压缩包格式" in body["message"]
+    assert list((tmp_path / "temp").iterdir()) == []
+
+
+def test_groups_report_the_live_manager_group(plugin, monkeypatch):
+    webui = plugin("webui")
+
+    class Manager:
+        active_group = "cats"
+
+    monkeypatch.setitem(webui.app.config, "PLUGIN_CONFIG", {
+        "category_manager": Manager(),
+        "plugin_config": {"emotion_groups": {"default": {}, "cats": {}}, "active_emotion_group": "default"},
+    })
+    monkeypatch.setattr(webui.app, "secret_key", "test")
+
+    async def run():
+        client = webui.app.test_client()
+        async with client.session_transaction() as session:
+            session["authenticated"] = True
+        response = await client.get("/api/groups")
+        return await response.get_json()
+
+    # 机器人侧已经切换到 cats，配置里还是旧值
+    assert asyncio.run(run())["active_group"] == "cats"
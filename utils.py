@@ -1,55 +1,255 @@
 import os
+import re
 import json
+import time
+import atexit
 import logging
-import aiohttp
+import tempfile
+import threading
+import weakref
+import hashlib
 import random
 import string
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional
 import shutil
-from .config import MEMES_DIR, CURRENT_DIR
+from contextlib import nullcontext
+from .config import MEMES_DIR, BUNDLED_MEMES_DIR, BUNDLED_MANIFEST_PATH, BUNDLED_INSTALL_MARKER
 
 logger = logging.getLogger(__name__)
 
+# 新建 JSON 文件的权限（目标文件已存在时沿用其权限）
+DEFAULT_FILE_MODE = 0o644
+
 def ensure_dir_exists(path: str) -> None:
     """确保目录存在，不存在则创建"""
     if not os.path.exists(path):
         os.makedirs(path)
 
-def copy_memes_if_not_exists():
-    """如果 MEMES_DIR 下没有表情包文件，则复制 CURRENT_DIR 下的 memes 文件夹内容"""
-    # 确保目录存在
+def build_bundled_manifest(source_dir: str = BUNDLED_MEMES_DIR) -> Dict[str, Any]:
+    """
+    遍历自带表情包目录生成安装清单
+
+    清单版本由所有条目的路径、大小和哈希计算得出，内容变化时版本随之变化。
+    发布时生成一次并保存为 memes_manifest.json，插件启动时不需要再遍历目录。
+    """
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.startswith("."):
+                continue
+            path = os.path.join(dirpath, name)
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b""):
+                    digest.update(chunk)
+            entries.append({
+                "path": os.path.relpath(path, source_dir).replace(os.sep, "/"),
+                "size": os.path.getsize(path),
+                "sha256": digest.hexdigest(),
+            })
+    version = hashlib.sha256(
+        json.dumps(entries, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:16]
+    return {"version": version, "files": entries}
+
+
+def _clone_file(src: str, dst: str, allow_hardlink: bool = False) -> str:
+    """
+    依次尝试 reflink（写时复制）和普通复制，返回实际使用的方式
+
+    硬链接与插件目录中的原文件共用同一份数据，原地修改任一边都会改动另一边
+    （插件更新也会改动已安装的表情包），因此只在 allow_hardlink 时最先尝试。
+    """
+    tmp = f"{dst}.install-{os.getpid()}.tmp"
+    if allow_hardlink:
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return "hardlink"
+        except OSError:
+            pass
+    try:
+        import fcntl
+        FICLONE = 0x40049409  # Linux ioctl，btrfs/xfs 等支持
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+        return "reflink"
+    except (OSError, ImportError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return "copy"
+
+
+def install_bundled_memes(group: str = "default", allow_hardlink: bool = False) -> bool:
+    """
+    按清单把自带表情包安装到默认表情组目录
+
+    安装完成后记录清单版本，版本一致时直接返回，不遍历任何目录。
+    清单更新时只安装新增的文件，不覆盖、也不恢复用户已修改或删除的表情包。
+    默认使用 reflink 或复制，allow_hardlink 时优先硬链接到插件目录中的文件。
+
+    Returns:
+        bool: 本次是否执行了安装
+    """
     ensure_dir_exists(MEMES_DIR)
-    
-    # 检查目录是否为空或只有非常少的文件（可能是残留或系统生成文件）
-    meme_files = [f for f in os.listdir(MEMES_DIR) if os.path.isfile(os.path.join(MEMES_DIR, f))]
-    
-    # 如果目录为空或几乎为空，复制默认表情包
-    if len(meme_files) < 3:  # 假设少于3个文件认为是空目录
-        source_dir = os.path.join(CURRENT_DIR, "memes")
-        if os.path.exists(source_dir):
-            # 复制所有文件
-            for item in os.listdir(source_dir):
-                src_path = os.path.join(source_dir, item)
-                dst_path = os.path.join(MEMES_DIR, item)
-                if os.path.isdir(src_path):
-                    if not os.path.exists(dst_path):
-                        shutil.copytree(src_path, dst_path)
-                else:
-                    shutil.copy2(src_path, dst_path)
-            logger.info(f"已将默认表情包复制到 {MEMES_DIR}")
-        else:
-            logger.warning(f"默认表情包目录不存在: {source_dir}")
+    manifest = load_json(BUNDLED_MANIFEST_PATH) if os.path.exists(BUNDLED_MANIFEST_PATH) else None
+    if not manifest:
+        if not os.path.isdir(BUNDLED_MEMES_DIR):
+            logger.warning(f"默认表情包目录不存在: {BUNDLED_MEMES_DIR}")
+            return False
+        # 开发环境中没有清单文件时现场生成
+        manifest = build_bundled_manifest()
+
+    marker = load_json(str(BUNDLED_INSTALL_MARKER), {}) if os.path.exists(BUNDLED_INSTALL_MARKER) else {}
+    if marker.get("version") == manifest["version"]:
+        return False
+
+    previously = set(marker.get("files", []))
+    target_dir = os.path.join(MEMES_DIR, group)
+    methods = {"hardlink": 0, "reflink": 0, "copy": 0}
+    for entry in manifest["files"]:
+        if entry["path"] in previously:
+            continue
+        src = os.path.join(BUNDLED_MEMES_DIR, *entry["path"].split("/"))
+        dst = os.path.join(target_dir, *entry["path"].split("/"))
+        if os.path.exists(dst) or not os.path.exists(src):
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        methods[_clone_file(src, dst, allow_hardlink)] += 1
+
+    save_json(
+        {"version": manifest["version"], "files": sorted(previously | {e["path"] for e in manifest["files"]})},
+        str(BUNDLED_INSTALL_MARKER),
+    )
+    logger.info(
+        f"已安装默认表情包到 {target_dir}（清单版本 {manifest['version']}，"
+        f"硬链接 {methods['hardlink']}，reflink {methods['reflink']}，复制 {methods['copy']}）"
+    )
+    return True
 
 def save_json(data: Dict[str, Any], filepath: str) -> bool:
-    """保存 JSON 数据到文件"""
+    """保存 JSON 数据到文件（临时文件 + fsync + 重命名，写入过程中崩溃不会损坏原文件）"""
+    tmp_path = None
     try:
-        ensure_dir_exists(os.path.dirname(filepath))
-        with open(filepath, 'w', encoding='utf-8') as f:
+        directory = os.path.dirname(filepath)
+        ensure_dir_exists(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+        # mkstemp 创建的文件权限为 0600，改为原文件的权限（不存在时为 0644），替换后权限不变
+        if hasattr(os, "fchmod"):
+            try:
+                mode = os.stat(filepath).st_mode & 0o7777
+            except FileNotFoundError:
+                mode = DEFAULT_FILE_MODE
+            os.fchmod(fd, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+        tmp_path = None
+        _fsync_dir(directory)
         return True
     except Exception as e:
         logger.error(f"保存 JSON 文件失败 {filepath}: {e}")
         return False
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _fsync_dir(directory: str) -> None:
+    """同步目录项，确保重命名落盘（Windows 不支持打开目录，忽略）"""
+    if os.name != "posix":
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class DebouncedJsonWriter:
+    """延迟合并写入的 JSON 写入器
+
+    短时间内的多次 schedule 只会在最后一次之后 delay 秒写盘一次，
+    持续写入时最迟 max_delay 秒也会落盘。写入在后台定时线程中完成。
+
+    多个进程写同一个文件时，可以传入 source 和 lock：落盘时在 lock（如跨进程的任务锁）内
+    通过 source 重新读取权威数据再写入，而不是写本进程登记的副本，最后写入的进程总是写入最新数据。
+
+    schedule 只持有保护待写数据的 _lock，不会等待写盘或跨进程锁；
+    写盘由 _write_lock 串行化，后取出数据的一次总是后写入。
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        delay: float = 0.5,
+        max_delay: float = 5.0,
+        source: Optional[Callable[[], Dict[str, Any]]] = None,
+        lock=None,
+    ):
+        self.filepath = filepath
+        self.delay = delay
+        self.max_delay = max_delay
+        self.source = source
+        self.file_lock = lock
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = None
+        self._first_scheduled = None
+        self._timer = None
+        _writers.add(self)
+
+    def schedule(self, data: Dict[str, Any]) -> None:
+        """登记一次写入，data 会被立即复制"""
+        with self._lock:
+            self._pending = dict(data)
+            now = time.monotonic()
+            if self._first_scheduled is None:
+                self._first_scheduled = now
+            delay = min(self.delay, max(0.0, self._first_scheduled + self.max_delay - now))
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> bool:
+        """立即写入尚未落盘的数据"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                data, self._pending = self._pending, None
+                self._first_scheduled = None
+            if data is None:
+                return True
+            with self.file_lock or nullcontext():
+                if self.source is not None:
+                    data = self.source()
+                return save_json(data, self.filepath)
+
+    @property
+    def dirty(self) -> bool:
+        return self._pending is not None
+
+_writers = weakref.WeakSet()
+
+@atexit.register
+def flush_all_writers() -> None:
+    """进程退出时写入所有未落盘的数据"""
+    for writer in list(_writers):
+        writer.flush()
 
 def load_json(filepath: str, default: Dict = None) -> Dict:
     """从文件加载 JSON 数据"""
@@ -71,6 +271,8 @@ def generate_secret_key(length=8):
 
 async def get_public_ip():
     """异步获取公网IPv4地址"""
+    import aiohttp
+
     ipv4_apis = [
         'http://ipv4.ifconfig.me/ip',        # IPv4专用接口
         'http://api-ipv4.ip.sb/ip',          # 樱花云IPv4接口
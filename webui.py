@@ -1,19 +1,40 @@
 import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
 from quart import (
     Quart,
     render_template,
-    send_from_directory,
+    send_file,
     request,
     redirect,
     url_for,
     session,
     jsonify
 )
-from .backend.api import api
+from .backend.api import api, get_active_group
+from .backend.uploads import archive_content_limit, upload_content_limit
+from .backend.ingest import IngestPool
+from .backend.group_registry import GroupRegistry
+from .backend.models import configure_io, run_io, shutdown_io
+from .backend.thumbnails import ThumbnailService, snap_width
+from .backend.compression import (
+    DEFAULT_COMPRESSION_OPTIONS,
+    COMPRESSIBLE_TYPES,
+    available_encodings,
+    compress,
+    negotiate,
+    precompress_static,
+    precompressed_variant,
+)
 from .utils import generate_secret_key
 from .config import MEMES_DIR
+from .backend.catalog import get_catalog
 import asyncio
+import mimetypes
 import hypercorn.asyncio
+from quart.wrappers import Request
+from quart.wrappers.response import DataBody
+from werkzeug.security import safe_join
 from hypercorn.config import Config
 
 class ServerState:
@@ -27,8 +48,32 @@ class ServerState:
         return cls._instance
 
 
+class UploadLimitRequest(Request):
+    """只为上传和压缩包导入接口放宽请求体大小限制，其他接口使用全局的 MAX_CONTENT_LENGTH
+
+    Quart 在收到请求时就按创建参数生成请求体并检查 Content-Length，
+    在视图中再修改 request.max_content_length 已不影响请求体，因此在创建请求时按路径设置。
+    """
+
+    # 路径 -> 按 uploads 配置计算请求体上限
+    UPLOAD_LIMITS = {
+        "/api/emoji/add": upload_content_limit,
+        "/api/emoji/import": archive_content_limit,
+    }
+
+    def __init__(self, method: str, scheme: str, path: str, *args, **kwargs):
+        limit = None
+        if method == "POST" and path in self.UPLOAD_LIMITS:
+            plugin_config = (app.config.get("PLUGIN_CONFIG") or {}).get("plugin_config") or {}
+            limit = self.UPLOAD_LIMITS[path](plugin_config.get("uploads"))
+            kwargs["max_content_length"] = limit
+        super().__init__(method, scheme, path, *args, **kwargs)
+        if limit is not None:
+            self.max_content_length = limit
+
 
 app = Quart(__name__)
+app.request_class = UploadLimitRequest
 
 # 注册API蓝图
 app.register_blueprint(api, url_prefix="/api")
@@ -50,6 +95,74 @@ async def require_login():
     if request.endpoint not in allowed_endpoints and not session.get("authenticated"):
         return redirect(url_for("login"))
 
+# 超过该大小的响应在线程中压缩，不占用事件循环
+COMPRESS_IN_THREAD_SIZE = 256 * 1024
+
+
+@app.before_request
+async def serve_precompressed_static():
+    """静态资源有与源文件同步的 .br/.gz 预压缩文件且客户端接受时，直接返回预压缩文件"""
+    if request.endpoint != "static":
+        return None
+    options = app.config.get("COMPRESSION", DEFAULT_COMPRESSION_OPTIONS)
+    path = safe_join(app.static_folder, request.view_args.get("filename", ""))
+    if not options.get("enable") or path is None:
+        return None
+    found = await run_io(precompressed_variant, path, request.headers.get("Accept-Encoding"))
+    if found is None:
+        return None
+    variant, encoding = found
+    stat = await run_io(os.stat, variant)
+    headers = {
+        "ETag": f'"{encoding}-{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": REVALIDATE_CACHE_CONTROL,
+        "Content-Encoding": encoding,
+        "Vary": "Accept-Encoding",
+    }
+    if _not_modified(headers["ETag"], stat.st_mtime):
+        return "", 304, headers
+    response = await send_file(variant, mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+    for key, value in headers.items():
+        response.headers[key] = value
+    response.headers.pop("Expires", None)
+    return response
+
+
+@app.after_request
+async def compress_response(response):
+    """按 Accept-Encoding 压缩超过 min_size 的 JSON 和文本响应（流式响应和文件不处理）"""
+    options = app.config.get("COMPRESSION", DEFAULT_COMPRESSION_OPTIONS)
+    if not options.get("enable"):
+        return response
+    if request.endpoint == "static":
+        # 静态资源在 serve_precompressed_static 中按 Accept-Encoding 选择了版本
+        response.vary.add("Accept-Encoding")
+        return response
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+        or not isinstance(response.response, DataBody)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.headers.get("Accept-Encoding"), available_encodings())
+    if encoding is None:
+        return response
+    data = await response.get_data()
+    if len(data) < int(options.get("min_size") or 0):
+        return response
+    if len(data) > COMPRESS_IN_THREAD_SIZE:
+        compressed = await asyncio.to_thread(compress, data, encoding, options)
+    else:
+        compressed = compress(data, encoding, options)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
 @app.route("/login", methods=["GET", "POST"])
 async def login():
     if session.get("authenticated"):
@@ -71,43 +184,165 @@ async def index():
         return redirect(url_for("login"))
     return await render_template("index.html")
 
+def _safe_part(name: str) -> bool:
+    """URL 中的组名、类别名、文件名只能是单级名称"""
+    return bool(name) and name not in (".", "..") and "/" not in name and "\\" not in name
+
+
 @app.route("/memes/<category>/<filename>")
-async def serve_emoji(category, filename):
-    category_path = os.path.join(MEMES_DIR, category)
-    if os.path.exists(os.path.join(category_path, filename)):
-        return await send_from_directory(category_path, filename)
-    else:
-        return "File not found: " + os.path.join(category_path, filename), 404
+async def serve_active_emoji(category, filename):
+    """当前表情组中的表情（兼容旧地址）"""
+    return await serve_emoji(get_active_group(), category, filename)
+
+
+# 带 ?v=<内容哈希> 的地址内容不会变化，浏览器可以一直使用缓存；其余地址每次用 ETag 重新验证
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def _not_modified(etag: str, mtime: float) -> bool:
+    """检查条件请求：If-None-Match 优先，没有时才比较 If-Modified-Since"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates
+    since = request.headers.get("If-Modified-Since")
+    if since:
+        try:
+            return int(mtime) <= int(parsedate_to_datetime(since).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _cached_file_response(path: str, etag: str, version: str, mimetype: Optional[str] = None):
+    """
+    返回带缓存验证信息的文件响应
+
+    Args:
+        etag: 强校验器（带引号），由内容哈希生成
+        version: 文件当前的版本号（内容哈希前 16 位），与请求的 ?v= 一致时允许长期缓存
+    """
+    mtime = await run_io(os.path.getmtime, path)
+    requested = request.args.get("v")
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if requested == version else REVALIDATE_CACHE_CONTROL,
+    }
+    if _not_modified(etag, mtime):
+        return "", 304, headers
+    response = await send_file(path, mimetype=mimetype)
+    for key, value in headers.items():
+        response.headers[key] = value
+    # send_file 按默认缓存时长附带的 Expires 会与上面的 Cache-Control 冲突
+    response.headers.pop("Expires", None)
+    return response
+
+
+@app.route("/memes/<group>/<category>/<filename>")
+async def serve_emoji(group, category, filename):
+    if not all(map(_safe_part, (group, category, filename))):
+        return "Invalid path", 400
+    path = os.path.join(MEMES_DIR, group, category, filename)
+    row = await run_io(get_catalog().fresh_file, group, category, filename, path)
+    if row is None:
+        if os.path.isfile(path):
+            # 无法计算哈希时不提供校验器，直接返回文件
+            return await send_file(path)
+        return "File not found: " + os.path.join(group, category, filename), 404
+    return await _cached_file_response(path, f'"{row["hash"][:32]}"', row["hash"][:16])
+
+
+@app.route("/thumb/<group>/<category>/<filename>")
+async def serve_thumbnail(group, category, filename):
+    """按需生成并返回 WebP 缩略图，?w= 指定宽度，?v= 为原图版本号"""
+    if not all(map(_safe_part, (group, category, filename))):
+        return "Invalid path", 400
+    thumbnails = app.config["PLUGIN_CONFIG"].get("thumbnails")
+    width = snap_width(request.args.get("w", type=int))
+    try:
+        found = await thumbnails.get(group, category, filename, width)
+    except Exception as e:
+        app.logger.warning(f"生成缩略图失败 {group}/{category}/{filename}: {e}")
+        # 无法解码的图片直接返回原图
+        return await serve_emoji(group, category, filename)
+    if found is None:
+        return "File not found: " + os.path.join(group, category, filename), 404
+    path, sha = found
+    return await _cached_file_response(path, f'"{sha[:32]}-w{width}"', sha[:16], mimetype="image/webp")
 
 # 提供同步的入口
 def run_server(config):
     import asyncio
+    import signal
+    import sys
+
+    # terminate() 发送 SIGTERM，转换为正常退出以便执行 atexit 中的落盘逻辑
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     asyncio.run(start_server(config))
 
 
 
-async def start_server(config=None):
-    """启动服务器"""
+async def start_server(config=None, shutdown_trigger=None):
+    """
+    启动服务器
+
+    独立进程模式由 run_server 调用，收到 SIGTERM 时退出。进程内模式直接作为机器人事件循环上的任务运行：
+    传入 shutdown_trigger（返回后开始优雅关闭），Hypercorn 不会在机器人的事件循环上安装信号处理器；
+    config 中提供的 group_registry 和 ingest_pool 与插件共用，由插件负责启停。
+    """
     global SERVER_LOGIN_KEY, _current_server
 
     state = ServerState()
     state.ready.clear()
 
     port = config.get("webui_port", 5000)
+    state.port = port
     SERVER_LOGIN_KEY = config.get("server_key")
 
     # 配置应用
     app.secret_key = os.urandom(16)
+    plugin_config = config.get("plugin_config") or {}
+    configure_io(plugin_config.get("webui_io_workers", 4))
+    app.config["COMPRESSION"] = {**DEFAULT_COMPRESSION_OPTIONS, **(plugin_config.get("compression") or {})}
+    if app.config["COMPRESSION"]["enable"]:
+        try:
+            await asyncio.to_thread(precompress_static, app.static_folder)
+        except OSError as e:
+            # 插件目录只读时直接返回未压缩的静态文件
+            app.logger.warning(f"生成预压缩静态资源失败: {e}")
+    shared_ingest = config.get("ingest_pool") is not None
+    ingest_pool = config.get("ingest_pool") or IngestPool(plugin_config.get("ingest", {}))
+    category_manager = config.get("category_manager")
+    thumbnails = ThumbnailService(
+        category_manager.catalog if category_manager else get_catalog(),
+        plugin_config.get("thumbnails", {}),
+    )
+    group_registry = config.get("group_registry")
+    if category_manager and group_registry is None:
+        group_registry = GroupRegistry(catalog=category_manager.catalog, capacity=plugin_config.get("group_cache_size", 4))
+        group_registry.put(category_manager)
+    if category_manager and not shared_ingest:
+        def refresh_index(result):
+            # 切换表情组后使用当前的类别管理器
+            current = app.config["PLUGIN_CONFIG"].get("category_manager")
+            if result.get("original_path"):
+                current.refresh_file(result["original_path"])
+            current.refresh_file(result["path"])
+        ingest_pool.add_listener(refresh_index)
     app.config["PLUGIN_CONFIG"] = {
         "img_sync": config.get("img_sync", False),
-        "category_manager": config.get("category_manager"),
-        "webui_port": port
+        "category_manager": category_manager,
+        "group_registry": group_registry,
+        "plugin_config": plugin_config,
+        "ingest_pool": ingest_pool,
+        "thumbnails": thumbnails,
+        "webui_port": port,
+        # 共用的入库处理池由插件启停
+        "owns_ingest_pool": not shared_ingest,
     }
 
-    @app.before_serving
-    async def notify_ready():
-        state.ready.set()
-
     # 启动服务器
     hypercorn_config = Config()
     hypercorn_config.bind = [f"0.0.0.0:{port}"]
@@ -116,9 +351,33 @@ async def start_server(config=None):
     _current_server = await hypercorn.asyncio.serve(
         app, 
         hypercorn_config,
+        shutdown_trigger=shutdown_trigger,
     )
     return SERVER_LOGIN_KEY
 
+
+@app.before_serving
+async def notify_ready():
+    services = app.config["PLUGIN_CONFIG"]
+    ingest_pool = services["ingest_pool"]
+    if services["owns_ingest_pool"] and ingest_pool.enabled:
+        await ingest_pool.start()
+    # 后台为当前表情组预生成图库缩略图
+    services["thumbnails"].start_prewarm([get_active_group()])
+    ServerState().ready.set()
+
+
+@app.after_serving
+async def stop_background_work():
+    services = app.config["PLUGIN_CONFIG"]
+    if services["owns_ingest_pool"]:
+        await services["ingest_pool"].stop()
+    await services["thumbnails"].stop()
+    if services["group_registry"]:
+        services["group_registry"].flush_all()
+    shutdown_io()
+    ServerState().ready.clear()
+
 async def create_app(config=None):
     app = Quart(__name__)
     